@@ -0,0 +1,133 @@
+# admission.py
+import asyncio
+import math
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+
+from config import settings
+
+
+class Overloaded(Exception):
+    """服务已满载，请求被拒绝。`retry_after` 为建议客户端重试前等待的秒数。"""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    限制同时执行的搜索请求数。超出并发上限的请求进入有界等待队列，
+    队列已满或等待超过 `max_wait` 秒时立即抛出 Overloaded，而不是让所有请求一起超时。
+    """
+
+    def __init__(self, max_concurrent: int, max_queue: int, max_wait: float, retry_after: float):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.retry_after = retry_after
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self.active = 0
+        self.waiting = 0
+
+    @property
+    def saturated(self) -> bool:
+        return self._semaphore.locked()
+
+    @asynccontextmanager
+    async def admit(self):
+        if self._semaphore.locked():
+            if self.waiting >= self.max_queue:
+                raise Overloaded("Admission queue is full.", self.retry_after)
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), timeout=self.max_wait)
+            except asyncio.TimeoutError:
+                raise Overloaded(f"Waited more than {self.max_wait}s for an execution slot.", self.retry_after)
+            finally:
+                self.waiting -= 1
+        else:
+            await self._semaphore.acquire()
+
+        self.active += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self._semaphore.release()
+
+
+class TokenBucket:
+    """经典令牌桶：以 `rate` 个/秒的速度补充令牌，最多积累 `capacity` 个。"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self, tokens: float = 1.0) -> float:
+        """
+        尝试取出令牌。成功返回 0，否则返回还需等待的秒数 (不扣除令牌)。
+        """
+        now = time.monotonic()
+        self._refill(now)
+        if self.tokens >= tokens:
+            self.tokens -= tokens
+            return 0.0
+        return (tokens - self.tokens) / self.rate
+
+
+class KeyedRateLimiter:
+    """
+    按客户端标识分别限流。只保留最近活跃的 `max_keys` 个令牌桶，
+    被淘汰的客户端下次请求时会得到一个满的新桶。
+    """
+
+    def __init__(self, per_minute: int, burst: int, max_keys: int):
+        self.rate = per_minute / 60
+        self.burst = burst
+        self.max_keys = max_keys
+        self.buckets: OrderedDict[str, TokenBucket] = OrderedDict()
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0
+
+    def check(self, key: str) -> float:
+        """返回 0 表示放行，否则返回建议的重试等待秒数。"""
+        if not self.enabled:
+            return 0.0
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = TokenBucket(self.rate, self.burst)
+            self.buckets[key] = bucket
+            if len(self.buckets) > self.max_keys:
+                self.buckets.popitem(last=False)
+        else:
+            self.buckets.move_to_end(key)
+        return bucket.try_acquire()
+
+
+def retry_after_header(seconds: float) -> str:
+    """Retry-After 只接受整数秒。"""
+    return str(max(1, math.ceil(seconds)))
+
+
+admission_controller = AdmissionController(
+    max_concurrent=settings.ADMISSION_MAX_CONCURRENT,
+    max_queue=settings.ADMISSION_MAX_QUEUE,
+    max_wait=settings.ADMISSION_MAX_WAIT,
+    retry_after=settings.ADMISSION_RETRY_AFTER,
+)
+
+rate_limiter = KeyedRateLimiter(
+    per_minute=settings.RATE_LIMIT_PER_MINUTE,
+    burst=settings.RATE_LIMIT_BURST,
+    max_keys=settings.RATE_LIMIT_MAX_KEYS,
+)
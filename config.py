@@ -1,4 +1,6 @@
 # config.py
+from typing import Literal
+
 from pydantic import Field
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -12,7 +14,7 @@ class Settings(BaseSettings):
     # API配置
     SERPAPI_API_KEYS: str = "default_serpapi_key"
 
-    # 反向代理配置
+    # 反向代理配置 (均可用逗号分隔多个地址，请求会发往当前最快的健康地址)
     DDG_REVERSE_PROXY: str | None = None
     BING_REVERSE_PROXY: str | None = None
     BAIDU_REVERSE_PROXY: str | None = None
@@ -27,5 +29,122 @@ class Settings(BaseSettings):
     TITLE_BLACKLIST: str = ""
     PER_PROVIDER_FETCH_TEXT: int = Field(15, ge=1, le=100)
     PER_PROVIDER_FETCH_IMAGE: int = Field(50, ge=1, le=200)
+    PIXIV_FETCH_ORIGINALS: bool = False
+
+    # 自适应超时配置
+    ADAPTIVE_TIMEOUT_ENABLED: bool = True
+    ADAPTIVE_TIMEOUT_MULTIPLIER: float = Field(2.0, gt=0)
+    ADAPTIVE_TIMEOUT_MIN: float = Field(2.0, gt=0)
+    ADAPTIVE_TIMEOUT_MAX: float = Field(20.0, gt=0)
+    ADAPTIVE_TIMEOUT_WINDOW: int = Field(200, ge=10)
+    ADAPTIVE_TIMEOUT_MIN_SAMPLES: int = Field(20, ge=1)
+
+    # 多地址与对冲请求配置
+    HEDGE_ENABLED: bool = True
+    HEDGE_DEFAULT_DELAY: float = Field(2.0, gt=0)
+    HEDGE_MIN_DELAY: float = Field(0.2, ge=0)
+    MIRROR_MIN_SAMPLES: int = Field(10, ge=1)
+    MIRROR_MAX_FAILURES: int = Field(3, ge=1)
+    MIRROR_COOLDOWN: float = Field(60.0, ge=0)
+
+    # 上游流量录制/回放配置
+    TRANSPORT_MODE: Literal['live', 'record', 'replay'] = 'live'
+    TRANSPORT_ARCHIVE_PATH: str = "upstream_traffic.jsonl.gz"
+    TRANSPORT_REPLAY_TIMING: Literal['original', 'fast'] = 'original'
+    TRANSPORT_RECORD_FLUSH_EVERY: int = Field(20, ge=1)
+
+    # 入口准入与限流配置
+    ADMISSION_MAX_CONCURRENT: int = Field(64, ge=1)
+    ADMISSION_MAX_QUEUE: int = Field(128, ge=0)
+    ADMISSION_MAX_WAIT: float = Field(2.0, ge=0)
+    ADMISSION_RETRY_AFTER: float = Field(2.0, gt=0)
+    UPSTREAM_MAX_IN_FLIGHT: int = Field(256, ge=1)
+    HOST_RATE_PER_SECOND: float = Field(10.0, ge=0)
+    HOST_BURST: int = Field(20, ge=1)
+    HOST_MAX_CONCURRENCY: int = Field(8, ge=1)
+    HOST_LIMITS: str = ""
+    HOST_MAX_WAIT: float = Field(10.0, ge=0)
+    UPSTREAM_COALESCE_ENABLED: bool = True
+    UPSTREAM_MICROCACHE: str = ""
+    UPSTREAM_MICROCACHE_MAX_BYTES: int = Field(32 * 1024 * 1024, ge=0)
+    UPSTREAM_BACKENDS: str = ""
+    UPSTREAM_IMPERSONATE: str = ""
+    UPSTREAM_RETRIES: int = Field(1, ge=0)
+    UPSTREAM_RETRY_BACKOFF: float = Field(0.25, ge=0)
+    UPSTREAM_MAX_RESPONSE_BYTES: int = Field(16 * 1024 * 1024, ge=0)
+    RATE_LIMIT_PER_MINUTE: int = Field(0, ge=0)
+    RATE_LIMIT_BURST: int = Field(10, ge=1)
+    RATE_LIMIT_KEY_HEADER: str = "X-API-Key"
+    RATE_LIMIT_MAX_KEYS: int = Field(10000, ge=1)
+
+    # 剖析与慢查询配置
+    ADMIN_TOKEN: str | None = None
+    PROFILE_SAMPLE_INTERVAL_MS: float = Field(5.0, gt=0)
+    PROFILE_MAX_SECONDS: float = Field(60.0, gt=0)
+    SLOW_QUERY_THRESHOLD_MS: float = Field(3000.0, ge=0)
+    SLOW_QUERY_LOG_SIZE: int = Field(200, ge=1)
+
+    # 图片代理配置
+    IMAGE_PROXY_PUBLIC_URL: str | None = None
+    IMAGE_PROXY_SECRET: str | None = None
+    IMAGE_CACHE_DIR: str = ".image_cache"
+    IMAGE_CACHE_MAX_BYTES: int = Field(1024 * 1024 * 1024, ge=0)
+    IMAGE_PROXY_MAX_FILE_BYTES: int = Field(20 * 1024 * 1024, ge=0)
+    IMAGE_PROXY_CACHE_MAX_AGE: int = Field(86400, ge=0)
+    IMAGE_THUMBNAIL_MAX_WIDTH: int = Field(1024, ge=16)
+
+    # 分页游标配置
+    CURSOR_TTL_SECONDS: float = Field(300.0, gt=0)
+    CURSOR_MAX_ENTRIES: int = Field(1000, ge=1)
+
+    # 热点查询与预取配置
+    RESULT_CACHE_TTL_SECONDS: float = Field(600.0, gt=0)
+    RESULT_CACHE_MAX_ENTRIES: int = Field(2000, ge=1)
+    HOT_QUERY_CAPACITY: int = Field(1000, ge=1)
+    HOT_QUERY_HALF_LIFE: float = Field(1800.0, gt=0)
+    PREFETCH_ENABLED: bool = True
+    PREFETCH_TOP_K: int = Field(50, ge=1)
+    PREFETCH_MIN_HITS: float = Field(3.0, ge=0)
+    PREFETCH_INTERVAL: float = Field(30.0, gt=0)
+    PREFETCH_REFRESH_AHEAD: float = Field(120.0, ge=0)
+    PREFETCH_MAX_PER_MINUTE: float = Field(20.0, ge=0)
+
+    # 流式解析配置
+    STREAMING_PARSE_ENABLED: bool = True
+
+    # 解析进程池配置
+    PARSE_POOL_KIND: Literal["process", "interpreter"] = "process"
+    PARSE_POOL_WORKERS: int = Field(2, ge=0)
+    PARSE_OFFLOAD_PROVIDERS: str = "yandex,bing_images,dimtown,acg66"
+    PARSE_OFFLOAD_MIN_BYTES: int = Field(256 * 1024, ge=0)
+
+    # 网页搜索翻页配置
+    TEXT_MAX_PAGES: int = Field(10, ge=1)
+    TEXT_PAGE_CONCURRENCY: int = Field(3, ge=1)
+
+    # 按产出自适应扇出配置
+    ADAPTIVE_FANOUT_ENABLED: bool = True
+    ADAPTIVE_FANOUT_MIN_SAMPLES: int = Field(20, ge=1)
+    ADAPTIVE_FANOUT_ALPHA: float = Field(0.05, gt=0, le=1)
+    ADAPTIVE_FANOUT_SKIP_SHARE: float = Field(0.02, ge=0, le=1)
+    ADAPTIVE_FANOUT_MIN_BUDGET: float = Field(0.3, gt=0, le=1)
+    ADAPTIVE_FANOUT_EXPLORE_RATE: float = Field(0.1, ge=0, le=1)
+
+
+    # 本地全文索引与降级配置
+    LOCAL_INDEX_ENABLED: bool = True
+    LOCAL_INDEX_PATH: str = "local_index.sqlite3"
+    LOCAL_INDEX_MAX_DOCUMENTS: int = Field(500000, ge=1)
+    SEARCH_DEADLINE: float = Field(25.0, ge=0)
+
+
+    # 图片结果合并配置
+    IMAGE_MERGE_MODE: Literal["interleave", "shuffle"] = "interleave"
+    IMAGE_MERGE_WEIGHTS: str = ""
+    IMAGE_MIN_SOURCES: int = Field(3, ge=1)
+
+    # 响应编码与压缩配置
+    RESPONSE_COMPRESSION_ENABLED: bool = True
+    RESPONSE_COMPRESSION_MIN_BYTES: int = Field(1024, ge=0)
 
-settings = Settings()
\ No newline at end of file
+settings = Settings()
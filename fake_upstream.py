@@ -0,0 +1,248 @@
+# fake_upstream.py
+"""
+本地上游替身服务：为每个搜索源提供结构与真实页面一致的假数据，
+并按配置注入延迟与错误，供压测脚本 (load_test.py) 在不访问真实搜索引擎的情况下使用。
+
+每个搜索源挂在独立的路径前缀下，例如 http://127.0.0.1:9100/bing，
+将对应的 *_REVERSE_PROXY 指向该前缀即可。压测时每个搜索源由单独的进程 (端口) 提供服务，
+避免替身服务本身成为瓶颈。
+"""
+import asyncio
+import html
+import json
+import math
+import random
+from dataclasses import dataclass
+from urllib.parse import quote_plus
+
+from fastapi import FastAPI, Request
+from fastapi.responses import HTMLResponse, JSONResponse, Response
+
+# 搜索源名称 -> 对应的反代配置项
+PROVIDER_PROXY_SETTINGS = {
+    "ddg": "DDG_REVERSE_PROXY",
+    "bing": "BING_REVERSE_PROXY",
+    "baidu": "BAIDU_REVERSE_PROXY",
+    "pixiv": "PIXIV_REVERSE_PROXY",
+    "pximg": "PIXIV_IMG_REVERSE_PROXY",
+    "yandex": "YANDEX_REVERSE_PROXY",
+    "dimtown": "DIMTOWN_REVERSE_PROXY",
+    "acg66": "ACG66_REVERSE_PROXY",
+}
+
+
+@dataclass
+class UpstreamProfile:
+    """上游行为配置：对数正态分布的延迟、错误率与挂起率。"""
+    latency_median_ms: float = 80.0
+    latency_sigma: float = 0.5
+    error_rate: float = 0.0
+    hang_rate: float = 0.0
+    hang_seconds: float = 30.0
+    results_per_page: int = 10
+    images_per_page: int = 35
+
+
+def create_app(profile: UpstreamProfile, public_bases: dict[str, str]) -> FastAPI:
+    """
+    创建上游替身应用。
+
+    Args:
+        profile: 延迟与错误分布配置。
+        public_bases: 各搜索源替身的对外地址 (不含路径前缀)，用于生成页面内的绝对链接。
+    """
+    app = FastAPI(docs_url=None, redoc_url=None, openapi_url=None)
+    bing_base, baidu_base, pximg_base = public_bases["bing"], public_bases["baidu"], public_bases["pximg"]
+    dimtown_base, acg66_base = public_bases["dimtown"], public_bases["acg66"]
+
+    @app.middleware("http")
+    async def inject_latency_and_errors(request: Request, call_next):
+        roll = random.random()
+        if roll < profile.hang_rate:
+            await asyncio.sleep(profile.hang_seconds)
+        else:
+            delay = random.lognormvariate(math.log(profile.latency_median_ms / 1000), profile.latency_sigma)
+            await asyncio.sleep(delay)
+        if random.random() < profile.error_rate:
+            return Response(status_code=503, content=b"Service Unavailable")
+        return await call_next(request)
+
+    def page(body: str) -> HTMLResponse:
+        return HTMLResponse(f"<!DOCTYPE html><html><head><meta charset='utf-8'></head><body>{body}</body></html>")
+
+    # DuckDuckGo
+    @app.get("/ddg/html/")
+    async def ddg_search(q: str = "", s: int = 0):
+        items = "".join(
+            f'<div class="result results_links"><h2><a class="result__a" href="https://example.com/ddg/{quote_plus(q)}/{s + i}">'
+            f'{html.escape(q)} DuckDuckGo 结果 {s + i}</a></h2><a class="result__snippet">关于 {html.escape(q)} 的摘要 {s + i}</a></div>'
+            for i in range(profile.results_per_page)
+        )
+        next_form = (
+            '<div class="nav-link"><form action="/html/" method="post"><input type="submit" class="btn" value="Next" />'
+            f'<input type="hidden" name="q" value="{html.escape(q)}" />'
+            f'<input type="hidden" name="s" value="{s + profile.results_per_page}" /></form></div>'
+        )
+        return page(items + next_form)
+
+    # Bing 网页与图片
+    @app.get("/bing")
+    async def bing_home():
+        return page("<div id='sb_form'></div>")
+
+    @app.get("/bing/search")
+    async def bing_search(q: str = "", first: int = 1):
+        items = "".join(
+            f'<li class="b_algo"><h2><a href="https://example.com/bing/{quote_plus(q)}/{first + i}">{html.escape(q)} 必应结果 {first + i}</a></h2>'
+            f'<div class="b_caption"><cite>example.com</cite><p>关于 {html.escape(q)} 的摘要 {first + i}</p></div></li>'
+            for i in range(profile.results_per_page)
+        )
+        return page(f'<ol id="b_results">{items}</ol>')
+
+    def bing_tiles(q: str, first: int) -> str:
+        tiles = []
+        for i in range(first, first + profile.images_per_page):
+            m = json.dumps({
+                "murl": f"https://img.example.com/bing/{quote_plus(q)}/{i}.jpg",
+                "purl": f"https://example.com/bing-image/{quote_plus(q)}/{i}",
+                "turl": f"https://tse.example.com/bing/{quote_plus(q)}/{i}.jpg",
+                "t": f"{q} 图片 {i}",
+            }, ensure_ascii=False)
+            tiles.append(f'<div class="iuscp"><a class="iusc" m="{html.escape(m)}"></a></div>')
+        return "".join(tiles)
+
+    @app.get("/bing/images/search")
+    async def bing_images(q: str = "", first: int = 1):
+        next_url = f"{bing_base}/bing/images/async?q={quote_plus(q)}&first={first + profile.images_per_page}"
+        return page(f'<div id="mmComponent_images_1" data-nextUrl="{html.escape(next_url)}">{bing_tiles(q, first)}</div>')
+
+    @app.get("/bing/images/async")
+    async def bing_images_async(q: str = "", first: int = 1):
+        return page(f'<div class="dgControl">{bing_tiles(q, first)}</div>')
+
+    # 百度
+    @app.get("/baidu")
+    async def baidu_home():
+        return page("<form id='form'></form>")
+
+    @app.get("/baidu/s")
+    async def baidu_search(wd: str = "", pn: int = 0):
+        items = "".join(
+            f'<div class="c-container"><h3><a href="{baidu_base}/baidu/link?url={pn + i}">{html.escape(wd)} 百度结果 {pn + i}</a></h3>'
+            f'<div><div><div>来源</div><div>关于 {html.escape(wd)} 的摘要 {pn + i}</div></div></div></div>'
+            for i in range(profile.results_per_page)
+        )
+        return page(f'<div id="content_left">{items}</div>')
+
+    @app.get("/baidu/link")
+    async def baidu_link(url: str = ""):
+        return page(f'<script>window.location.replace("https://example.com/baidu/{url}")</script>')
+
+    # Pixiv
+    @app.get("/pixiv/ajax/search/artworks/{word}")
+    async def pixiv_search(word: str, p: int = 1):
+        start = (p - 1) * 60
+        data = [
+            {
+                "id": str(100000 + start + i),
+                "title": f"{word} 作品 {start + i}",
+                "url": f"{pximg_base}/pximg/c/250x250_80_a2/img-master/img/2024/01/01/00/00/00/{100000 + start + i}_p0_square1200.jpg",
+                "pageCount": 1,
+            }
+            for i in range(60)
+        ]
+        return JSONResponse({"error": False, "body": {"illustManga": {"data": data, "total": 300}}})
+
+    @app.get("/pixiv/ajax/illust/{artwork_id}")
+    async def pixiv_illust(artwork_id: str):
+        base = f"{pximg_base}/pximg"
+        return JSONResponse({"error": False, "body": {
+            "title": f"作品 {artwork_id}",
+            "urls": {
+                "original": f"{base}/img-original/img/2024/01/01/00/00/00/{artwork_id}_p0.png",
+                "regular": f"{base}/img-master/img/2024/01/01/00/00/00/{artwork_id}_p0_master1200.jpg",
+            },
+        }})
+
+    # Yandex
+    @app.get("/yandex/images/search")
+    async def yandex_images(text: str = ""):
+        entities = {
+            f"item-{i}": {
+                "origUrl": f"https://img.example.com/yandex/{quote_plus(text)}/{i}.jpg",
+                "image": f"//avatars.example.com/yandex/{quote_plus(text)}/{i}.jpg",
+                "snippet": {"title": f"{text} Yandex 图片 {i}", "url": f"https://example.com/yandex/{quote_plus(text)}/{i}"},
+            }
+            for i in range(profile.images_per_page * 3)
+        }
+        state = {"initialState": {"serpList": {"items": {"entities": entities}}}}
+        return page(f'<div id="ImagesApp-fake" data-state="{html.escape(json.dumps(state, ensure_ascii=False))}"></div>')
+
+    # 次元小镇
+    @app.get("/dimtown/")
+    async def dimtown_search(s: str = ""):
+        items = "".join(
+            f'<li><a href="{dimtown_base}/dimtown/post/{i}?s={quote_plus(s)}">{html.escape(s)} 文章 {i}</a></li>'
+            for i in range(12)
+        )
+        return page(f'<div class="update_area"><ul class="update_area_lists">{items}</ul></div>')
+
+    @app.get("/dimtown/post/{post_id}")
+    async def dimtown_post(post_id: int, s: str = ""):
+        images = "".join(
+            f'<p><a href="https://img.example.com/dimtown/{quote_plus(s)}/{post_id}/{i}.jpg"><img alt="{html.escape(s)} 图 {i}"></a></p>'
+            for i in range(8)
+        )
+        return page(f'<h1>{html.escape(s)} 文章 {post_id}</h1><div class="content" id="content">{images}</div>')
+
+    # acg66
+    @app.get("/acg66/search.php")
+    async def acg66_search(q: str = ""):
+        items = "".join(
+            f'<article class="post"><div class="umPic"><a href="{acg66_base}/acg66/post/{i}.html?q={quote_plus(q)}"></a></div></article>'
+            for i in range(10)
+        )
+        return page(items)
+
+    @app.get("/acg66/post/{post_id}.html")
+    async def acg66_post(post_id: int, q: str = ""):
+        spans = "".join(
+            f'<span class="LightGallery_Item" lg-data-src="/zb_users/upload/{quote_plus(q)}/{post_id}/{i}.jpg"></span>'
+            for i in range(6)
+        )
+        return page(f'<h1 class="tit">{html.escape(q)} 图集 {post_id}</h1>{spans}')
+
+    return app
+
+
+def provider_bases(host: str, base_port: int) -> dict[str, str]:
+    """为每个搜索源分配一个端口：base_port, base_port + 1, ..."""
+    return {name: f"http://{host}:{base_port + i}" for i, name in enumerate(PROVIDER_PROXY_SETTINGS)}
+
+
+def serve(host: str, port: int, profile: UpstreamProfile, public_bases: dict[str, str]) -> None:
+    """在当前进程中阻塞运行替身服务，供压测脚本在子进程中调用。"""
+    import uvicorn
+
+    app = create_app(profile, public_bases)
+    uvicorn.run(app, host=host, port=port, log_level="error", access_log=False)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run the fake upstream server for local load testing.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100, help="serve every provider prefix on this single port")
+    parser.add_argument("--latency-ms", type=float, default=80.0, help="median upstream latency")
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="log-normal sigma of upstream latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 503")
+    parser.add_argument("--hang-rate", type=float, default=0.0, help="fraction of requests that hang")
+    args = parser.parse_args()
+    single_base = f"http://{args.host}:{args.port}"
+    serve(args.host, args.port, UpstreamProfile(
+        latency_median_ms=args.latency_ms,
+        latency_sigma=args.latency_sigma,
+        error_rate=args.error_rate,
+        hang_rate=args.hang_rate,
+    ), {name: single_base for name in PROVIDER_PROXY_SETTINGS})
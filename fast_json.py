@@ -0,0 +1,100 @@
+# fast_json.py
+import json
+import re
+from itertools import accumulate
+from typing import Any, Sequence
+
+try:
+    import orjson
+except ImportError:  # orjson 为可选依赖，未安装时使用标准库
+    orjson = None
+
+# orjson.JSONDecodeError 是 json.JSONDecodeError 的子类，两种实现抛出的错误都能用它捕获
+JSONDecodeError = json.JSONDecodeError
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = re.compile(r"\s*")
+
+
+def loads(data: bytes | str) -> Any:
+    """解码一个 JSON 文档，安装了 orjson 时使用 orjson。"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(obj: Any) -> bytes:
+    """编码为紧凑的 UTF-8 JSON (不转义非 ASCII 字符)，安装了 orjson 时使用 orjson。"""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def loads_many(documents: Sequence[str]) -> list[Any]:
+    """
+    把多个 JSON 文档拼成一个数组一次解码，省去逐个调用解码器的开销。
+    拼接后无法解码时逐个解码，无法解码的文档对应位置为 None。
+    """
+    if not documents:
+        return []
+    try:
+        decoded = loads("[" + ",".join(documents) + "]")
+        if len(decoded) == len(documents):
+            return decoded
+    except JSONDecodeError:
+        pass
+    results = []
+    for document in documents:
+        try:
+            results.append(loads(document))
+        except JSONDecodeError:
+            results.append(None)
+    return results
+
+
+_STRING = re.compile(r'"(?:[^"\\]|\\.)*"')
+_BRACKET = re.compile(r"[{}\[\]]")
+_DEPTH_CHANGE = {"{": 1, "[": 1, "}": -1, "]": -1}
+
+
+def _member_value(document: str, position: int, key: str) -> int:
+    """
+    在从 `position` 处 `{` 开始的对象中查找直接成员 `key`，返回其值的起始位置。
+    候选键之前的内容去掉字符串后统计括号深度，只接受位于该对象第一层的候选，
+    嵌套对象或字符串中的同名键会被跳过。
+
+    Raises:
+        KeyError: 对象中没有该成员。
+    """
+    pattern = re.compile(re.escape(json.dumps(key, ensure_ascii=False)) + r"\s*:")
+    for match in pattern.finditer(document, position):
+        region = _STRING.sub("", document[position:match.start()])
+        if '"' in region:
+            # 候选位于某个字符串内部
+            continue
+        depths = list(accumulate(map(_DEPTH_CHANGE.__getitem__, _BRACKET.findall(region))))
+        if min(depths) < 1:
+            # 当前对象在候选之前已经结束
+            break
+        if depths[-1] == 1:
+            return _WHITESPACE.match(document, match.end()).end()
+    raise KeyError(key)
+
+
+def extract_path(document: str, path: Sequence[str]) -> Any:
+    """
+    只解码 `document` 中位于 `path` 的值，例如 ("initialState", "serpList", "items", "entities")。
+    逐级在当前对象的第一层成员中查找键名 (嵌套对象与字符串中的同名键不算)，
+    从最后一级键的值开始解码到该值结束为止，文档的其余部分不做解码。
+
+    Raises:
+        KeyError: 找不到某一级键名，或中间某一级的值不是对象。
+        JSONDecodeError: 定位到的值不是合法 JSON。
+    """
+    position = _WHITESPACE.match(document, 0).end()
+    for key in path:
+        if not document.startswith("{", position):
+            raise KeyError(key)
+        position = _member_value(document, position, key)
+    value, _ = _decoder.raw_decode(document, position)
+    return value
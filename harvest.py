@@ -0,0 +1,159 @@
+# harvest.py
+"""
+离线批量抓取：在进程内直接调用各搜索源与融合逻辑 (不经过 HTTP /search)，
+从文件或标准输入逐行读取查询词，以有界并发执行，并把每个查询的结果逐行追加写入 JSONL 文件。
+
+用法示例:
+    python harvest.py keywords.txt -o results.jsonl --type web --limit 20 --concurrency 16
+    cat keywords.txt | python harvest.py - -o results.jsonl --type image
+
+输出文件本身就是检查点：重新运行同一命令时，已成功写入的查询会被跳过，
+进程崩溃时写了一半的末行会被截掉；带有 error 字段的记录 (包括没有任何搜索源返回结果的查询) 会被重新抓取。使用 --fresh 从头开始。
+上游请求同样经过按主机的出站调度器 (HOST_* 配置)，可用 --host-rate/--host-concurrency 临时覆盖。
+输出行的顺序与输入不一定相同。
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Iterator, TextIO
+
+
+def read_queries(source: TextIO) -> Iterator[str]:
+    for line in source:
+        query = line.strip()
+        if query:
+            yield query
+
+
+def load_checkpoint(path: str, fresh: bool) -> set[tuple[str, str]]:
+    """
+    读取已有输出，返回已成功完成的 (类型, 查询词)。
+    文件末尾不完整的一行 (进程在写入途中退出) 会被截掉，之后的记录从完整的行后继续追加。
+    """
+    if fresh or not os.path.exists(path):
+        open(path, "wb").close()
+        return set()
+
+    done = set()
+    with open(path, "rb+") as f:
+        content = f.read()
+        complete = content.rfind(b"\n") + 1
+        if complete < len(content):
+            logging.warning(f"Dropping a truncated record at the end of {path}.")
+            f.truncate(complete)
+    for line in content[:complete].splitlines():
+        try:
+            record = json.loads(line)
+        except ValueError:
+            continue
+        if not record.get("error"):
+            done.add((record["type"], record["q"]))
+    return done
+
+
+async def harvest(args: argparse.Namespace) -> None:
+    # 必须在导入应用之前完成配置
+    import main as app_module
+
+    done = load_checkpoint(args.output, args.fresh)
+    if done:
+        logging.info(f"Resuming: {len(done)} queries already harvested in {args.output}.")
+
+    queue: asyncio.Queue[str | None] = asyncio.Queue(maxsize=args.concurrency * 2)
+    stats = {"ok": 0, "failed": 0, "skipped": 0}
+    start = time.perf_counter()
+
+    async with app_module.lifespan(app_module.app):
+        with open(args.output, "a", encoding="utf-8") as output:
+
+            def write(record: dict) -> None:
+                output.write(json.dumps(record, ensure_ascii=False) + "\n")
+                output.flush()
+
+            async def worker() -> None:
+                while (q := await queue.get()) is not None:
+                    record = {"q": q, "type": args.type}
+                    try:
+                        depth = app_module.fetch_depth(args.type, args.limit)
+                        fanout = app_module.plan_fanout(args.type, q, depth)
+                        candidates = await app_module.fetch_candidates(args.type, q, fanout, args.limit)
+                        if candidates:
+                            page = candidates[:args.limit]
+                            app_module.provider_yield.observe(fanout, page)
+                            record.update(app_module.serialize_page(args.type, page))
+                            stats["ok"] += 1
+                        else:
+                            # 搜索源全部失败时同样得到空结果，记为失败，续跑时重新抓取
+                            logging.warning(f"Harvesting '{q}' returned no results.")
+                            record["error"] = "no results from any provider"
+                            stats["failed"] += 1
+                    except Exception as e:
+                        logging.warning(f"Harvesting '{q}' failed: {e!r}")
+                        record["error"] = repr(e)
+                        stats["failed"] += 1
+                    record["fetched_at"] = datetime.now(timezone.utc).isoformat(timespec="seconds")
+                    write(record)
+
+                    finished = stats["ok"] + stats["failed"]
+                    if finished % args.progress_every == 0:
+                        elapsed = time.perf_counter() - start
+                        logging.info(f"Harvested {finished} queries ({stats['failed']} failed) in {elapsed:.0f}s, {finished / elapsed:.1f} q/s.")
+
+            workers = [asyncio.create_task(worker()) for _ in range(args.concurrency)]
+            source = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8")
+            try:
+                for q in read_queries(source):
+                    key = (args.type, q)
+                    if key in done:
+                        stats["skipped"] += 1
+                        continue
+                    # 输入中重复的查询只抓取一次
+                    done.add(key)
+                    await queue.put(q)
+                for _ in workers:
+                    await queue.put(None)
+                await asyncio.gather(*workers)
+            finally:
+                for task in workers:
+                    task.cancel()
+                if source is not sys.stdin:
+                    source.close()
+
+    elapsed = time.perf_counter() - start
+    print("=" * 60)
+    print(f"Harvested:          {stats['ok']} ok, {stats['failed']} failed, {stats['skipped']} skipped (already done)")
+    print(f"Elapsed:            {elapsed:.1f}s ({(stats['ok'] + stats['failed']) / max(elapsed, 1e-9):.1f} queries/s)")
+    print(f"Output:             {args.output}")
+    print("=" * 60)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Harvest search results for many queries into a JSONL file.")
+    parser.add_argument("input", help="file with one query per line, or - for stdin")
+    parser.add_argument("-o", "--output", required=True, help="JSONL output file, also used as the resume checkpoint")
+    parser.add_argument("--type", choices=["web", "image"], default="web", help="search type")
+    parser.add_argument("--limit", type=int, default=10, help="results kept per query")
+    parser.add_argument("--concurrency", type=int, default=8, help="queries processed at the same time")
+    parser.add_argument("--host-rate", type=float, default=None, help="override HOST_RATE_PER_SECOND")
+    parser.add_argument("--host-concurrency", type=int, default=None, help="override HOST_MAX_CONCURRENCY")
+    parser.add_argument("--progress-every", type=int, default=100, help="log progress every N queries")
+    parser.add_argument("--fresh", action="store_true", help="discard existing output instead of resuming")
+    args = parser.parse_args()
+
+    # 批量任务直接调用搜索源，不经过结果缓存，也不需要热点预取
+    os.environ["PREFETCH_ENABLED"] = "false"
+    if args.host_rate is not None:
+        os.environ["HOST_RATE_PER_SECOND"] = str(args.host_rate)
+    if args.host_concurrency is not None:
+        os.environ["HOST_MAX_CONCURRENCY"] = str(args.host_concurrency)
+
+    asyncio.run(harvest(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+# html_stream.py
+from typing import Any, Callable
+
+from lxml import etree
+
+from profiling import stage
+
+
+def has_class(element, name: str) -> bool:
+    return name in (element.get("class") or "").split()
+
+
+def element_text(element, separator: str = "") -> str:
+    """与 BeautifulSoup 的 `get_text(separator, strip=True)` 一致：逐段去除首尾空白、丢弃空段后拼接。"""
+    return separator.join(part.strip() for part in element.itertext() if part.strip())
+
+
+def drop_element(element) -> None:
+    """从树中移除元素但保留其后的文本 (tail)，相当于 BeautifulSoup 的 `decompose()`。"""
+    parent = element.getparent()
+    if parent is None:
+        return
+    if element.tail:
+        previous = element.getprevious()
+        if previous is not None:
+            previous.tail = (previous.tail or "") + element.tail
+        else:
+            parent.text = (parent.text or "") + element.tail
+    parent.remove(element)
+
+
+class StreamingExtractor:
+    """
+    增量解析 HTML：响应体分块喂给 lxml 的 HTMLPullParser，每当一个 `tag` 元素闭合，
+    就用 `matches` 判断它是否为结果条目并立即交给 `extract` 抽取，抽取后清空该元素以释放内存；
+    其余闭合的 `tag` 元素会交给可选的 `watch` 回调 (例如收集翻页表单)。
+    达到 `limit` 条结果或在原始字节中发现任一拦截标记后，`feed` 返回 True，调用方即可停止读取。
+    """
+
+    def __init__(
+        self,
+        tag: str,
+        matches: Callable[..., bool],
+        extract: Callable[..., Any | None],
+        limit: int,
+        block_markers: tuple[bytes, ...] = (),
+        encoding: str = "utf-8",
+        watch: Callable[..., None] | None = None,
+    ):
+        self.matches = matches
+        self.extract = extract
+        self.watch = watch
+        self.limit = limit
+        self.block_markers = block_markers
+        self.results: list[Any] = []
+        self.blocked = False
+        self.bytes_read = 0
+        self._parser = etree.HTMLPullParser(events=("end",), tag=tag, encoding=encoding)
+        # 保留上一块末尾的若干字节，避免拦截标记恰好被切断在两块之间
+        self._overlap = max((len(marker) for marker in block_markers), default=1) - 1
+        self._tail = b""
+
+    @property
+    def done(self) -> bool:
+        return self.blocked or len(self.results) >= self.limit
+
+    def feed(self, chunk: bytes) -> bool:
+        self.bytes_read += len(chunk)
+        if self.block_markers:
+            window = self._tail + chunk
+            if any(marker in window for marker in self.block_markers):
+                self.blocked = True
+                return True
+            self._tail = window[-self._overlap:] if self._overlap else b""
+        self._parser.feed(chunk)
+        self._drain()
+        return self.done
+
+    def _drain(self) -> None:
+        for _, element in self._parser.read_events():
+            if self.done:
+                break
+            if self.matches(element):
+                item = self.extract(element)
+                if item:
+                    self.results.append(item)
+                element.clear(keep_tail=True)
+            elif self.watch is not None:
+                self.watch(element)
+
+    def close(self) -> list[Any]:
+        """结束解析并返回结果。提前停止时不再解析剩余内容。"""
+        if not self.done:
+            try:
+                self._parser.close()
+            except etree.LxmlError:
+                pass
+            self._drain()
+        return self.results[:self.limit]
+
+    async def consume(self, response, provider: str) -> list[Any]:
+        """从 `fetch_stream` 返回的流式响应中读取并解析，满足条件后立即停止读取。"""
+        async for chunk in response.iter_bytes():
+            with stage(provider, "parse"):
+                if self.feed(chunk):
+                    break
+        with stage(provider, "parse"):
+            return self.close()
@@ -1,11 +1,329 @@
 # http_clients.py
-from typing import Optional
-from httpx import AsyncClient
+import asyncio
+import base64
+import gzip
+import heapq
+import itertools
+import json
+import logging
+import os
+import random
+import time
+from collections import OrderedDict, defaultdict, deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from email.utils import parsedate_to_datetime
+from typing import Any, Awaitable, Callable, Literal, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+import httpx
+from httpx import AsyncClient, Response
 from curl_cffi.requests import AsyncSession
+from curl_cffi.requests import exceptions as curl_exceptions
+
+from admission import TokenBucket
+from config import settings
+from latency import timeout_policy
+from mirrors import EndpointPool
+from profiling import record_stage, stage
 
 httpx_client: Optional[AsyncClient] = None
 cffi_session: Optional[AsyncSession] = None
 
+# 全局在途上游请求上限，防止流量突增时无界的并发扇出
+upstream_slots = asyncio.Semaphore(settings.UPSTREAM_MAX_IN_FLIGHT)
+
+# 录制时从请求键中抹去的敏感查询参数
+SENSITIVE_PARAMS = {"api_key", "key", "token"}
+
+# 请求类型的调度优先级，数值越小越先发出；未列出的类型 (detail、redirect 等) 排在搜索页之后
+KIND_PRIORITY = {"search": 0}
+
+# 上游返回 429 时暂停向该主机发送的秒数：取自 Retry-After，缺省为 DEFAULT_RETRY_AFTER，不超过 MAX_RETRY_AFTER
+DEFAULT_RETRY_AFTER = 1.0
+MAX_RETRY_AFTER = 60.0
+
+
+class HostBusy(Exception):
+    """等待目标主机的发送名额超过 HOST_MAX_WAIT 秒，请求被放弃。"""
+
+
+class HostGate:
+    """
+    单个上游主机的发送闸门：令牌桶限制请求速率，同时限制在途请求数。
+    放不下的请求按 (优先级, 到达顺序) 排队，名额或令牌可用时优先放行搜索页请求。
+    上游要求限流时 (`pause`)，暂停期间的请求全部排队，到期后再按顺序放行。
+    """
+
+    def __init__(self, rate: float, burst: int, max_concurrency: int):
+        self.bucket = TokenBucket(rate, burst) if rate > 0 else None
+        self.max_concurrency = max_concurrency
+        self.active = 0
+        self._waiters: list[tuple[int, int, asyncio.Future]] = []
+        self._order = itertools.count()
+        self._timer: asyncio.TimerHandle | None = None
+        self.paused_until = 0.0
+
+    def _pause_remaining(self) -> float:
+        return self.paused_until - asyncio.get_running_loop().time()
+
+    def pause(self, seconds: float) -> None:
+        """在 `seconds` 秒内不再放行新请求 (已在途的请求不受影响)。"""
+        loop = asyncio.get_running_loop()
+        self.paused_until = max(self.paused_until, loop.time() + seconds)
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = loop.call_later(seconds, self._dispatch)
+
+    def _try_start(self) -> bool:
+        if self.active >= self.max_concurrency or self._pause_remaining() > 0:
+            return False
+        if self.bucket is not None and self.bucket.try_acquire():
+            return False
+        self.active += 1
+        return True
+
+    def _dispatch(self) -> None:
+        self._timer = None
+        while self._waiters:
+            _, _, waiter = self._waiters[0]
+            if waiter.done():
+                heapq.heappop(self._waiters)
+                continue
+            if self.active >= self.max_concurrency:
+                return
+            wait = self._pause_remaining()
+            if wait <= 0:
+                wait = self.bucket.try_acquire() if self.bucket is not None else 0.0
+            if wait > 0:
+                self._timer = asyncio.get_running_loop().call_later(wait, self._dispatch)
+                return
+            heapq.heappop(self._waiters)
+            self.active += 1
+            waiter.set_result(None)
+
+    async def acquire(self, priority: int, max_wait: float) -> None:
+        # 同优先级或更高优先级的请求已在排队时不插队
+        if not any(p <= priority and not w.done() for p, _, w in self._waiters) and self._try_start():
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._order), waiter))
+        if self._timer is None:
+            self._dispatch()
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), timeout=max_wait or None)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done() and not waiter.cancelled():
+                # 放行与超时/取消同时发生：名额已分配，归还它
+                self.release()
+            else:
+                waiter.cancel()
+            if isinstance(e, asyncio.TimeoutError):
+                raise HostBusy(f"Waited more than {max_wait}s for a send slot.") from None
+            raise
+
+    def release(self) -> None:
+        self.active -= 1
+        if self._timer is None:
+            self._dispatch()
+
+
+class HostScheduler:
+    """
+    所有上游请求的出口调度器，按主机 (host:port) 各维护一个 `HostGate`。
+    默认限额来自 HOST_RATE_PER_SECOND / HOST_BURST / HOST_MAX_CONCURRENCY，
+    HOST_LIMITS 可按主机名 (含其子域名) 单独覆盖。
+    """
+
+    def __init__(self, rate: float, burst: int, max_concurrency: int, overrides: str, max_wait: float):
+        self.default_limits = (rate, burst, max_concurrency)
+        self.overrides = self._parse_overrides(overrides)
+        self.max_wait = max_wait
+        self.gates: dict[str, HostGate] = {}
+
+    @staticmethod
+    def _parse_overrides(value: str) -> dict[str, tuple[float, int, int]]:
+        """解析 `i.pximg.net=5/10/4,www.acg66.com=1/2/2` 形式的配置 (速率/突发/并发)。"""
+        overrides = {}
+        for entry in value.split(","):
+            host, _, limits = entry.strip().partition("=")
+            if host and limits:
+                rate, burst, concurrency = limits.split("/")
+                overrides[host.strip().lower()] = (float(rate), int(burst), int(concurrency))
+        return overrides
+
+    def _limits_for(self, hostname: str) -> tuple[float, int, int]:
+        for host, limits in self.overrides.items():
+            if hostname == host or hostname.endswith("." + host):
+                return limits
+        return self.default_limits
+
+    def gate(self, url: str) -> HostGate:
+        parts = urlsplit(url)
+        key = parts.netloc.lower()
+        gate = self.gates.get(key)
+        if gate is None:
+            gate = HostGate(*self._limits_for((parts.hostname or "").lower()))
+            self.gates[key] = gate
+        return gate
+
+    async def acquire(self, url: str, kind: str) -> HostGate:
+        """等待 `url` 所在主机的发送名额，返回对应闸门；请求结束后必须调用其 `release`。"""
+        gate = self.gate(url)
+        await gate.acquire(KIND_PRIORITY.get(kind, 1), self.max_wait)
+        return gate
+
+    def observe(self, url: str, response: Any) -> None:
+        """上游返回 429 时按 Retry-After 暂停该主机的发送闸门。"""
+        if response.status_code == 429:
+            seconds = retry_after(response.headers.get("retry-after"))
+            logging.info(f"{urlsplit(url).netloc} returned 429, pausing for {seconds:.1f}s.")
+            self.gate(url).pause(seconds)
+
+
+def retry_after(value: str | None) -> float:
+    """解析 Retry-After (秒数或 HTTP 日期)，无法解析时返回 DEFAULT_RETRY_AFTER，结果限制在 MAX_RETRY_AFTER 以内。"""
+    seconds = DEFAULT_RETRY_AFTER
+    if value:
+        value = value.strip()
+        try:
+            seconds = float(value)
+        except ValueError:
+            try:
+                seconds = parsedate_to_datetime(value).timestamp() - time.time()
+            except (TypeError, ValueError):
+                pass
+    return min(max(seconds, 0.0), MAX_RETRY_AFTER)
+
+
+host_scheduler = HostScheduler(
+    settings.HOST_RATE_PER_SECOND,
+    settings.HOST_BURST,
+    settings.HOST_MAX_CONCURRENCY,
+    settings.HOST_LIMITS,
+    settings.HOST_MAX_WAIT,
+)
+
+
+def flight_key(session: AsyncClient | AsyncSession, url: str, kwargs: dict[str, Any]) -> tuple:
+    """请求的合并键：客户端、URL 与全部请求参数 (请求头名称不区分大小写)。"""
+    parts = []
+    for name, value in sorted(kwargs.items()):
+        if isinstance(value, dict):
+            value = tuple(sorted(
+                (str(k).lower() if name == "headers" else str(k), str(v)) for k, v in value.items()
+            ))
+        else:
+            value = repr(value)
+        parts.append((name, value))
+    return id(session), url, tuple(parts)
+
+
+class Flight:
+    """一次在途的上游传输及等待它的调用方数量。"""
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    上游 GET 的请求合并与微缓存。相同的请求 (见 `flight_key`) 同时在途时只发出一次，
+    所有调用方等待同一次传输、得到同一个响应对象；只有全部调用方都取消时才取消这次传输。
+    主机在 UPSTREAM_MICROCACHE 中配置了缓存秒数时，成功 (状态码低于 400) 的响应在此期间直接复用，
+    缓存的响应体总大小不超过 `max_bytes`，超出时淘汰最久未用的。
+    """
+
+    def __init__(self, microcache: str, max_bytes: int):
+        self.ttls = self._parse_ttls(microcache)
+        self.max_bytes = max_bytes
+        self.cached_bytes = 0
+        self.coalesced = 0
+        self.cache_hits = 0
+        self._flights: dict[tuple, Flight] = {}
+        self._cache: OrderedDict[tuple, tuple[Any, int, float]] = OrderedDict()
+
+    @staticmethod
+    def _parse_ttls(value: str) -> dict[str, float]:
+        """解析 `www.bing.com=5,www.pixiv.net=60` 形式的配置 (缓存秒数)。"""
+        ttls = {}
+        for entry in value.split(","):
+            host, _, seconds = entry.strip().partition("=")
+            if host and seconds:
+                ttls[host.strip().lower()] = float(seconds)
+        return ttls
+
+    def _ttl_for(self, url: str) -> float:
+        hostname = (urlsplit(url).hostname or "").lower()
+        for host, ttl in self.ttls.items():
+            if hostname == host or hostname.endswith("." + host):
+                return ttl
+        return 0.0
+
+    def _cached(self, key: tuple) -> Any | None:
+        cached = self._cache.get(key)
+        if cached is None:
+            return None
+        response, size, expires_at = cached
+        if expires_at <= time.monotonic():
+            del self._cache[key]
+            self.cached_bytes -= size
+            return None
+        self._cache.move_to_end(key)
+        return response
+
+    def _store(self, key: tuple, response: Any, ttl: float) -> None:
+        size = len(response.content)
+        if size > self.max_bytes:
+            return
+        previous = self._cache.pop(key, None)
+        if previous is not None:
+            self.cached_bytes -= previous[1]
+        self._cache[key] = (response, size, time.monotonic() + ttl)
+        self.cached_bytes += size
+        while self.cached_bytes > self.max_bytes:
+            _, (_, evicted_size, _) = self._cache.popitem(last=False)
+            self.cached_bytes -= evicted_size
+
+    def _landed(self, key: tuple, url: str, flight: Flight) -> None:
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        task = flight.task
+        if task.cancelled() or task.exception() is not None:
+            return
+        ttl = self._ttl_for(url)
+        if ttl > 0 and task.result().status_code < 400:
+            self._store(key, task.result(), ttl)
+
+    async def run(self, key: tuple, url: str, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        """返回 `key` 对应请求的响应：命中微缓存时直接返回，已有相同请求在途时等待它，否则调用 `fetch` 发出请求。"""
+        response = self._cached(key)
+        if response is not None:
+            self.cache_hits += 1
+            return response
+
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = Flight(asyncio.ensure_future(fetch()))
+            self._flights[key] = flight
+            flight.task.add_done_callback(lambda _: self._landed(key, url, flight))
+        else:
+            self.coalesced += 1
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                # 最后一个调用方也已取消：放弃这次传输，之后的相同请求重新发出
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+                flight.task.cancel()
+                await asyncio.wait({flight.task})
+
+
+single_flight = SingleFlight(settings.UPSTREAM_MICROCACHE, settings.UPSTREAM_MICROCACHE_MAX_BYTES)
+
 def get_httpx_client() -> AsyncClient:
     """
     获取全局共享的 httpx.AsyncClient 实例。
@@ -38,4 +356,659 @@ def get_cffi_session() -> AsyncSession:
             "CFFI session is not initialized. "
             "The application lifespan event probably failed."
         )
-    return cffi_session
\ No newline at end of file
+    return cffi_session
+
+async def upstream_get(
+    session: AsyncClient | AsyncSession,
+    url: str,
+    *,
+    provider: str,
+    kind: str,
+    default_timeout: float | None = None,
+    pool: EndpointPool | None = None,
+    coalesce: bool = True,
+    max_bytes: int = 0,
+    **kwargs: Any,
+):
+    """
+    通过给定的客户端发起一次上游 GET 请求，超时由自适应超时策略决定。
+    同时在途的相同请求合并为一次传输，并共享同一个响应对象 (见 `SingleFlight`)，调用方不应修改响应。
+
+    Args:
+        session: 全局共享的 httpx 客户端或 curl_cffi 会话。
+        url: 请求地址。
+        provider: 搜索源名称，用于按源统计延迟。
+        kind: 请求类型，如 'search'、'detail'、'redirect'。
+        default_timeout: 样本不足时使用的超时 (秒)。
+        pool: 该搜索源的地址池。给出时请求会发往最快的健康地址，并在必要时对冲到次优地址。
+        coalesce: 是否与相同的在途请求合并、使用微缓存。响应依赖调用时机等请求以外的状态时传 False。
+        max_bytes: 响应体字节数上限 (0 为不限)。Content-Length 超限时不读取响应体，读取中超限时立即断开。
+        **kwargs: 透传给底层客户端 `get` 的其余参数。
+
+    Raises:
+        ResponseTooLarge: 响应体超过 `max_bytes`。
+
+    Returns:
+        底层客户端返回的响应对象。
+    """
+    # 跳转解析单独计为 resolve 阶段，其余请求计为 fetch 阶段
+    with stage(provider, "resolve" if kind == "redirect" else "fetch"):
+        if traffic_archive is not None and traffic_archive.mode == "replay":
+            return await traffic_archive.replay(url, kwargs.get("params"))
+
+        timeout = timeout_policy.get_timeout(provider, kind, default_timeout)
+
+        async def send(target_url: str):
+            gate = await host_scheduler.acquire(target_url, kind)
+            try:
+                async with upstream_slots:
+                    with timeout_policy.measure(provider, kind, timeout):
+                        if max_bytes:
+                            response = await _read_limited(session, target_url, timeout, max_bytes, **kwargs)
+                        else:
+                            response = await session.get(target_url, timeout=timeout, **kwargs)
+                host_scheduler.observe(target_url, response)
+                return response
+            finally:
+                gate.release()
+
+        async def fetch():
+            start = time.perf_counter()
+            if pool is None:
+                response = await send(url)
+            else:
+                response = await pool.request(url, kind, send)
+            if traffic_archive is not None and traffic_archive.mode == "record":
+                traffic_archive.record(url, kwargs.get("params"), response, time.perf_counter() - start)
+            return response
+
+        if not coalesce or not settings.UPSTREAM_COALESCE_ENABLED:
+            return await fetch()
+        return await single_flight.run(flight_key(session, url, kwargs), url, fetch)
+
+
+
+def _charset(headers: Any, default: str = "utf-8") -> str:
+    content_type = headers.get("content-type", "") or ""
+    if "charset=" in content_type:
+        return content_type.split("charset=")[-1].split(";")[0].strip().strip('"') or default
+    return default
+
+
+class ResponseTooLarge(Exception):
+    """上游响应体超过 UPSTREAM_MAX_RESPONSE_BYTES。"""
+
+
+class UpstreamStream:
+    """
+    流式读取中的上游响应。`iter_bytes` 逐块产出响应体，并把等待数据的时间计入 fetch 阶段；
+    录制模式下会保留已读取的字节，供关闭时写入归档。`buffered` 表示响应体已完整读入内存。
+    给出 `max_bytes` 时，读取量超过该值即抛出 ResponseTooLarge。
+    """
+
+    def __init__(self, response: Any, provider: str, *, buffered: bool = False, keep_body: bool = False, max_bytes: int = 0):
+        self.response = response
+        self.provider = provider
+        self.buffered = buffered
+        self.max_bytes = max_bytes
+        self.bytes_read = 0
+        self.status_code: int = response.status_code
+        self.url: str = str(response.url)
+        self.headers = response.headers
+        self.encoding = _charset(response.headers)
+        self._chunks: list[bytes] | None = [] if keep_body else None
+
+    @property
+    def content(self) -> bytes:
+        """已读取的响应体 (仅录制模式下保留)。"""
+        return b"".join(self._chunks or ())
+
+    def raise_for_status(self) -> None:
+        self.response.raise_for_status()
+
+    async def _raw_chunks(self):
+        if self.buffered:
+            yield self.response.content
+        elif isinstance(self.response, Response):
+            async for chunk in self.response.aiter_bytes():
+                yield chunk
+        else:
+            async for chunk in self.response.aiter_content():
+                yield chunk
+
+    async def iter_bytes(self):
+        chunks = self._raw_chunks()
+        while True:
+            start = time.perf_counter()
+            try:
+                chunk = await chunks.__anext__()
+            except StopAsyncIteration:
+                break
+            finally:
+                record_stage(self.provider, "fetch", time.perf_counter() - start)
+            if chunk:
+                self.bytes_read += len(chunk)
+                if self.max_bytes and self.bytes_read > self.max_bytes:
+                    raise ResponseTooLarge(f"Response from {self.url} exceeds {self.max_bytes} bytes.")
+                if self._chunks is not None:
+                    self._chunks.append(chunk)
+                yield chunk
+
+    async def aclose(self) -> None:
+        if not self.buffered:
+            await _close_stream(self.response)
+
+
+async def _open_stream(session: AsyncClient | AsyncSession, url: str, timeout: float, **kwargs: Any):
+    if isinstance(session, AsyncClient):
+        request = session.build_request("GET", url, timeout=timeout, **kwargs)
+        return await session.send(request, stream=True)
+    return await session.get(url, timeout=timeout, stream=True, **kwargs)
+
+
+async def _close_stream(response: Any) -> None:
+    """关闭流式响应。curl_cffi 的 `aclose` 会等待传输结束，先通知其中止下载。"""
+    if not isinstance(response, Response) and response.quit_now is not None:
+        response.quit_now.set()
+    await response.aclose()
+
+
+# 响应体已在读取时解码，重建 httpx 响应时去掉描述原始传输的头
+_TRANSFER_HEADERS = {"content-encoding", "content-length", "transfer-encoding"}
+
+
+async def _read_limited(session: AsyncClient | AsyncSession, url: str, timeout: float, max_bytes: int, **kwargs: Any):
+    """
+    以流式方式读入完整响应体，返回与 `get` 相同类型的响应。
+    Content-Length 超过 `max_bytes` 时不读取响应体，读取量超过 `max_bytes` 时立即断开，均抛出 ResponseTooLarge。
+    """
+    response = await _open_stream(session, url, timeout, **kwargs)
+    chunks: list[bytes] = []
+    try:
+        length = response.headers.get("content-length")
+        if length and length.isdigit() and int(length) > max_bytes:
+            raise ResponseTooLarge(f"Response from {url} declares {length} bytes, limit is {max_bytes}.")
+        size = 0
+        body = response.aiter_bytes() if isinstance(response, Response) else response.aiter_content()
+        async for chunk in body:
+            size += len(chunk)
+            if size > max_bytes:
+                raise ResponseTooLarge(f"Response from {url} exceeds {max_bytes} bytes.")
+            chunks.append(chunk)
+    finally:
+        await _close_stream(response)
+    content = b"".join(chunks)
+    if isinstance(response, Response):
+        headers = [(k, v) for k, v in response.headers.multi_items() if k.lower() not in _TRANSFER_HEADERS]
+        return Response(
+            response.status_code, headers=headers, content=content,
+            request=response.request, history=response.history, extensions=response.extensions,
+        )
+    response.content = content
+    return response
+
+
+@asynccontextmanager
+async def upstream_stream(
+    session: AsyncClient | AsyncSession,
+    url: str,
+    *,
+    provider: str,
+    kind: str,
+    default_timeout: float | None = None,
+    pool: EndpointPool | None = None,
+    max_bytes: int = 0,
+    **kwargs: Any,
+):
+    """
+    与 `upstream_get` 相同的超时、对冲与录制/回放逻辑，但以流式方式读取响应体，
+    调用方可以边读边解析，并在得到足够结果后提前退出 `async with` 以关闭连接。
+    在途名额一直占用到流关闭为止；对冲中落败但已建立的流会被立即关闭。
+    录制模式下只记录实际读取到的部分响应体，回放时会得到相同的解析结果。
+    STREAMING_PARSE_ENABLED 关闭时退化为一次性读取完整响应体。
+
+    Yields:
+        UpstreamStream
+    """
+    if not settings.STREAMING_PARSE_ENABLED or (traffic_archive is not None and traffic_archive.mode == "replay"):
+        response = await upstream_get(
+            session, url, provider=provider, kind=kind, default_timeout=default_timeout, pool=pool, max_bytes=max_bytes, **kwargs
+        )
+        yield UpstreamStream(response, provider, buffered=True, max_bytes=max_bytes)
+        return
+
+    timeout = timeout_policy.get_timeout(provider, kind, default_timeout)
+    # 已建立的流及其主机闸门，主机名额与在途名额都占用到流关闭为止
+    opened: list[tuple[Any, HostGate]] = []
+
+    async def send(target_url: str):
+        gate = await host_scheduler.acquire(target_url, kind)
+        try:
+            await upstream_slots.acquire()
+        except BaseException:
+            gate.release()
+            raise
+        try:
+            with timeout_policy.measure(provider, kind, timeout):
+                response = await _open_stream(session, target_url, timeout, **kwargs)
+        except BaseException:
+            upstream_slots.release()
+            gate.release()
+            raise
+        host_scheduler.observe(target_url, response)
+        opened.append((response, gate))
+        return response
+
+    start = time.perf_counter()
+    response = None
+    try:
+        with stage(provider, "fetch"):
+            if pool is None:
+                response = await send(url)
+            else:
+                response = await pool.request(url, kind, send)
+    finally:
+        for other, other_gate in opened:
+            if other is not response:
+                await _close_stream(other)
+                upstream_slots.release()
+                other_gate.release()
+    gate = next(g for r, g in opened if r is response)
+
+    recording = traffic_archive is not None and traffic_archive.mode == "record"
+    stream = UpstreamStream(response, provider, keep_body=recording, max_bytes=max_bytes)
+    try:
+        yield stream
+    finally:
+        await stream.aclose()
+        upstream_slots.release()
+        gate.release()
+        if recording:
+            traffic_archive.record(url, kwargs.get("params"), stream, time.perf_counter() - start)
+
+
+@dataclass(slots=True)
+class HostProfile:
+    """
+    逻辑主机 (即搜索源名称，如 'bing_images') 的传输配置：`backend` 为使用的客户端，
+    `impersonate` 为 curl_cffi 模拟的浏览器指纹 (None 为会话默认的 chrome120，httpx 忽略此项)，
+    `timeouts` 为各请求类型在延迟样本不足时的默认超时 (秒)。
+    """
+    backend: Literal["httpx", "cffi"] = "cffi"
+    impersonate: str | None = None
+    timeouts: dict[str, float] = field(default_factory=dict)
+
+
+# 各逻辑主机的默认配置，UPSTREAM_BACKENDS / UPSTREAM_IMPERSONATE 可按主机覆盖
+HOST_PROFILES = {
+    "ddg": HostProfile("httpx", timeouts={"search": 15}),
+    "serpapi": HostProfile("httpx", timeouts={"search": 15}),
+    "bing": HostProfile(timeouts={"search": 20}),
+    "bing_images": HostProfile(impersonate="edge101", timeouts={"search": 20}),
+    "baidu": HostProfile(timeouts={"search": 20, "redirect": 5}),
+    "pixiv": HostProfile(timeouts={"search": 6, "detail": 4}),
+    "yandex": HostProfile(timeouts={"search": 15}),
+    "dimtown": HostProfile(timeouts={"search": 15, "detail": 10}),
+    "acg66": HostProfile(timeouts={"search": 20, "detail": 15}),
+}
+
+# 可以重试的错误：连接失败、超时，以及上游故障的状态码。
+# 429 不重试：重试只会加重限流，由 `HostScheduler.observe` 按 Retry-After 暂停该主机
+RETRYABLE_ERRORS = (httpx.TransportError, curl_exceptions.ConnectionError, curl_exceptions.Timeout, asyncio.TimeoutError)
+
+
+def is_retryable_status(status_code: int) -> bool:
+    return status_code >= 500
+
+
+def _parse_host_values(value: str) -> dict[str, str]:
+    """解析 `ddg=httpx,pixiv=cffi` 形式的配置。"""
+    values = {}
+    for entry in value.split(","):
+        host, _, setting = entry.strip().partition("=")
+        if host and setting:
+            values[host.strip()] = setting.strip()
+    return values
+
+
+def _apply_overrides() -> None:
+    for host, backend in _parse_host_values(settings.UPSTREAM_BACKENDS).items():
+        if backend not in ("httpx", "cffi"):
+            raise ValueError(f"UPSTREAM_BACKENDS: unknown backend '{backend}' for host '{host}'.")
+        HOST_PROFILES.setdefault(host, HostProfile()).backend = backend
+    for host, profile in _parse_host_values(settings.UPSTREAM_IMPERSONATE).items():
+        HOST_PROFILES.setdefault(host, HostProfile()).impersonate = profile
+
+
+_apply_overrides()
+
+
+@dataclass(slots=True)
+class FetchTiming:
+    """
+    一次 `fetch` / `fetch_stream` 调用的计时记录，请求结束后交给计时钩子。
+    `status_code` 为最终响应的状态码 (失败时为 None)，`attempts` 含重试次数，
+    `size` 为响应体字节数 (流式请求为实际读取的字节数)，`error` 为失败时的异常描述。
+    """
+    host: str
+    kind: str
+    url: str
+    backend: str
+    status_code: int | None = None
+    attempts: int = 0
+    elapsed: float = 0.0
+    size: int = 0
+    error: str | None = None
+
+
+TimingHook = Callable[[FetchTiming], None]
+
+# 全局计时钩子，每次 fetch / fetch_stream 结束后依次调用
+timing_hooks: list[TimingHook] = []
+
+
+def add_timing_hook(hook: TimingHook) -> None:
+    timing_hooks.append(hook)
+
+
+def _emit_timing(timing: FetchTiming, on_timing: TimingHook | None) -> None:
+    for hook in (*timing_hooks, on_timing):
+        if hook is None:
+            continue
+        try:
+            hook(timing)
+        except Exception as e:
+            logging.warning(f"Timing hook {hook!r} failed: {e}")
+
+
+def _client_args(profile: HostProfile, headers: dict | None, params: dict | None) -> tuple[Any, dict[str, Any]]:
+    """按主机配置选择客户端，并组装传给其 `get` 的参数。"""
+    kwargs: dict[str, Any] = {}
+    if headers:
+        kwargs["headers"] = headers
+    if params:
+        kwargs["params"] = params
+    if profile.backend == "httpx":
+        return get_httpx_client(), kwargs
+    if profile.impersonate:
+        kwargs["impersonate"] = profile.impersonate
+    return get_cffi_session(), kwargs
+
+
+async def _backoff(attempt: int) -> None:
+    """第 `attempt` 次重试前等待：指数退避，并在 [0, 上限] 内随机取值 (full jitter)，避免重试同时涌向上游。"""
+    await asyncio.sleep(random.uniform(0, settings.UPSTREAM_RETRY_BACKOFF * 2 ** (attempt - 1)))
+
+
+async def fetch(
+    host: str,
+    url: str,
+    *,
+    kind: str,
+    pool: EndpointPool | None = None,
+    headers: dict | None = None,
+    params: dict | None = None,
+    timeout: float | None = None,
+    coalesce: bool = True,
+    on_timing: TimingHook | None = None,
+):
+    """
+    统一的上游 GET 入口：按逻辑主机的配置 (`HOST_PROFILES`) 选择 httpx 或 curl_cffi 客户端与浏览器指纹，
+    经 `upstream_get` 发出请求 (主机调度、自适应超时、对冲、请求合并、录制/回放)，
+    连接失败、超时或返回 5xx 时以带抖动的指数退避重试至多 UPSTREAM_RETRIES 次。
+    响应体超过 UPSTREAM_MAX_RESPONSE_BYTES 时在读取过程中放弃，不会整体读入内存。
+
+    Args:
+        host: 逻辑主机，即搜索源名称，同时用于按源统计延迟与分阶段耗时。
+        url: 请求地址。
+        kind: 请求类型，如 'search'、'detail'、'redirect'。
+        pool: 该搜索源的地址池。
+        headers: 请求头。
+        params: 查询参数。
+        timeout: 延迟样本不足时使用的超时，省略时取主机配置中该请求类型的默认值。
+        coalesce: 是否与相同的在途请求合并，见 `upstream_get`。
+        on_timing: 本次请求结束后调用的计时钩子 (在全局钩子之后)。
+
+    Raises:
+        ResponseTooLarge: 响应体超过 UPSTREAM_MAX_RESPONSE_BYTES。
+
+    Returns:
+        底层客户端返回的响应对象 (重试用尽时为最后一次的响应)。
+    """
+    profile = HOST_PROFILES.get(host) or HostProfile()
+    session, kwargs = _client_args(profile, headers, params)
+    default_timeout = timeout if timeout is not None else profile.timeouts.get(kind)
+    timing = FetchTiming(host, kind, url, profile.backend)
+    start = time.perf_counter()
+    try:
+        while True:
+            timing.attempts += 1
+            retries_left = timing.attempts <= settings.UPSTREAM_RETRIES
+            try:
+                response = await upstream_get(
+                    session, url, provider=host, kind=kind, default_timeout=default_timeout, pool=pool, coalesce=coalesce,
+                    max_bytes=settings.UPSTREAM_MAX_RESPONSE_BYTES, **kwargs
+                )
+            except RETRYABLE_ERRORS as e:
+                if not retries_left:
+                    raise
+                logging.info(f"Retrying {host} {kind} request after {type(e).__name__}: {url}")
+            else:
+                if not (retries_left and is_retryable_status(response.status_code)):
+                    break
+                logging.info(f"Retrying {host} {kind} request after status {response.status_code}: {url}")
+            await _backoff(timing.attempts)
+
+        timing.status_code = response.status_code
+        timing.size = len(response.content)
+        return response
+    except BaseException as e:
+        timing.error = repr(e)
+        raise
+    finally:
+        timing.elapsed = time.perf_counter() - start
+        _emit_timing(timing, on_timing)
+
+
+@asynccontextmanager
+async def fetch_stream(
+    host: str,
+    url: str,
+    *,
+    kind: str,
+    pool: EndpointPool | None = None,
+    headers: dict | None = None,
+    params: dict | None = None,
+    timeout: float | None = None,
+    on_timing: TimingHook | None = None,
+):
+    """
+    `fetch` 的流式版本，经 `upstream_stream` 边读边解析，读取量超过 UPSTREAM_MAX_RESPONSE_BYTES 时停止并抛出 ResponseTooLarge。
+    流一旦交给调用方就不再重试；建立连接时的可重试错误按 `fetch` 的规则重试。
+
+    Yields:
+        UpstreamStream
+    """
+    profile = HOST_PROFILES.get(host) or HostProfile()
+    session, kwargs = _client_args(profile, headers, params)
+    default_timeout = timeout if timeout is not None else profile.timeouts.get(kind)
+    timing = FetchTiming(host, kind, url, profile.backend)
+    start = time.perf_counter()
+    stream = None
+    try:
+        while True:
+            timing.attempts += 1
+            retries_left = timing.attempts <= settings.UPSTREAM_RETRIES
+            try:
+                async with upstream_stream(
+                    session, url, provider=host, kind=kind, default_timeout=default_timeout, pool=pool,
+                    max_bytes=settings.UPSTREAM_MAX_RESPONSE_BYTES, **kwargs
+                ) as stream:
+                    if retries_left and is_retryable_status(stream.status_code):
+                        logging.info(f"Retrying {host} {kind} request after status {stream.status_code}: {url}")
+                    else:
+                        timing.status_code = stream.status_code
+                        yield stream
+                        return
+            except RETRYABLE_ERRORS as e:
+                if not retries_left or timing.status_code is not None:
+                    raise
+                logging.info(f"Retrying {host} {kind} request after {type(e).__name__}: {url}")
+            await _backoff(timing.attempts)
+    except BaseException as e:
+        timing.error = repr(e)
+        raise
+    finally:
+        timing.elapsed = time.perf_counter() - start
+        timing.size = stream.bytes_read if stream is not None else 0
+        _emit_timing(timing, on_timing)
+
+
+def archive_key(url: str, params: dict | None = None) -> str:
+    """把查询参数并入 URL，去掉敏感参数并排序，作为录制/回放的匹配键。"""
+    parts = urlsplit(url)
+    query = parse_qsl(parts.query, keep_blank_values=True)
+    if params:
+        query.extend((k, str(v)) for k, v in params.items())
+    query = sorted((k, v) for k, v in query if k not in SENSITIVE_PARAMS)
+    return urlunsplit((parts.scheme, parts.netloc, parts.path, urlencode(query), ''))
+
+
+def scrub_url(url: str) -> str:
+    """去掉 URL 中的敏感查询参数，其余参数保持原有顺序。"""
+    parts = urlsplit(url)
+    query = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k not in SENSITIVE_PARAMS]
+    return urlunsplit((parts.scheme, parts.netloc, parts.path, urlencode(query), parts.fragment))
+
+
+class ReplayHTTPError(RuntimeError):
+    """回放响应的状态码为 4xx/5xx 时由 `raise_for_status` 抛出。"""
+
+
+class ReplayMiss(RuntimeError):
+    """回放归档中没有与请求匹配的记录。"""
+
+
+class ReplayResponse:
+    """
+    回放得到的响应，提供搜索源用到的 httpx/curl_cffi 响应接口子集。
+    """
+
+    def __init__(self, entry: dict):
+        self.status_code: int = entry["status"]
+        self.url: str = entry["final_url"]
+        self.headers: dict[str, str] = entry.get("headers", {})
+        self.content: bytes = base64.b64decode(entry["body"])
+
+    @property
+    def text(self) -> str:
+        content_type = self.headers.get("content-type", "")
+        encoding = "utf-8"
+        if "charset=" in content_type:
+            encoding = content_type.split("charset=")[-1].split(";")[0].strip() or encoding
+        return self.content.decode(encoding, errors="replace")
+
+    def json(self) -> Any:
+        return json.loads(self.content)
+
+    def raise_for_status(self) -> None:
+        if self.status_code >= 400:
+            raise ReplayHTTPError(f"Replayed response for {self.url} has status {self.status_code}")
+
+
+class TrafficArchive:
+    """
+    上游流量归档 (gzip 压缩的 JSON Lines)。
+
+    record 模式下追加写入每一对请求/响应；replay 模式下启动时载入全部记录，
+    相同请求的多条记录按录制顺序轮流返回，并可按原始耗时延迟返回。
+    """
+
+    def __init__(self, path: str, mode: str, timing: str = "original"):
+        self.path = path
+        self.mode = mode
+        self.timing = timing
+        self.entries: dict[str, deque[dict]] = defaultdict(deque)
+        self._writer = None
+        self._unflushed = 0
+
+    def open(self) -> None:
+        if self.mode == "record":
+            # gzip 允许多个成员首尾相接，追加写入的归档仍可被完整读取
+            self._writer = gzip.open(self.path, "at", encoding="utf-8")
+            logging.info(f"Recording upstream traffic to {self.path}")
+        elif self.mode == "replay":
+            if not os.path.exists(self.path):
+                raise RuntimeError(f"Traffic archive '{self.path}' does not exist, cannot replay.")
+            count = 0
+            with gzip.open(self.path, "rt", encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # 录制进程异常退出时最后一行可能不完整
+                        continue
+                    self.entries[entry["key"]].append(entry)
+                    count += 1
+            logging.info(f"Loaded {count} recorded upstream responses from {self.path} for replay.")
+
+    def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def record(self, url: str, params: dict | None, response: Any, elapsed: float) -> None:
+        if self._writer is None:
+            return
+        content_type = response.headers.get("content-type")
+        entry = {
+            "key": archive_key(url, params),
+            "status": response.status_code,
+            "final_url": scrub_url(str(response.url)),
+            "headers": {"content-type": content_type} if content_type else {},
+            "elapsed": round(elapsed, 4),
+            "body": base64.b64encode(response.content).decode("ascii"),
+        }
+        self._writer.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self._unflushed += 1
+        if self._unflushed >= settings.TRANSPORT_RECORD_FLUSH_EVERY:
+            self._writer.flush()
+            self._unflushed = 0
+
+    async def replay(self, url: str, params: dict | None) -> ReplayResponse:
+        key = archive_key(url, params)
+        candidates = self.entries.get(key)
+        if not candidates:
+            raise ReplayMiss(f"No recorded response for {key}")
+        entry = candidates[0]
+        candidates.rotate(-1)
+        if self.timing == "original":
+            await asyncio.sleep(entry.get("elapsed", 0))
+        return ReplayResponse(entry)
+
+
+traffic_archive: Optional[TrafficArchive] = None
+
+
+def open_transport() -> None:
+    """按配置启用录制或回放模式，live 模式下不做任何事。在应用启动时调用。"""
+    global traffic_archive
+    if settings.TRANSPORT_MODE == "live":
+        return
+    traffic_archive = TrafficArchive(
+        settings.TRANSPORT_ARCHIVE_PATH,
+        settings.TRANSPORT_MODE,
+        settings.TRANSPORT_REPLAY_TIMING,
+    )
+    traffic_archive.open()
+
+
+def close_transport() -> None:
+    """关闭录制归档。在应用关闭时调用。"""
+    global traffic_archive
+    if traffic_archive is not None:
+        traffic_archive.close()
+        traffic_archive = None
@@ -0,0 +1,387 @@
+# image_proxy.py
+import asyncio
+import base64
+import hashlib
+import hmac
+import ipaddress
+import json
+import logging
+import os
+import socket
+import time
+from collections import OrderedDict
+from urllib.parse import quote, urljoin, urlsplit
+
+from starlette.background import BackgroundTask
+from starlette.responses import FileResponse, Response, StreamingResponse
+
+from config import settings
+from http_clients import get_httpx_client
+from mirrors import parse_endpoints
+
+try:
+    from PIL import Image
+except ImportError:  # 缩略图为可选功能，未安装 Pillow 时不可用
+    Image = None
+
+# 各图片源防盗链所需的 Referer，键为主机名后缀
+SOURCE_REFERERS = {
+    "pximg.net": "https://www.pixiv.net/",
+    "dimtown.com": "https://dimtown.com/",
+    "acg66.com": "https://www.acg66.com/",
+}
+
+# 透传给客户端的上游响应头
+PASSTHROUGH_HEADERS = ("content-type", "content-length", "content-range", "accept-ranges", "last-modified", "etag")
+
+
+# 手动跟随的重定向次数上限，每一跳都重新检查目标地址
+MAX_REDIRECTS = 5
+
+
+class ImageFetchError(Exception):
+    """上游图片请求失败。"""
+
+
+class UnsafeImageURL(Exception):
+    """待代理的地址 (或重定向的目标) 指向本机或内网。"""
+
+
+# 代理地址的签名密钥。未配置时每次启动随机生成，重启后旧的代理地址失效，多进程部署时必须配置
+SIGNING_KEY = (settings.IMAGE_PROXY_SECRET or "").encode("utf-8") or os.urandom(32)
+
+
+def sign_url(url: str) -> str:
+    """图片地址的 HMAC 签名 (URL 安全的 base64)。"""
+    digest = hmac.new(SIGNING_KEY, url.encode("utf-8"), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest[:18]).decode("ascii")
+
+
+def verify_signature(url: str, signature: str | None) -> bool:
+    """只有本服务生成的代理地址 (即来自搜索结果的图片) 才能通过校验。"""
+    return bool(signature) and hmac.compare_digest(sign_url(url), signature)
+
+
+def _build_referer_table() -> dict[str, str]:
+    """在默认表的基础上，把对应的反代地址也映射到同一个 Referer。"""
+    table = dict(SOURCE_REFERERS)
+    for setting_value, referer in (
+        (settings.PIXIV_IMG_REVERSE_PROXY, SOURCE_REFERERS["pximg.net"]),
+        (settings.DIMTOWN_REVERSE_PROXY, SOURCE_REFERERS["dimtown.com"]),
+        (settings.ACG66_REVERSE_PROXY, SOURCE_REFERERS["acg66.com"]),
+    ):
+        for endpoint in parse_endpoints(setting_value):
+            host = urlsplit(endpoint).hostname
+            if host:
+                table[host] = referer
+    return table
+
+
+REFERERS = _build_referer_table()
+
+
+def upstream_headers(url: str) -> dict[str, str]:
+    """按图片所在主机返回需要附带的请求头。"""
+    host = (urlsplit(url).hostname or "").lower()
+    for suffix, referer in REFERERS.items():
+        if host == suffix or host.endswith("." + suffix):
+            return {"Referer": referer}
+    return {}
+
+
+def validate_image_url(url: str) -> str | None:
+    """
+    检查待代理的地址，拒绝非 http(s) 地址和指向本机/内网的地址。
+
+    Returns:
+        不合法时返回原因，合法时返回 None。
+    """
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        return "Only absolute http(s) URLs can be proxied."
+    host = parts.hostname.lower()
+    if host == "localhost" or host.endswith(".localhost"):
+        return "Refusing to proxy local addresses."
+    try:
+        address = ipaddress.ip_address(host)
+    except ValueError:
+        return None
+    if not is_public_address(address):
+        return "Refusing to proxy private addresses."
+    return None
+
+
+def is_public_address(address: ipaddress.IPv4Address | ipaddress.IPv6Address) -> bool:
+    if address.version == 6 and address.ipv4_mapped is not None:
+        address = address.ipv4_mapped
+    return not (
+        address.is_private or address.is_loopback or address.is_link_local
+        or address.is_reserved or address.is_multicast or address.is_unspecified
+    )
+
+
+async def check_destination(url: str) -> None:
+    """
+    校验地址并解析主机名，任一解析结果为本机、内网或链路本地地址时拒绝。
+
+    Raises:
+        UnsafeImageURL: 地址不合法或指向内部地址。
+        ImageFetchError: 主机名无法解析。
+    """
+    reason = validate_image_url(url)
+    if reason:
+        raise UnsafeImageURL(reason)
+    parts = urlsplit(url)
+    try:
+        infos = await asyncio.get_running_loop().getaddrinfo(
+            parts.hostname, parts.port or (443 if parts.scheme == "https" else 80), type=socket.SOCK_STREAM
+        )
+    except socket.gaierror as e:
+        raise ImageFetchError(f"Could not resolve {parts.hostname}: {e}")
+    for *_, sockaddr in infos:
+        if not is_public_address(ipaddress.ip_address(sockaddr[0].split("%")[0])):
+            raise UnsafeImageURL(f"Refusing to proxy {parts.hostname}, it resolves to a private address.")
+
+
+def proxied_url(url: str | None) -> str | None:
+    """配置了 IMAGE_PROXY_PUBLIC_URL 时，把图片地址改写为经由本服务 /image 接口的地址。"""
+    if not url or not settings.IMAGE_PROXY_PUBLIC_URL:
+        return url
+    return f"{settings.IMAGE_PROXY_PUBLIC_URL.rstrip('/')}/image?url={quote(url, safe='')}&sig={sign_url(url)}"
+
+
+class DiskLRUCache:
+    """
+    有容量上限的磁盘 LRU 缓存。每个条目由数据文件和记录 Content-Type 的元数据文件组成，
+    访问顺序保存在内存中，并通过文件修改时间在重启后恢复。
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.entries: OrderedDict[str, int] = OrderedDict()
+        self.total_bytes = 0
+
+    def load(self) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        found = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.endswith(".part"):
+                # 上次运行中断时遗留的临时文件
+                os.remove(path)
+                continue
+            if name.endswith(".json"):
+                continue
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            found.append((stat.st_mtime, name, stat.st_size))
+        for _, key, size in sorted(found):
+            self.entries[key] = size
+            self.total_bytes += size
+        self._evict()
+        logging.info(f"Image cache loaded: {len(self.entries)} files, {self.total_bytes / 1024 / 1024:.1f} MB in {self.directory}")
+
+    @staticmethod
+    def key_for(url: str, variant: str = "") -> str:
+        return hashlib.sha256(f"{url}#{variant}".encode("utf-8")).hexdigest()
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, key)
+
+    def get(self, key: str) -> tuple[str, str] | None:
+        """命中时返回 (文件路径, Content-Type)，并刷新其 LRU 位置。"""
+        if key not in self.entries:
+            return None
+        path = self.path(key)
+        try:
+            with open(path + ".json", "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            os.utime(path)
+        except (OSError, json.JSONDecodeError):
+            self._remove(key)
+            return None
+        self.entries.move_to_end(key)
+        return path, meta.get("content_type") or "application/octet-stream"
+
+    def temp_path(self, key: str) -> str:
+        return f"{self.path(key)}.{os.getpid()}.{time.monotonic_ns()}.part"
+
+    def commit(self, key: str, temp_path: str, content_type: str | None) -> None:
+        """把已写完的临时文件放入缓存，必要时淘汰最久未使用的条目。"""
+        size = os.path.getsize(temp_path)
+        if size > settings.IMAGE_PROXY_MAX_FILE_BYTES or size > self.max_bytes:
+            os.remove(temp_path)
+            return
+        path = self.path(key)
+        with open(path + ".json", "w", encoding="utf-8") as f:
+            json.dump({"content_type": content_type}, f)
+        os.replace(temp_path, path)
+        if key in self.entries:
+            self.total_bytes -= self.entries.pop(key)
+        self.entries[key] = size
+        self.total_bytes += size
+        self._evict()
+
+    def _remove(self, key: str) -> None:
+        size = self.entries.pop(key, 0)
+        self.total_bytes -= size
+        for suffix in ("", ".json"):
+            try:
+                os.remove(self.path(key) + suffix)
+            except OSError:
+                pass
+
+    def _evict(self) -> None:
+        while self.total_bytes > self.max_bytes and self.entries:
+            oldest = next(iter(self.entries))
+            self._remove(oldest)
+
+
+image_cache = DiskLRUCache(settings.IMAGE_CACHE_DIR, settings.IMAGE_CACHE_MAX_BYTES)
+
+
+def _render_thumbnail(source_path: str, target_path: str, width: int) -> str:
+    """在线程池中执行：按宽度等比缩放并编码为 JPEG/PNG，返回 Content-Type。"""
+    with Image.open(source_path) as img:
+        img.thumbnail((width, width * 4))
+        if img.mode in ("RGBA", "LA", "P"):
+            img.save(target_path, format="PNG", optimize=True)
+            return "image/png"
+        img.convert("RGB").save(target_path, format="JPEG", quality=85)
+        return "image/jpeg"
+
+
+async def make_thumbnail(url: str, source_path: str, width: int) -> tuple[str, str]:
+    """
+    生成 (或从缓存读取) 指定宽度的缩略图。
+
+    Raises:
+        RuntimeError: 未安装 Pillow。
+    """
+    if Image is None:
+        raise RuntimeError("Thumbnails require Pillow to be installed.")
+    key = DiskLRUCache.key_for(url, f"w={width}")
+    cached = image_cache.get(key)
+    if cached:
+        return cached
+    temp_path = image_cache.temp_path(key)
+    try:
+        content_type = await asyncio.to_thread(_render_thumbnail, source_path, temp_path, width)
+        image_cache.commit(key, temp_path, content_type)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return image_cache.get(key) or (source_path, content_type)
+
+
+def _cache_headers() -> dict[str, str]:
+    return {"Cache-Control": f"public, max-age={settings.IMAGE_PROXY_CACHE_MAX_AGE}"}
+
+
+async def _open_upstream(url: str, range_header: str | None = None):
+    """
+    以流式方式打开上游图片响应。重定向逐跳手动跟随，每一跳的目标都先经过 `check_destination`；
+    状态码为 4xx/5xx 时关闭响应并抛出 ImageFetchError。
+
+    Raises:
+        UnsafeImageURL: 地址或某一跳重定向指向内部地址。
+    """
+    client = get_httpx_client()
+    for _ in range(MAX_REDIRECTS + 1):
+        await check_destination(url)
+        headers = upstream_headers(url)
+        if range_header:
+            headers["Range"] = range_header
+        response = await client.send(client.build_request("GET", url, headers=headers), stream=True, follow_redirects=False)
+        if response.is_redirect:
+            await response.aclose()
+            url = urljoin(url, response.headers["location"])
+            continue
+        if response.status_code >= 400:
+            await response.aclose()
+            raise ImageFetchError(f"Upstream returned {response.status_code} for {url}")
+        return response
+    raise ImageFetchError(f"Too many redirects while fetching {url}")
+
+
+async def _relay(response, key: str | None):
+    """
+    逐块转发上游响应体。给出 key 时同时写入临时文件，
+    完整读完且未超过单文件上限才放入缓存；中途断开则丢弃临时文件。
+    """
+    temp_path = image_cache.temp_path(key) if key else None
+    f = open(temp_path, "wb") if temp_path else None
+    size = 0
+    complete = False
+    try:
+        async for chunk in response.aiter_bytes():
+            if f is not None:
+                size += len(chunk)
+                if size > settings.IMAGE_PROXY_MAX_FILE_BYTES:
+                    f.close()
+                    f = None
+                    os.remove(temp_path)
+                else:
+                    f.write(chunk)
+            yield chunk
+        complete = True
+    finally:
+        await response.aclose()
+        if f is not None:
+            f.close()
+            if complete:
+                image_cache.commit(key, temp_path, response.headers.get("content-type"))
+            elif os.path.exists(temp_path):
+                os.remove(temp_path)
+
+
+async def download_to_cache(url: str) -> tuple[str, str]:
+    """完整下载图片并放入缓存，返回 (文件路径, Content-Type)。"""
+    key = DiskLRUCache.key_for(url)
+    response = await _open_upstream(url)
+    async for _ in _relay(response, key):
+        pass
+    cached = image_cache.get(key)
+    if cached is None:
+        raise ImageFetchError(f"Image at {url} exceeds the cacheable size limit.")
+    return cached
+
+
+async def serve_image(url: str, range_header: str | None = None, width: int | None = None) -> Response:
+    """
+    代理一张图片：命中缓存时直接返回文件 (支持 Range)；未命中时边转发边写入缓存。
+    带 Range 的未命中请求会把 Range 透传给上游，且不写入缓存。
+
+    Raises:
+        ImageFetchError: 上游请求失败。
+        RuntimeError: 请求了缩略图但未安装 Pillow。
+    """
+    key = DiskLRUCache.key_for(url)
+    cached = image_cache.get(key)
+
+    if width:
+        if cached is None:
+            cached = await download_to_cache(url)
+        path, content_type = await make_thumbnail(url, cached[0], width)
+        return FileResponse(path, media_type=content_type, headers=_cache_headers())
+
+    if cached is not None:
+        path, content_type = cached
+        return FileResponse(path, media_type=content_type, headers=_cache_headers())
+
+    response = await _open_upstream(url, range_header)
+    headers = {name: response.headers[name] for name in PASSTHROUGH_HEADERS if name in response.headers}
+    if "content-encoding" in response.headers:
+        # httpx 会自动解压，原始长度不再准确
+        headers.pop("content-length", None)
+    headers.update(_cache_headers())
+    cacheable = not range_header and response.status_code == 200
+    return StreamingResponse(
+        _relay(response, key if cacheable else None),
+        status_code=response.status_code,
+        headers=headers,
+        background=BackgroundTask(response.aclose),
+    )
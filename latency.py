@@ -0,0 +1,125 @@
+# latency.py
+import asyncio
+import math
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from config import settings
+
+# 样本不足且调用方未给出默认值时使用的超时 (秒)
+DEFAULT_TIMEOUTS = {
+    "search": 15.0,
+    "detail": 10.0,
+    "redirect": 5.0,
+}
+
+
+class RollingLatency:
+    """
+    固定容量的滚动延迟窗口，只保留最近 `window` 个样本，用于估算分位数。
+    """
+
+    def __init__(self, window: int = 200):
+        self.samples: deque[float] = deque(maxlen=window)
+
+    def __len__(self) -> int:
+        return len(self.samples)
+
+    def record(self, seconds: float) -> None:
+        self.samples.append(seconds)
+
+    def percentile(self, p: float) -> float | None:
+        """返回第 p 百分位 (0-100) 的延迟，没有样本时返回 None。"""
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, max(0, math.ceil(p / 100 * len(ordered)) - 1))
+        return ordered[index]
+
+
+class TimeoutPolicy:
+    """
+    按 (搜索源, 请求类型) 维护滚动延迟直方图，并据此计算自适应超时：
+    timeout = clamp(p95 * multiplier, min, max)。
+    样本数不足 `min_samples` 时退回到调用方给出的默认超时。
+    """
+
+    def __init__(
+        self,
+        multiplier: float,
+        min_timeout: float,
+        max_timeout: float,
+        window: int,
+        min_samples: int,
+        enabled: bool = True,
+    ):
+        self.multiplier = multiplier
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.window = window
+        self.min_samples = min_samples
+        self.enabled = enabled
+        self.histograms: dict[tuple[str, str], RollingLatency] = {}
+
+    def _histogram(self, provider: str, kind: str) -> RollingLatency:
+        key = (provider, kind)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = RollingLatency(self.window)
+            self.histograms[key] = histogram
+        return histogram
+
+    def record(self, provider: str, kind: str, seconds: float) -> None:
+        self._histogram(provider, kind).record(seconds)
+
+    def get_timeout(self, provider: str, kind: str, default: float | None = None) -> float:
+        if default is None:
+            default = DEFAULT_TIMEOUTS.get(kind, self.max_timeout)
+        if not self.enabled:
+            return default
+        histogram = self._histogram(provider, kind)
+        if len(histogram) < self.min_samples:
+            return default
+        p95 = histogram.percentile(95)
+        return min(self.max_timeout, max(self.min_timeout, p95 * self.multiplier))
+
+    @contextmanager
+    def measure(self, provider: str, kind: str, timeout: float):
+        """
+        记录一次请求的耗时。请求超时或失败时按实际耗时 (至多为 timeout) 记录，
+        这样持续变慢的上游会逐渐抬高自身的超时，直到上限。
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        except asyncio.CancelledError:
+            # 被主动取消的请求 (例如对冲请求中落败的一方) 不计入统计
+            raise
+        except Exception:
+            self.record(provider, kind, min(time.perf_counter() - start, timeout))
+            raise
+        else:
+            self.record(provider, kind, min(time.perf_counter() - start, timeout))
+
+    def snapshot(self) -> dict[str, dict]:
+        """导出当前各 (搜索源, 请求类型) 的样本数、p50/p95 及生效的超时，便于排查。"""
+        return {
+            f"{provider}:{kind}": {
+                "samples": len(histogram),
+                "p50": histogram.percentile(50),
+                "p95": histogram.percentile(95),
+                "timeout": self.get_timeout(provider, kind),
+            }
+            for (provider, kind), histogram in self.histograms.items()
+        }
+
+
+timeout_policy = TimeoutPolicy(
+    multiplier=settings.ADAPTIVE_TIMEOUT_MULTIPLIER,
+    min_timeout=settings.ADAPTIVE_TIMEOUT_MIN,
+    max_timeout=settings.ADAPTIVE_TIMEOUT_MAX,
+    window=settings.ADAPTIVE_TIMEOUT_WINDOW,
+    min_samples=settings.ADAPTIVE_TIMEOUT_MIN_SAMPLES,
+    enabled=settings.ADAPTIVE_TIMEOUT_ENABLED,
+)
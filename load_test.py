@@ -0,0 +1,199 @@
+# load_test.py
+"""
+端到端压测脚本：启动本地上游替身服务 (fake_upstream.py)，把所有 *_REVERSE_PROXY 指向它，
+然后以目标速率驱动 /search，统计吞吐量、延迟分位数、事件循环延迟与内存占用。
+
+用法示例:
+    python load_test.py --rate 100 --duration 30 --concurrency 200
+
+应用与压测客户端运行在同一事件循环中 (通过 ASGI 直接调用，不经过网络栈)，
+因此测得的事件循环延迟包含了客户端自身的少量开销。
+"""
+import argparse
+import asyncio
+import math
+import multiprocessing
+import os
+import random
+import resource
+import time
+from collections import Counter
+
+import httpx
+
+from fake_upstream import PROVIDER_PROXY_SETTINGS, UpstreamProfile, provider_bases, serve
+
+QUERY_WORDS = ["原神", "鸣潮", "初音未来", "python", "fastapi", "风景", "猫", "sunset", "anime", "壁纸"]
+
+
+def percentile(values: list[float], p: float) -> float:
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, math.ceil(p / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def current_rss_mb() -> float:
+    """当前进程常驻内存 (MB)。非 Linux 平台退回到峰值常驻内存。"""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+async def wait_for_upstream(bases: list[str], timeout: float = 15.0) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        for base in bases:
+            while True:
+                try:
+                    await client.get(f"{base}/bing")
+                    break
+                except httpx.HTTPError:
+                    if time.monotonic() > deadline:
+                        raise RuntimeError(f"Fake upstream at {base} did not start within {timeout}s.")
+                    await asyncio.sleep(0.2)
+
+
+async def sample_loop_lag(samples: list[float], stop: asyncio.Event, interval: float = 0.05) -> None:
+    """周期性休眠并记录实际唤醒时间与预期时间的差值，即事件循环延迟。"""
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        samples.append(max(0.0, loop.time() - expected))
+
+
+async def sample_memory(samples: list[float], stop: asyncio.Event, interval: float = 0.5) -> None:
+    while not stop.is_set():
+        samples.append(current_rss_mb())
+        await asyncio.sleep(interval)
+
+
+async def run_load(args: argparse.Namespace) -> None:
+    # 必须在导入应用之前完成配置
+    import logging
+    import main as app_module
+
+    logging.getLogger().setLevel(logging.WARNING)
+
+    rss_start = current_rss_mb()
+    latencies: list[float] = []
+    statuses: Counter = Counter()
+    loop_lag: list[float] = []
+    memory: list[float] = []
+    stop = asyncio.Event()
+    slots = asyncio.Semaphore(args.concurrency)
+    queries = [f"{random.choice(QUERY_WORDS)} {i}" for i in range(args.distinct_queries)]
+
+    async with app_module.lifespan(app_module.app):
+        transport = httpx.ASGITransport(app=app_module.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=None) as client:
+
+            async def one_request(scheduled_at: float) -> None:
+                search_type = "web" if random.random() < args.web_ratio else "image"
+                params = {"q": random.choice(queries), "type": search_type, "limit": args.limit}
+                async with slots:
+                    try:
+                        response = await client.get("/search", params=params)
+                        statuses[response.status_code] += 1
+                    except Exception as e:
+                        statuses[type(e).__name__] += 1
+                # 从计划发出的时刻开始计时，避免协调遗漏 (coordinated omission)
+                latencies.append(time.perf_counter() - scheduled_at)
+
+            samplers = [
+                asyncio.create_task(sample_loop_lag(loop_lag, stop)),
+                asyncio.create_task(sample_memory(memory, stop)),
+            ]
+            in_flight = set()
+            interval = 1 / args.rate
+            start = time.perf_counter()
+            sent = 0
+            while time.perf_counter() - start < args.duration:
+                scheduled_at = start + sent * interval
+                delay = scheduled_at - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                task = asyncio.create_task(one_request(scheduled_at))
+                in_flight.add(task)
+                task.add_done_callback(in_flight.discard)
+                sent += 1
+
+            if in_flight:
+                await asyncio.wait(in_flight)
+            elapsed = time.perf_counter() - start
+            stop.set()
+            await asyncio.gather(*samplers)
+
+    completed = len(latencies)
+    ok = statuses.get(200, 0)
+    print("=" * 60)
+    print(f"Target rate:        {args.rate:.1f} req/s for {args.duration:.0f}s (max {args.concurrency} in flight)")
+    print(f"Sent / completed:   {sent} / {completed} in {elapsed:.1f}s")
+    print(f"Throughput:         {completed / elapsed:.1f} req/s ({ok / elapsed:.1f} req/s with 200)")
+    print(f"Status codes:       {dict(statuses)}")
+    print("Latency (ms):       " + "  ".join(
+        f"p{p}={percentile(latencies, p) * 1000:.0f}" for p in (50, 90, 95, 99)
+    ) + f"  max={max(latencies, default=0) * 1000:.0f}")
+    print("Event-loop lag (ms): " + "  ".join(
+        f"p{p}={percentile(loop_lag, p) * 1000:.1f}" for p in (50, 99)
+    ) + f"  max={max(loop_lag, default=0) * 1000:.1f}")
+    print(f"RSS (MB):           start={rss_start:.0f}  peak={max(memory, default=rss_start):.0f}  end={current_rss_mb():.0f}")
+    print("=" * 60)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Load-test /search against a local fake upstream.")
+    parser.add_argument("--rate", type=float, default=50.0, help="target requests per second")
+    parser.add_argument("--duration", type=float, default=30.0, help="test duration in seconds")
+    parser.add_argument("--concurrency", type=int, default=200, help="max concurrent client requests")
+    parser.add_argument("--web-ratio", type=float, default=0.5, help="fraction of web (vs image) searches")
+    parser.add_argument("--limit", type=int, default=10, help="limit parameter sent to /search")
+    parser.add_argument("--distinct-queries", type=int, default=1000, help="size of the query pool")
+    parser.add_argument("--upstream-port", type=int, default=9100, help="first port; each provider gets its own port")
+    parser.add_argument("--upstream-latency-ms", type=float, default=80.0, help="median fake upstream latency")
+    parser.add_argument("--upstream-latency-sigma", type=float, default=0.5, help="log-normal sigma of upstream latency")
+    parser.add_argument("--upstream-error-rate", type=float, default=0.0, help="fraction of upstream 503s")
+    parser.add_argument("--upstream-hang-rate", type=float, default=0.0, help="fraction of upstream requests that hang")
+    args = parser.parse_args()
+
+    host = "127.0.0.1"
+    bases = provider_bases(host, args.upstream_port)
+    profile = UpstreamProfile(
+        latency_median_ms=args.upstream_latency_ms,
+        latency_sigma=args.upstream_latency_sigma,
+        error_rate=args.upstream_error_rate,
+        hang_rate=args.upstream_hang_rate,
+    )
+    upstreams = [
+        multiprocessing.Process(
+            target=serve, args=(host, args.upstream_port + i, profile, bases), daemon=True
+        )
+        for i in range(len(bases))
+    ]
+    for upstream in upstreams:
+        upstream.start()
+
+    # 所有搜索源都指向替身服务；未配置 SerpApi Key 时该源不会发出请求
+    for name, setting in PROVIDER_PROXY_SETTINGS.items():
+        os.environ[setting] = f"{bases[name]}/{name}"
+    os.environ["SERPAPI_API_KEYS"] = ""
+    # 替身服务不会封禁，默认关闭按主机的出站限速，测的是服务本身的吞吐 (可通过环境变量显式开启)
+    os.environ.setdefault("HOST_RATE_PER_SECOND", "0")
+    os.environ.setdefault("HOST_MAX_CONCURRENCY", "100000")
+
+    try:
+        asyncio.run(wait_for_upstream(list(bases.values())))
+        asyncio.run(run_load(args))
+    finally:
+        for upstream in upstreams:
+            upstream.terminate()
+            upstream.join()
+
+
+if __name__ == "__main__":
+    main()
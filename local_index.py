@@ -0,0 +1,172 @@
+# local_index.py
+import asyncio
+import logging
+import re
+import sqlite3
+import threading
+import time
+
+from config import settings
+from provider_yield import CJK_PATTERN
+from records import ImageResult, TextResult
+
+try:
+    import jieba
+    jieba.setLogLevel(logging.WARNING)
+except ImportError:  # jieba 为可选依赖，未安装时中日韩文字按二元组切分
+    jieba = None
+
+# 连续的中日韩文字，或连续的其他文字/数字
+TOKEN_PATTERN = re.compile(rf"({CJK_PATTERN.pattern}+)|(?:(?!{CJK_PATTERN.pattern})[^\W_])+")
+
+
+def tokenize(text: str, for_index: bool = False) -> list[str]:
+    """
+    把文本切分为检索词 (小写)。拉丁文字按单词切分；中日韩文字在安装了 jieba 时分词
+    (建索引时使用搜索引擎模式，额外产出长词中的短词)，否则切为相邻二字组。
+    """
+    tokens = []
+    for match in TOKEN_PATTERN.finditer(text.lower()):
+        run = match.group(0)
+        if match.group(1) is None:
+            tokens.append(run)
+        elif jieba is not None:
+            words = jieba.cut_for_search(run) if for_index else jieba.cut(run)
+            tokens.extend(word for word in words if word.strip())
+        elif len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    id INTEGER PRIMARY KEY,
+    type TEXT NOT NULL,
+    url TEXT NOT NULL,
+    title TEXT,
+    snippet TEXT,
+    source TEXT,
+    thumbnail TEXT,
+    fetched_at REAL NOT NULL,
+    UNIQUE (type, url)
+);
+CREATE INDEX IF NOT EXISTS documents_fetched_at ON documents (fetched_at);
+CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5(tokens);
+"""
+
+
+class LocalIndex:
+    """
+    以前抓取过的结果的本地全文索引 (sqlite FTS5)。每次在线搜索得到的完整候选列表都会写入，
+    文档按 (类型, 地址) 去重，检索词来自标题、摘要以及产生它的查询词；超过 `max_documents` 时删除最旧的文档。
+    数据库操作在线程池中执行，不阻塞事件循环。
+    """
+
+    def __init__(self, path: str, max_documents: int):
+        self.path = path
+        self.max_documents = max_documents
+        self._conn: sqlite3.Connection | None = None
+        self._lock = threading.Lock()
+        self._pending: set[asyncio.Task] = set()
+        self._writes_since_prune = 0
+
+    @property
+    def ready(self) -> bool:
+        return self._conn is not None
+
+    def open(self) -> None:
+        try:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SCHEMA)
+        except sqlite3.Error as e:
+            logging.error(f"Could not open local index at {self.path}, local search is disabled: {e}")
+            return
+        self._conn = conn
+        count = conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+        logging.info(f"Local index loaded: {count} documents in {self.path}" + ("" if jieba else " (jieba not installed, using bigrams)"))
+
+    async def close(self) -> None:
+        if self._pending:
+            await asyncio.wait(self._pending)
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def add_later(self, search_type: str, q: str, items: list) -> None:
+        """在后台写入一次搜索的候选列表，不等待写入完成。"""
+        if self._conn is None or not items:
+            return
+        task = asyncio.create_task(asyncio.to_thread(self._add, search_type, q, items))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    def _add(self, search_type: str, q: str, items: list) -> None:
+        now = time.time()
+        rows = []
+        for item in items:
+            if search_type == "image":
+                rows.append((item.original, item.title, None, item.source, item.thumbnail))
+            else:
+                rows.append((item.link, item.title, item.snippet, None, None))
+        try:
+            with self._lock, self._conn:
+                for url, title, snippet, source, thumbnail in rows:
+                    if not url:
+                        continue
+                    row_id = self._conn.execute(
+                        "INSERT INTO documents (type, url, title, snippet, source, thumbnail, fetched_at) VALUES (?, ?, ?, ?, ?, ?, ?) "
+                        "ON CONFLICT (type, url) DO UPDATE SET title = excluded.title, snippet = excluded.snippet, "
+                        "source = excluded.source, thumbnail = excluded.thumbnail, fetched_at = excluded.fetched_at "
+                        "RETURNING id",
+                        (search_type, url, title, snippet, source, thumbnail, now),
+                    ).fetchone()[0]
+                    tokens = tokenize(" ".join(filter(None, (q, title, snippet))), for_index=True)
+                    self._conn.execute("DELETE FROM documents_fts WHERE rowid = ?", (row_id,))
+                    self._conn.execute("INSERT INTO documents_fts (rowid, tokens) VALUES (?, ?)", (row_id, " ".join(tokens)))
+                self._writes_since_prune += 1
+                if self._writes_since_prune >= 100:
+                    self._writes_since_prune = 0
+                    self._prune()
+        except sqlite3.Error as e:
+            logging.warning(f"Failed to write {len(rows)} results for '{q}' to the local index: {e}")
+
+    def _prune(self) -> None:
+        excess = self._conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0] - self.max_documents
+        if excess <= 0:
+            return
+        stale = [row[0] for row in self._conn.execute("SELECT id FROM documents ORDER BY fetched_at LIMIT ?", (excess,))]
+        self._conn.executemany("DELETE FROM documents WHERE id = ?", ((row_id,) for row_id in stale))
+        self._conn.executemany("DELETE FROM documents_fts WHERE rowid = ?", ((row_id,) for row_id in stale))
+
+    async def search(self, search_type: str, q: str, limit: int) -> list:
+        """检索与查询词的所有检索词都匹配的文档，按 BM25 相关度排序，返回对应类型的结果记录。"""
+        if self._conn is None:
+            return []
+        tokens = tokenize(q)
+        if not tokens:
+            return []
+        return await asyncio.to_thread(self._search, search_type, tokens, limit)
+
+    def _search(self, search_type: str, tokens: list[str], limit: int) -> list:
+        match = " AND ".join('"' + token.replace('"', '""') + '"' for token in dict.fromkeys(tokens))
+        try:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT d.url, d.title, d.snippet, d.source, d.thumbnail FROM documents_fts "
+                    "JOIN documents d ON d.id = documents_fts.rowid "
+                    "WHERE documents_fts MATCH ? AND d.type = ? ORDER BY bm25(documents_fts) LIMIT ?",
+                    (match, search_type, limit),
+                ).fetchall()
+        except sqlite3.Error as e:
+            logging.warning(f"Local index query failed: {e}")
+            return []
+        if search_type == "image":
+            return [ImageResult(title=title, original=url, source=source, thumbnail=thumbnail, provider="local") for url, title, _, source, thumbnail in rows]
+        return [TextResult(title=title, link=url, snippet=snippet, provider="local") for url, title, snippet, _, _ in rows]
+
+
+local_index = LocalIndex(settings.LOCAL_INDEX_PATH, settings.LOCAL_INDEX_MAX_DOCUMENTS)
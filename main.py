@@ -2,19 +2,31 @@
 import asyncio
 import logging
 import random
+from collections import deque
 from contextlib import asynccontextmanager
 from typing import Literal
 from urllib.parse import urlparse, urlunparse
 
-from fastapi import FastAPI, Query, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi import Depends, FastAPI, Header, Query, HTTPException, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, Response
 from pydantic import BaseModel
 
+import httpx
 from httpx import AsyncClient
 from curl_cffi.requests import AsyncSession
 import http_clients
+import image_proxy
+import parse_pool
+import profiling
 
+from admission import Overloaded, admission_controller, rate_limiter, retry_after_header
 from config import settings
+from local_index import local_index
+from pagination import cursor_store
+from prefetch import hot_queries, prefetch_scheduler, result_cache
+from provider_yield import FanoutPlan, provider_yield
+from records import ImageResult, TextResult
+from response_format import JSON_FORMAT, ResponseFormat
 from search_providers import text_ddg, text_bing, text_baidu, image_serpapi, image_bing, image_pixiv, image_yandex, image_dimtown, image_acg66 
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -28,21 +40,34 @@ async def lifespan(app: FastAPI):
             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
         },
         follow_redirects=True,
-        timeout=15  # 超时
+        timeout=settings.ADAPTIVE_TIMEOUT_MAX  # 兜底超时，单次请求的超时由自适应超时策略决定
     )
     http_clients.cffi_session = AsyncSession(
         impersonate="chrome120",
-        timeout=20  # 超时
+        timeout=settings.ADAPTIVE_TIMEOUT_MAX,  # 兜底超时
+        max_clients=settings.UPSTREAM_MAX_IN_FLIGHT  # 与全局在途上游请求上限保持一致
     )
+    http_clients.open_transport()
+    image_proxy.image_cache.load()
+    if settings.LOCAL_INDEX_ENABLED:
+        local_index.open()
+    parse_pool.start()
+    profiling.loop_lag_monitor.start()
+    prefetch_scheduler.start(refresh_candidates)
     logging.info("HTTP clients initialized successfully.")
 
     yield
 
+    await prefetch_scheduler.stop()
+    await profiling.loop_lag_monitor.stop()
+    await local_index.close()
     logging.info("Application shutdown: Closing HTTP clients...")
     if http_clients.httpx_client:
         await http_clients.httpx_client.aclose()
     if http_clients.cffi_session:
         await http_clients.cffi_session.close()
+    http_clients.close_transport()
+    parse_pool.shutdown()
     logging.info("HTTP clients closed gracefully.")
 
 app = FastAPI(
@@ -56,11 +81,6 @@ class StandardResponse(BaseModel):
     message: str
     data: dict | list | None = None
 
-class ImageSearchResult(BaseModel):
-    title: str | None
-    source: str | None
-    url: str | None
-
 def get_base_url_for_dedupe(url: str) -> str:
     try:
         parsed = urlparse(url)
@@ -72,7 +92,7 @@ def get_base_url_for_dedupe(url: str) -> str:
     except Exception:
         return url.strip().lower()
 
-def prioritize_results_with_keyword(results: list[dict], keyword: str) -> list[dict]:
+def prioritize_results_with_keyword(results: list[TextResult], keyword: str) -> list[TextResult]:
     """
     单源结果预处理：将标题包含关键词的结果前置，优化后续排名权重。
     """
@@ -87,7 +107,7 @@ def prioritize_results_with_keyword(results: list[dict], keyword: str) -> list[d
     low_priority = []
     
     for item in results:
-        title = str(item.get('title', '')).lower()
+        title = (item.title or '').lower()
         if keyword_lower in title:
             high_priority.append(item)
         else:
@@ -95,7 +115,7 @@ def prioritize_results_with_keyword(results: list[dict], keyword: str) -> list[d
             
     return high_priority + low_priority
 
-def reciprocal_rank_fusion(providers_results: list[list[dict]], k: int = 60) -> list[dict]:
+def reciprocal_rank_fusion(providers_results: list[list[TextResult]], k: int = 60) -> list[TextResult]:
     """
     使用倒数排名融合 (RRF) 算法合并结果。
     RRF score = sum(1 / (k + rank))
@@ -110,9 +130,9 @@ def reciprocal_rank_fusion(providers_results: list[list[dict]], k: int = 60) ->
 
     for result_list in providers_results:
         for rank, item in enumerate(result_list):
-            link = item.get('link')
-            title = item.get('title') or ""
-            is_penalized = item.get('_is_penalized', False)
+            link = item.link
+            title = item.title or ""
+            is_penalized = item.penalized
             
             if not link:
                 continue
@@ -151,143 +171,500 @@ def reciprocal_rank_fusion(providers_results: list[list[dict]], k: int = 60) ->
          description=("执行聚合搜索，支持网页和图片两种类型。")
 )
 async def search(
+    request: Request,
     q: str = Query(..., description="搜索查询词。"),
     type: Literal['web', 'image'] = Query('web', description="搜索类型：'web' 或 'image'。"),
-    limit: int = Query(10, ge=1, le=100, description="返回结果数量上限，范围1-100。")
+    limit: int = Query(10, ge=1, le=100, description="返回结果数量上限，范围1-100。"),
+    cursor: str | None = Query(None, description="上一页响应中的 next_cursor，用于获取下一页。"),
+    source: Literal['auto', 'live', 'local'] = Query('auto', description="结果来源：'live' 只请求上游，'local' 只查本地索引，'auto' 在上游全部失败或超时时退回本地索引。"),
+    fields: str | None = Query(None, description="只返回指定的结果字段，逗号分隔，如 'url' 或 'url,title'。")
 ):
     if not q.strip():
         raise HTTPException(status_code=400, detail="Query parameter 'q' cannot be empty.")
+    # 按 Accept / Accept-Encoding 协商编码与压缩方式
+    fmt = ResponseFormat.negotiate(request.headers.get("accept"), request.headers.get("accept-encoding"), parse_fields(type, fields))
+
+    # 按客户端标识限流，未携带标识头时退回到客户端 IP
+    client_key = request.headers.get(settings.RATE_LIMIT_KEY_HEADER) or (request.client.host if request.client else "unknown")
+    wait_seconds = rate_limiter.check(client_key)
+    if wait_seconds:
+        return shed_response(429, "Rate limit exceeded, please retry later.", wait_seconds)
+
+    if cursor:
+        # 翻页直接切片已缓存的候选列表，不再访问上游，也无需占用准入名额
+        return page_from_cursor(q, type, limit, cursor, fmt)
+
+    if source == 'local':
+        # 本地索引查询只需几毫秒，同样无需占用准入名额
+        candidates = await local_index.search(type, q, fetch_depth(type, limit))
+        return respond_with_candidates(q, type, limit, candidates, "local", fmt=fmt)
+
+    hot_queries.offer((type, q.strip()))
+    trace = profiling.start_trace(q, type, limit)
+    status_code = 500
+    try:
+        async with admission_controller.admit():
+            response = await run_until_disconnected(request, execute_search(q, type, limit, source, fmt))
+            status_code = response.status_code
+            return response
+    except Overloaded as e:
+        logging.warning(f"Shedding search request for '{q}': {e}")
+        status_code = 503
+        return shed_response(503, "Server is overloaded, please retry later.", e.retry_after)
+    except ClientDisconnected:
+        logging.info(f"Client disconnected, cancelled search for '{q}' [{type}].")
+        status_code = 499
+        return Response(status_code=499)
+    finally:
+        profiling.finish_trace(trace, status_code)
+
+class ClientDisconnected(Exception):
+    """客户端在搜索完成前断开了连接。"""
+
+async def wait_for_disconnect(request: Request) -> None:
+    """等待客户端断开连接。GET 请求没有请求体，读完首条消息后 receive 会一直阻塞到连接断开。"""
+    while True:
+        message = await request.receive()
+        if message["type"] == "http.disconnect":
+            return
+
+async def run_until_disconnected(request: Request, coro):
+    """
+    执行 `coro`，客户端先断开连接时取消它并抛出 ClientDisconnected。
+    取消会传递到其中所有搜索源协程及其嵌套的并发请求，返回前等待取消完成，确保连接与各类名额都已释放。
+    """
+    work = asyncio.ensure_future(coro)
+    watcher = asyncio.ensure_future(wait_for_disconnect(request))
+    try:
+        await asyncio.wait({work, watcher}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        watcher.cancel()
+        if not work.done():
+            work.cancel()
+            await asyncio.wait({work})
+    if work.cancelled():
+        raise ClientDisconnected()
+    return work.result()
+
+def shed_response(status_code: int, message: str, retry_after: float) -> JSONResponse:
+    """构造限流 (429) 或过载 (503) 响应，并带上 Retry-After 头。"""
+    response_payload = StandardResponse(code=status_code, message=message, data=None)
+    return JSONResponse(
+        status_code=status_code,
+        content=response_payload.model_dump(),
+        headers={"Retry-After": retry_after_header(retry_after)}
+    )
 
-    if type == 'image':
-        tasks = [
-            image_serpapi.search_images_serpapi(q, settings.PER_PROVIDER_FETCH_IMAGE),
-            image_bing.search_bing_images(q, settings.PER_PROVIDER_FETCH_IMAGE),
-            image_yandex.search_yandex_images(q, settings.PER_PROVIDER_FETCH_IMAGE),
-            image_dimtown.search_dimtown_images(q, settings.PER_PROVIDER_FETCH_IMAGE),
-            image_pixiv.search_pixiv_images(q, settings.PER_PROVIDER_FETCH_IMAGE),
-            image_acg66.search_acg66_images(q, settings.PER_PROVIDER_FETCH_IMAGE),
-        ]
+# 各类型的搜索源，顺序即图片去重时的优先顺序
+IMAGE_PROVIDERS = {
+    "serpapi": image_serpapi.search_images_serpapi,
+    "bing_images": image_bing.search_bing_images,
+    "yandex": image_yandex.search_yandex_images,
+    "dimtown": image_dimtown.search_dimtown_images,
+    "pixiv": image_pixiv.search_pixiv_images,
+    "acg66": image_acg66.search_acg66_images,
+}
+WEB_PROVIDERS = {
+    "ddg": text_ddg.search_ddg,
+    "bing": text_bing.search_bing,
+    "baidu": text_baidu.search_baidu,
+}
+
+def parse_merge_weights(value: str) -> dict[str, int]:
+    """解析 `bing_images:3,pixiv:2` 形式的配置，未列出的搜索源权重为 1。"""
+    weights = {}
+    for entry in value.split(","):
+        name, _, weight = entry.strip().partition(":")
+        if name and weight.strip():
+            weights[name] = max(1, int(weight))
+    return weights
+
+IMAGE_MERGE_WEIGHTS = parse_merge_weights(settings.IMAGE_MERGE_WEIGHTS)
+
+def active_providers(providers: dict, fanout: FanoutPlan) -> list[str]:
+    """扇出计划中预算不为 0 的搜索源。"""
+    names = [name for name in providers if fanout.budgets.get(name)]
+    skipped = [name for name in providers if name not in names]
+    if skipped:
+        logging.info(f"Skipping low-yield providers for [{fanout.query_class}]: {', '.join(skipped)}")
+    return names
+
+async def gather_providers(providers: dict, q: str, fanout: FanoutPlan) -> list[list | BaseException]:
+    """按扇出计划并发请求各搜索源 (跳过预算为 0 的源)，并在结果记录上标注来源。"""
+    names = active_providers(providers, fanout)
+    results = await asyncio.gather(
+        *(providers[name](q, fanout.budgets[name]) for name in names), return_exceptions=True
+    )
+    for name, result_list in zip(names, results):
+        if not isinstance(result_list, BaseException):
+            for item in result_list:
+                item.provider = name
+    return results
+
+async def collect_image_candidates(q: str, fanout: FanoutPlan, limit: int | None = None) -> list[ImageResult]:
+    """并发请求图片源，按原图地址去重后返回全部候选。IMAGE_MERGE_MODE=interleave 时按来源交错合并。"""
+    if settings.IMAGE_MERGE_MODE == 'interleave':
+        return await interleave_image_candidates(q, fanout, limit)
+
+    results_from_providers = await gather_providers(IMAGE_PROVIDERS, q, fanout)
+    
+    all_images, seen_originals = [], set()
+    for result_list in results_from_providers:
+        if isinstance(result_list, BaseException):
+            logging.warning(f"An image search provider failed: {result_list!r}")
+            continue
         
-        results_from_providers = await asyncio.gather(*tasks, return_exceptions=True)
+        for item in result_list:
+            if item.original and item.original not in seen_originals:
+                all_images.append(item)
+                seen_originals.add(item.original)
+    return all_images
+
+async def interleave_image_candidates(q: str, fanout: FanoutPlan, limit: int | None) -> list[ImageResult]:
+    """
+    按完成顺序收集各图片源的结果 (按原图地址去重)，最后按来源加权轮转交错合并。
+    给出 `limit` 时，一旦去重后的图片已够 `limit` 张、且至少来自 IMAGE_MIN_SOURCES 个来源，
+    就取消其余仍在进行的搜索源并立即返回，此时 `fanout.truncated` 被置为 True。
+    """
+    names = active_providers(IMAGE_PROVIDERS, fanout)
+    tasks = {asyncio.ensure_future(IMAGE_PROVIDERS[name](q, fanout.budgets[name])): name for name in names}
+    per_source: dict[str, list[ImageResult]] = {}
+    seen_originals = set()
+    collected = 0
+    pending = set(tasks)
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                name = tasks[task]
+                if task.cancelled():
+                    logging.warning(f"An image search provider was cancelled: {name}")
+                    continue
+                if task.exception() is not None:
+                    logging.warning(f"An image search provider failed: {name}: {task.exception()!r}")
+                    continue
+                unique = []
+                for item in task.result():
+                    item.provider = name
+                    if item.original and item.original not in seen_originals:
+                        seen_originals.add(item.original)
+                        unique.append(item)
+                if unique:
+                    per_source[name] = unique
+                    collected += len(unique)
+
+            if limit is not None and pending and collected >= limit and len(per_source) >= min(settings.IMAGE_MIN_SOURCES, len(tasks)):
+                cancelled = [tasks[task] for task in pending]
+                logging.info(f"Collected {collected} images from {len(per_source)} sources for '{q}', cancelling: {', '.join(cancelled)}")
+                fanout.truncated = True
+                # 被取消的搜索源没有完整地参与本次搜索，不计入产出统计
+                fanout.measured.difference_update(cancelled)
+                break
+    finally:
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.wait(pending)
+
+    # 产出统计按合并前的结果数计算，见 FanoutPlan.hits
+    fanout.hits = {name: len(items) for name, items in per_source.items()}
+    ordered = {name: per_source[name] for name in IMAGE_PROVIDERS if name in per_source}
+    return interleave_by_source(ordered, IMAGE_MERGE_WEIGHTS)
+
+def interleave_by_source(per_source: dict[str, list], weights: dict[str, int]) -> list:
+    """加权轮转合并：每一轮按顺序从每个来源各取 `weights[来源]` 条 (默认 1 条)，直到全部取完。"""
+    queues = {name: deque(items) for name, items in per_source.items() if items}
+    merged = []
+    while queues:
+        for name in list(queues):
+            queue = queues[name]
+            for _ in range(weights.get(name, 1)):
+                merged.append(queue.popleft())
+                if not queue:
+                    del queues[name]
+                    break
+    return merged
+
+async def collect_web_candidates(q: str, fanout: FanoutPlan) -> list[TextResult]:
+    """并发请求网页源 (抓取条数由扇出计划决定)，清洗、标记黑名单后用 RRF 融合，返回完整排序结果。"""
+    raw_results_list = await gather_providers(WEB_PROVIDERS, q, fanout)
+
+    # 预编译黑名单
+    domain_blacklist = {domain.strip() for domain in settings.DOMAIN_BLACKLIST.split(',') if domain.strip()}
+    title_blacklist = {kw.strip().lower() for kw in settings.TITLE_BLACKLIST.split(',') if kw.strip()}
+    
+    # 获取小写查询词
+    q_lower = q.strip().lower()
+
+    cleaned_providers_lists = []
+
+    # 清洗、标记黑名单、关键词优先
+    for result_list in raw_results_list:
+        if isinstance(result_list, BaseException):
+            logging.warning(f"A search provider failed: {result_list!r}")
+            continue
         
-        all_images, seen_originals = [], set()
-        for result_list in results_from_providers:
-            if isinstance(result_list, Exception):
-                logging.warning(f"An image search provider failed: {result_list}")
+        if not result_list:
+            continue
+
+        filtered_list = []
+        for item in result_list:
+            link = item.link
+            title = item.title or ""
+            snippet = item.snippet
+
+            # 基础字段校验
+            if not all([link, title, snippet]):
                 continue
             
-            for item in result_list:
-                original_url = item.get('original')
-                title = item.get("title") or ""
-                if original_url and original_url not in seen_originals:
-                    image_data = {
-                        "title": title,
-                        "url": original_url,
-                        "source": item.get("source")
-                    }
-                    all_images.append(ImageSearchResult(**image_data))
-                    seen_originals.add(original_url)
-
-        random.shuffle(all_images)
-        final_images = all_images[:limit]
-        response_payload = StandardResponse(
-            code=200, message="OK",
-            data={"images": [img.model_dump() for img in final_images]}
-        )
-        return JSONResponse(content=response_payload.model_dump())
-
-    elif type == 'web':
-        tasks = [
-            text_ddg.search_ddg(q, settings.PER_PROVIDER_FETCH_TEXT),
-            text_bing.search_bing(q, settings.PER_PROVIDER_FETCH_TEXT),
-            text_baidu.search_baidu(q, settings.PER_PROVIDER_FETCH_TEXT)
-        ]
-        raw_results_list = await asyncio.gather(*tasks, return_exceptions=True)
-
-        # 预编译黑名单
-        domain_blacklist = {domain.strip() for domain in settings.DOMAIN_BLACKLIST.split(',') if domain.strip()}
-        title_blacklist = {kw.strip().lower() for kw in settings.TITLE_BLACKLIST.split(',') if kw.strip()}
+            # 初始化降权标记
+            is_penalized = False
+
+            # 域名黑名单判定
+            if domain_blacklist:
+                try:
+                    domain = urlparse(link).netloc.lower()
+                    if domain:
+                        if any(bd in domain and bd not in q_lower for bd in domain_blacklist):
+                            is_penalized = True
+                except Exception:
+                    pass
+            
+            # 标题黑名单判定
+            if not is_penalized and title_blacklist:
+                title_lower = title.lower()
+                if any(kw in title_lower and kw not in q_lower for kw in title_blacklist):
+                    is_penalized = True
+            
+            # 写入标记，不删除条目
+            item.penalized = is_penalized
+            filtered_list.append(item)
         
-        # 获取小写查询词
-        q_lower = q.strip().lower()
+        # 单源内部重排 包含搜索词的标题优先
+        prioritized_list = prioritize_results_with_keyword(filtered_list, q)
+        if prioritized_list:
+            cleaned_providers_lists.append(prioritized_list)
 
-        cleaned_providers_lists = []
+    if not cleaned_providers_lists:
+        return []
 
-        # 清洗、标记黑名单、关键词优先
-        for result_list in raw_results_list:
-            if isinstance(result_list, Exception):
-                logging.warning(f"A search provider failed: {result_list}")
-                continue
-            
-            if not result_list:
-                continue
+    # 使用 RRF 算法融合多个源
+    with profiling.stage("main", "fuse"):
+        return reciprocal_rank_fusion(cleaned_providers_lists)
 
-            filtered_list = []
-            for item in result_list:
-                link = item.get('link')
-                title = item.get('title') or ""
-                snippet = item.get('snippet')
+def fetch_depth(type: str, limit: int = 0) -> int:
+    """每个搜索源需要抓取的结果数。网页搜索至少抓取 `limit` 条，大 limit 的请求才能拿到足够的结果。"""
+    if type == 'image':
+        return settings.PER_PROVIDER_FETCH_IMAGE
+    return max(limit, settings.PER_PROVIDER_FETCH_TEXT)
 
-                # 基础字段校验
-                if not all([link, title, snippet]):
-                    continue
-                
-                # 初始化降权标记
-                is_penalized = False
-
-                # 域名黑名单判定
-                if domain_blacklist:
-                    try:
-                        domain = urlparse(link).netloc.lower()
-                        if domain:
-                            if any(bd in domain and bd not in q_lower for bd in domain_blacklist):
-                                is_penalized = True
-                    except Exception:
-                        pass
-                
-                # 标题黑名单判定
-                if not is_penalized and title_blacklist:
-                    title_lower = title.lower()
-                    if any(kw in title_lower and kw not in q_lower for kw in title_blacklist):
-                        is_penalized = True
-                
-                # 写入标记，不删除条目
-                item['_is_penalized'] = is_penalized
-                filtered_list.append(item)
-            
-            # 单源内部重排 包含搜索词的标题优先
-            prioritized_list = prioritize_results_with_keyword(filtered_list, q)
-            if prioritized_list:
-                cleaned_providers_lists.append(prioritized_list)
-
-        if not cleaned_providers_lists:
-            response_payload = StandardResponse(
-                code=404,
-                message=f"No search results found for the query: '{q}'",
-                data=None
-            )
-            return JSONResponse(status_code=404, content=response_payload.model_dump())
-
-        # 使用 RRF 算法融合多个源
-        final_ranked_results = reciprocal_rank_fusion(cleaned_providers_lists)
-
-        # 截取最终结果
-        final_results = final_ranked_results[:limit]
-        
-        # 格式化输出
-        output_data = []
-        for result in final_results:
-            output_data.append({
-                "title": result.get('title'),
-                "url": result.get('link'),
-                "description": result.get('snippet')
-            })
+def plan_fanout(type: str, q: str, depth: int) -> FanoutPlan:
+    """根据各搜索源在同类查询上的历史产出决定本次的抓取预算。"""
+    providers = IMAGE_PROVIDERS if type == 'image' else WEB_PROVIDERS
+    return provider_yield.plan(type, q, list(providers), depth)
 
+async def fetch_candidates(type: str, q: str, fanout: FanoutPlan, limit: int | None = None) -> list:
+    """
+    请求上游获取候选列表，并在后台写入本地索引。给出 `limit` 时图片搜索可能在凑够结果后提前结束
+    (见 `interleave_image_candidates`)，此时列表不完整。
+    """
+    if type == 'image':
+        candidates = await collect_image_candidates(q, fanout, limit)
+    else:
+        candidates = await collect_web_candidates(q, fanout)
+    local_index.add_later(type, q, candidates)
+    return candidates
+
+async def refresh_candidates(type: str, q: str) -> tuple[list, int]:
+    """供后台预取使用：按默认抓取深度重新获取候选列表。"""
+    depth = fetch_depth(type)
+    return await fetch_candidates(type, q, plan_fanout(type, q, depth)), depth
+
+async def execute_search(q: str, type: str, limit: int, source: str = 'auto', fmt: ResponseFormat = JSON_FORMAT) -> Response:
+    cache_key = (type, q.strip())
+    depth = fetch_depth(type, limit)
+    candidates = result_cache.get(cache_key, depth)
+    fanout = None
+    if candidates is None:
+        fanout = plan_fanout(type, q, depth)
+        try:
+            candidates = await asyncio.wait_for(fetch_candidates(type, q, fanout, limit), timeout=settings.SEARCH_DEADLINE or None)
+        except asyncio.TimeoutError:
+            logging.warning(f"Search deadline of {settings.SEARCH_DEADLINE}s exhausted for '{q}' [{type}].")
+            candidates = []
+        if candidates and not fanout.truncated:
+            # 提前结束的不完整列表不缓存，以免更大 limit 的请求命中
+            result_cache.put(cache_key, candidates, depth)
+        if not candidates and source == 'auto':
+            # 上游全部失败、无结果或超时：退回本地索引，降级服务而不是直接返回 404
+            candidates = await local_index.search(type, q, depth)
+            if candidates:
+                logging.warning(f"Live providers returned nothing for '{q}' [{type}], serving {len(candidates)} results from the local index.")
+                return respond_with_candidates(q, type, limit, candidates, "local", fmt=fmt)
+
+    return respond_with_candidates(q, type, limit, candidates, "live", fanout, fmt)
+
+def respond_with_candidates(q: str, type: str, limit: int, candidates: list, source: str, fanout: FanoutPlan | None = None, fmt: ResponseFormat = JSON_FORMAT) -> Response:
+    """为完整候选列表建立游标并返回第一页。`source` 写入 X-Search-Source 响应头。"""
+    entry_id = cursor_store.new_id()
+    live_image = type == 'image' and source == 'live'
+    # 在线图片搜索没有结果时返回 200 与空列表，与合并方式无关
+    if not candidates and not live_image:
         response_payload = StandardResponse(
-            code=200, message="OK",
-            data={"results": output_data}
+            code=404,
+            message=f"No search results found for the query: '{q}'",
+            data=None
+        )
+        return JSONResponse(status_code=404, content=response_payload.model_dump())
+    if live_image and settings.IMAGE_MERGE_MODE == 'shuffle':
+        # 以游标 ID 为种子打乱副本，保证同一结果集各页之间的顺序一致，且不打乱缓存中的列表
+        candidates = list(candidates)
+        random.Random(entry_id).shuffle(candidates)
+
+    if fanout is not None:
+        # 以实际返回的第一页统计各搜索源的产出
+        provider_yield.observe(fanout, candidates[:limit])
+    if len(candidates) > limit:
+        cursor_store.put(entry_id, type, q, candidates)
+    return page_response(type, candidates, entry_id, 0, limit, fmt, {"X-Search-Source": source})
+
+def page_from_cursor(q: str, type: str, limit: int, cursor: str, fmt: ResponseFormat = JSON_FORMAT) -> Response:
+    """根据游标返回缓存结果集中的下一页。"""
+    found = cursor_store.get(cursor)
+    if found is None:
+        response_payload = StandardResponse(code=410, message="Cursor is invalid or has expired, please search again.", data=None)
+        return JSONResponse(status_code=410, content=response_payload.model_dump())
+    entry, offset = found
+    if entry.search_type != type or entry.query != q:
+        raise HTTPException(status_code=400, detail="Cursor does not belong to this query.")
+    entry_id = cursor.rpartition(".")[0]
+    return page_response(type, entry.items, entry_id, offset, limit, fmt)
+
+def page_response(type: str, candidates: list, entry_id: str, offset: int, limit: int, fmt: ResponseFormat = JSON_FORMAT, headers: dict[str, str] | None = None) -> Response:
+    """从完整候选列表中截取一页，按协商的字段、编码与压缩方式输出，还有剩余结果时附带 next_cursor。"""
+    page = candidates[offset:offset + limit]
+    next_offset = offset + limit
+    next_cursor = cursor_store.cursor(entry_id, next_offset) if next_offset < len(candidates) else None
+
+    with profiling.stage("main", "serialize"):
+        data = serialize_page(type, page, fmt.fields)
+        data["next_cursor"] = next_cursor
+        return fmt.render({"code": 200, "message": "OK", "data": data}, headers=headers)
+
+# 各类型结果可输出的字段及其取值方式，用于 fields 投影
+RESULT_FIELDS = {
+    'image': {
+        "title": lambda img: img.title or "",
+        "source": lambda img: img.source,
+        "url": lambda img: image_proxy.proxied_url(img.original),
+    },
+    'web': {
+        "title": lambda result: result.title,
+        "url": lambda result: result.link,
+        "description": lambda result: result.snippet,
+    },
+}
+
+def parse_fields(type: str, value: str | None) -> tuple[str, ...] | None:
+    """解析 fields 参数 (逗号分隔的字段名)，省略或为空时返回 None 表示输出全部字段。"""
+    if not value or not value.strip():
+        return None
+    fields = tuple(dict.fromkeys(name.strip() for name in value.split(",") if name.strip()))
+    unknown = [name for name in fields if name not in RESULT_FIELDS[type]]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown field(s) for type '{type}': {', '.join(unknown)}. Available: {', '.join(RESULT_FIELDS[type])}."
         )
-        return JSONResponse(content=response_payload.model_dump())
+    return fields
+
+def serialize_page(type: str, page: list, fields: tuple[str, ...] | None = None) -> dict:
+    """
+    把一页结果记录转换为输出字段，`/search` 与离线批量抓取共用同一格式。
+    给出 `fields` 时只计算并输出这些字段 (例如只要 url 时不生成标题与来源)。
+    """
+    key = "images" if type == 'image' else "results"
+    if fields is not None:
+        getters = [(name, RESULT_FIELDS[type][name]) for name in fields]
+        return {key: [{name: get(item) for name, get in getters} for item in page]}
+    # 结果记录只在这里转换为输出字段，不再经过 pydantic 模型逐条校验
+    if type == 'image':
+        return {"images": [
+            {"title": img.title or "", "source": img.source, "url": image_proxy.proxied_url(img.original)}
+            for img in page
+        ]}
+    return {"results": [
+        {"title": result.title, "url": result.link, "description": result.snippet}
+        for result in page
+    ]}
+
+@app.get("/image",
+         summary="图片代理接口",
+         description="代理并缓存图片，支持 Range 请求与可选的缩略图。"
+)
+async def image(
+    request: Request,
+    url: str = Query(..., description="原图地址。"),
+    sig: str | None = Query(None, description="图片搜索结果中代理地址附带的签名。"),
+    w: int | None = Query(None, ge=16, le=settings.IMAGE_THUMBNAIL_MAX_WIDTH, description="缩略图宽度，省略时返回原图。")
+):
+    # 只代理本服务在搜索结果中签发的地址，不作为任意地址的开放代理
+    if not image_proxy.verify_signature(url, sig):
+        raise HTTPException(status_code=403, detail="Invalid or missing signature.")
+    invalid_reason = image_proxy.validate_image_url(url)
+    if invalid_reason:
+        raise HTTPException(status_code=400, detail=invalid_reason)
+    try:
+        return await image_proxy.serve_image(url, request.headers.get("range"), w)
+    except image_proxy.UnsafeImageURL as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except RuntimeError as e:
+        # 未安装 Pillow 时无法生成缩略图
+        raise HTTPException(status_code=501, detail=str(e))
+    except (image_proxy.ImageFetchError, httpx.HTTPError) as e:
+        logging.warning(f"Image proxy failed for '{url}': {e}")
+        response_payload = StandardResponse(code=502, message=f"Failed to fetch image: {e}", data=None)
+        return JSONResponse(status_code=502, content=response_payload.model_dump())
+
+def require_admin(x_admin_token: str | None = Header(None)) -> None:
+    """管理接口鉴权：未配置 ADMIN_TOKEN 时管理接口整体关闭。"""
+    if not settings.ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if x_admin_token != settings.ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Invalid admin token.")
+
+@app.get("/admin/profile",
+         include_in_schema=False,
+         dependencies=[Depends(require_admin)]
+)
+async def admin_profile(
+    seconds: float | None = Query(None, gt=0, description="采样时长 (秒)。"),
+    requests: int | None = Query(None, ge=1, description="采样直到完成指定数量的 /search 请求。")
+):
+    """对事件循环线程采样，返回折叠栈格式的剖析结果，可直接用于生成火焰图。"""
+    if seconds is None and requests is None:
+        seconds = 10
+    try:
+        profiler = await profiling.run_profile(seconds, requests)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return PlainTextResponse(profiler.folded(), headers={"X-Profile-Samples": str(profiler.samples)})
+
+@app.get("/admin/slow-queries",
+         include_in_schema=False,
+         dependencies=[Depends(require_admin)]
+)
+async def admin_slow_queries():
+    """返回最近的慢查询记录 (按时间倒序)，包含各搜索源分阶段耗时与事件循环延迟。"""
+    return StandardResponse(code=200, message="OK", data=list(reversed(profiling.slow_queries)))
+
+@app.get("/admin/provider-yield",
+         include_in_schema=False,
+         dependencies=[Depends(require_admin)]
+)
+async def admin_provider_yield():
+    """按查询分类返回各搜索源的产出占比 (返回给用户的前 limit 条中来自该源的比例) 与样本数。"""
+    return StandardResponse(code=200, message="OK", data=provider_yield.snapshot())
 
 @app.get("/", include_in_schema=False)
 def read_root():
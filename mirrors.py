@@ -0,0 +1,200 @@
+# mirrors.py
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable
+
+from config import settings
+from latency import RollingLatency
+
+
+def parse_endpoints(value: str | None) -> list[str]:
+    """将逗号分隔的地址列表解析为去掉末尾斜杠的地址列表。"""
+    if not value:
+        return []
+    return [url.strip().rstrip('/') for url in value.split(',') if url.strip()]
+
+
+class Endpoint:
+    """单个上游地址 (直连或反代) 的延迟与健康状态。"""
+
+    def __init__(self, url: str, window: int):
+        self.url = url
+        self.window = window
+        self.latency = RollingLatency(window)
+        self.latency_by_kind: dict[str, RollingLatency] = {}
+        self.consecutive_failures = 0
+        self.down_until = 0.0
+
+    def is_healthy(self, now: float) -> bool:
+        return now >= self.down_until
+
+    def record_success(self, kind: str, seconds: float) -> None:
+        self.consecutive_failures = 0
+        self.down_until = 0.0
+        self.latency.record(seconds)
+        histogram = self.latency_by_kind.get(kind)
+        if histogram is None:
+            histogram = RollingLatency(self.window)
+            self.latency_by_kind[kind] = histogram
+        histogram.record(seconds)
+
+    def record_failure(self) -> None:
+        self.consecutive_failures += 1
+        if self.consecutive_failures >= settings.MIRROR_MAX_FAILURES:
+            self.down_until = time.monotonic() + settings.MIRROR_COOLDOWN
+            logging.warning(
+                f"Endpoint {self.url} failed {self.consecutive_failures} times in a row, "
+                f"marking it down for {settings.MIRROR_COOLDOWN}s."
+            )
+
+    def score(self) -> float:
+        """排序依据：p50 延迟。样本不足的地址得分为 0，优先被选中以便尽快测得其延迟。"""
+        if len(self.latency) < settings.MIRROR_MIN_SAMPLES:
+            return 0.0
+        return self.latency.percentile(50)
+
+    def hedge_delay(self, kind: str) -> float:
+        """该地址在此类请求上的 p90 延迟，样本不足时使用默认对冲延迟。"""
+        histogram = self.latency_by_kind.get(kind)
+        if histogram is None or len(histogram) < settings.MIRROR_MIN_SAMPLES:
+            return settings.HEDGE_DEFAULT_DELAY
+        return max(settings.HEDGE_MIN_DELAY, histogram.percentile(90))
+
+
+class EndpointPool:
+    """
+    同一搜索源的一组等价上游地址。请求总是发往当前最快的健康地址；
+    若其耗时超过该地址的 p90 延迟，则向次优地址发起对冲请求，先返回者胜出。
+    """
+
+    def __init__(self, name: str, urls: list[str]):
+        if not urls:
+            raise ValueError(f"Endpoint pool '{name}' needs at least one URL.")
+        self.name = name
+        self.endpoints = [Endpoint(url, settings.ADAPTIVE_TIMEOUT_WINDOW) for url in urls]
+
+    def ranked(self) -> list[Endpoint]:
+        now = time.monotonic()
+        healthy = [ep for ep in self.endpoints if ep.is_healthy(now)]
+        # 全部地址都处于冷却期时，仍按延迟排序尝试所有地址
+        candidates = healthy or self.endpoints
+        return sorted(candidates, key=lambda ep: ep.score())
+
+    def best(self) -> str:
+        """当前最快的健康地址，供搜索源拼接请求 URL。"""
+        return self.ranked()[0].url
+
+    def _match(self, url: str) -> Endpoint | None:
+        for endpoint in self.endpoints:
+            if url == endpoint.url or url.startswith(endpoint.url + '/') or url.startswith(endpoint.url + '?'):
+                return endpoint
+        return None
+
+    @staticmethod
+    def _rebase(url: str, source: Endpoint, target: Endpoint) -> str:
+        return target.url + url[len(source.url):]
+
+    @staticmethod
+    def _is_failure(response: Any) -> bool:
+        status = getattr(response, "status_code", 200)
+        return status >= 500 or status == 429
+
+    async def _attempt(self, endpoint: Endpoint, url: str, kind: str, send: Callable[[str], Awaitable[Any]]) -> Any:
+        start = time.perf_counter()
+        try:
+            response = await send(url)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            endpoint.record_failure()
+            raise
+        if self._is_failure(response):
+            endpoint.record_failure()
+        else:
+            endpoint.record_success(kind, time.perf_counter() - start)
+        return response
+
+    async def request(self, url: str, kind: str, send: Callable[[str], Awaitable[Any]]) -> Any:
+        """
+        发送一次 (可能被对冲的) 请求。
+
+        Args:
+            url: 以池内任一地址为前缀的完整 URL。
+            kind: 请求类型，用于选取对应的 p90 对冲延迟。
+            send: 接收最终 URL 并发出请求的协程函数。
+
+        Returns:
+            首个成功的响应；全部失败时返回最后一个失败响应或抛出最后一个异常。
+        """
+        source = self._match(url)
+        if source is None:
+            return await send(url)
+
+        ranked = self.ranked()
+        primary = ranked[0]
+        if not settings.HEDGE_ENABLED or len(ranked) < 2:
+            return await self._attempt(primary, self._rebase(url, source, primary), kind, send)
+
+        secondary = ranked[1]
+        primary_task = asyncio.create_task(
+            self._attempt(primary, self._rebase(url, source, primary), kind, send)
+        )
+        pending = {primary_task}
+        fallback_response = None
+        last_error: BaseException | None = None
+        try:
+            done, _ = await asyncio.wait(pending, timeout=primary.hedge_delay(kind))
+            if done and not primary_task.exception() and not self._is_failure(primary_task.result()):
+                return primary_task.result()
+
+            logging.info(f"Hedging {self.name} request to {secondary.url} (primary {primary.url} is slow or failed).")
+            pending.add(asyncio.create_task(
+                self._attempt(secondary, self._rebase(url, source, secondary), kind, send)
+            ))
+            # 主请求已失败时不再等待它
+            pending -= done
+            if done:
+                if primary_task.exception():
+                    last_error = primary_task.exception()
+                else:
+                    fallback_response = primary_task.result()
+
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception():
+                        last_error = task.exception()
+                    elif self._is_failure(task.result()):
+                        fallback_response = task.result()
+                    else:
+                        return task.result()
+        finally:
+            for task in pending:
+                task.cancel()
+            # 等待落败或被取消的请求真正结束，使其连接与名额在返回前释放
+            if pending:
+                await asyncio.wait(pending)
+
+        if fallback_response is not None:
+            return fallback_response
+        raise last_error
+
+
+_pools: dict[str, EndpointPool] = {}
+
+
+def get_pool(name: str, configured: str | None, default_url: str) -> EndpointPool:
+    """
+    获取 (必要时创建) 指定搜索源的地址池。
+
+    Args:
+        name: 地址池名称，同名搜索源 (如必应网页与图片) 共享一个池。
+        configured: 配置中的反代地址，可用逗号分隔多个；需要直连时把官方地址也写进列表。
+        default_url: 未配置任何地址时使用的官方地址。
+    """
+    pool = _pools.get(name)
+    if pool is None:
+        pool = EndpointPool(name, parse_endpoints(configured) or [default_url.rstrip('/')])
+        _pools[name] = pool
+    return pool
@@ -0,0 +1,63 @@
+# pagination.py
+import secrets
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from config import settings
+
+
+@dataclass
+class CursorEntry:
+    """一次搜索的完整候选结果 (已融合或已打乱)，供后续分页直接切片。"""
+    search_type: str
+    query: str
+    items: list
+    expires_at: float
+
+
+class CursorStore:
+    """
+    以不透明游标缓存完整候选列表。游标形如 `<条目ID>.<偏移量>`，
+    条目在 `ttl` 秒后过期，总数超过 `max_entries` 时淘汰最早创建的条目。
+    """
+
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries: OrderedDict[str, CursorEntry] = OrderedDict()
+
+    @staticmethod
+    def new_id() -> str:
+        return secrets.token_urlsafe(12)
+
+    def _purge_expired(self, now: float) -> None:
+        while self.entries:
+            entry_id, entry = next(iter(self.entries.items()))
+            if entry.expires_at > now:
+                break
+            del self.entries[entry_id]
+
+    def put(self, entry_id: str, search_type: str, query: str, items: list) -> None:
+        now = time.monotonic()
+        self._purge_expired(now)
+        self.entries[entry_id] = CursorEntry(search_type, query, items, now + self.ttl)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    @staticmethod
+    def cursor(entry_id: str, offset: int) -> str:
+        return f"{entry_id}.{offset}"
+
+    def get(self, cursor: str) -> tuple[CursorEntry, int] | None:
+        """解析游标，返回 (条目, 偏移量)；游标无效或已过期时返回 None。"""
+        entry_id, _, offset_text = cursor.rpartition(".")
+        if not entry_id or not offset_text.isdigit():
+            return None
+        entry = self.entries.get(entry_id)
+        if entry is None or entry.expires_at <= time.monotonic():
+            return None
+        return entry, int(offset_text)
+
+
+cursor_store = CursorStore(settings.CURSOR_TTL_SECONDS, settings.CURSOR_MAX_ENTRIES)
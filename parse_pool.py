@@ -0,0 +1,84 @@
+# parse_pool.py
+import asyncio
+import concurrent.futures
+import logging
+import multiprocessing
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from typing import Any, Callable, TypeVar
+
+from config import settings
+from profiling import stage
+
+T = TypeVar("T")
+
+_executor: concurrent.futures.Executor | None = None
+
+
+def _parse_offload_providers(value: str) -> dict[str, int]:
+    """解析 `yandex,acg66:65536` 形式的配置，返回 搜索源 -> 最小卸载字节数。"""
+    thresholds = {}
+    for entry in value.split(","):
+        name, _, min_bytes = entry.strip().partition(":")
+        if name:
+            thresholds[name] = int(min_bytes) if min_bytes.strip() else settings.PARSE_OFFLOAD_MIN_BYTES
+    return thresholds
+
+
+OFFLOAD_THRESHOLDS = _parse_offload_providers(settings.PARSE_OFFLOAD_PROVIDERS)
+
+
+def _init_worker() -> None:
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+def _create_executor() -> concurrent.futures.Executor:
+    if settings.PARSE_POOL_KIND == "interpreter":
+        interpreter_pool = getattr(concurrent.futures, "InterpreterPoolExecutor", None)
+        if interpreter_pool is not None:
+            return interpreter_pool(max_workers=settings.PARSE_POOL_WORKERS)
+        logging.warning("InterpreterPoolExecutor is not available on this Python, using a process pool instead.")
+    # 不使用 fork：事件循环进程中已有后台线程 (curl、剖析器)，fork 后的子进程可能死锁
+    return concurrent.futures.ProcessPoolExecutor(
+        max_workers=settings.PARSE_POOL_WORKERS,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+    )
+
+
+def start() -> None:
+    """按配置创建解析进程池 (工作进程在首次使用时才启动)。在应用启动时调用。"""
+    global _executor
+    if _executor is None and settings.PARSE_POOL_WORKERS > 0 and OFFLOAD_THRESHOLDS:
+        _executor = _create_executor()
+        logging.info(f"Parse pool ready ({settings.PARSE_POOL_KIND}, {settings.PARSE_POOL_WORKERS} workers) for: {', '.join(OFFLOAD_THRESHOLDS)}")
+
+
+def shutdown() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+async def run_parser(provider: str, parser: Callable[..., T], content: bytes, *args: Any) -> T:
+    """
+    执行 `parser(content, *args)` 并计入 `provider` 的 parse 阶段。
+
+    该搜索源启用了卸载且页面不小于阈值时，原始字节被发送到解析池中执行，只有解析出的结果记录会传回；
+    否则直接在事件循环中执行。`parser` 必须是模块级函数，参数与返回值都必须可以 pickle。
+    """
+    global _executor
+    with stage(provider, "parse"):
+        threshold = OFFLOAD_THRESHOLDS.get(provider)
+        if _executor is None or threshold is None or len(content) < threshold:
+            return parser(content, *args)
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(_executor, partial(parser, content, *args))
+        except BrokenProcessPool:
+            # 工作进程异常退出会使整个进程池不可用，重建后本次改为在本地解析
+            logging.error("Parse pool is broken, recreating it.")
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = _create_executor()
+            return parser(content, *args)
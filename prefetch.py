@@ -0,0 +1,163 @@
+# prefetch.py
+import asyncio
+import heapq
+import logging
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable
+
+from admission import TokenBucket, admission_controller
+from config import settings
+
+QueryKey = tuple[str, str]  # (搜索类型, 查询词)
+
+
+class SpaceSaving:
+    """
+    Space-Saving 热点统计：最多跟踪 `capacity` 个查询，新查询在表满时替换计数最小者并继承其计数，
+    因此高频查询的计数只会被高估、不会被漏掉。计数会周期性衰减，使热点能跟随流量变化。
+    计数最小者由最小堆查找，新查询的开销为 O(log capacity)。
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.counts: dict[QueryKey, float] = {}
+        # 每个查询在堆中恰有一项 (计数, 查询)。命中只更新 counts，堆中的计数可能偏低，淘汰时再修正
+        self._heap: list[tuple[float, QueryKey]] = []
+
+    def offer(self, key: QueryKey) -> None:
+        if key in self.counts:
+            self.counts[key] += 1
+            return
+        count = 1 if len(self.counts) < self.capacity else self._evict_min() + 1
+        self.counts[key] = count
+        heapq.heappush(self._heap, (count, key))
+
+    def _evict_min(self) -> float:
+        """移除计数最小的查询并返回其计数。"""
+        while True:
+            count, key = self._heap[0]
+            current = self.counts[key]
+            if current == count:
+                heapq.heappop(self._heap)
+                del self.counts[key]
+                return count
+            # 堆顶的计数已过时 (期间有命中)，按当前计数放回后重新比较
+            heapq.heapreplace(self._heap, (current, key))
+
+    def top(self, k: int, min_count: float = 0) -> list[tuple[QueryKey, float]]:
+        ranked = sorted(self.counts.items(), key=lambda kv: kv[1], reverse=True)
+        return [(key, count) for key, count in ranked[:k] if count >= min_count]
+
+    def decay(self, factor: float) -> None:
+        """所有计数乘以 `factor`，并丢弃已衰减到接近 0 的查询。"""
+        self.counts = {key: count * factor for key, count in self.counts.items() if count * factor >= 0.5}
+        self._heap = [(count, key) for key, count in self.counts.items()]
+        heapq.heapify(self._heap)
+
+
+class ResultCache:
+    """
+    按 (类型, 查询词) 缓存完整候选列表 (融合后的网页结果或去重后的图片结果)，带 TTL 与条目上限。
+    同时记录抓取深度 (每个搜索源抓取的条数)，深度不足的缓存不能满足更大 limit 的请求。
+    """
+
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries: OrderedDict[QueryKey, tuple[list, int, float]] = OrderedDict()
+
+    def get(self, key: QueryKey, depth: int = 0) -> list | None:
+        cached = self.entries.get(key)
+        if cached is None:
+            return None
+        items, cached_depth, expires_at = cached
+        if expires_at <= time.monotonic():
+            del self.entries[key]
+            return None
+        if cached_depth < depth:
+            return None
+        self.entries.move_to_end(key)
+        return items
+
+    def put(self, key: QueryKey, items: list, depth: int = 0) -> None:
+        self.entries[key] = (items, depth, time.monotonic() + self.ttl)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def remaining_ttl(self, key: QueryKey) -> float:
+        """缓存剩余有效秒数，未缓存时返回 0。"""
+        cached = self.entries.get(key)
+        return max(0.0, cached[2] - time.monotonic()) if cached else 0.0
+
+
+class PrefetchScheduler:
+    """
+    后台定期刷新热点查询：在缓存过期前 `refresh_ahead` 秒重新抓取排名前 `top_k` 的查询。
+    刷新次数受令牌桶预算限制，且在准入控制器已满载或有请求排队时整轮跳过，避免与在线流量争抢上游。
+    """
+
+    def __init__(self, tracker: SpaceSaving, cache: ResultCache):
+        self.tracker = tracker
+        self.cache = cache
+        self.budget = TokenBucket(settings.PREFETCH_MAX_PER_MINUTE / 60, max(1, settings.PREFETCH_TOP_K))
+        self.refreshed = 0
+        self._task: asyncio.Task | None = None
+        self._refresh: Callable[[str, str], Awaitable[tuple[list, int]]] | None = None
+        self._last_decay = time.monotonic()
+
+    def start(self, refresh: Callable[[str, str], Awaitable[tuple[list, int]]]) -> None:
+        """`refresh(type, q)` 负责抓取并返回 (完整候选列表, 抓取深度)。"""
+        if self._task is None and settings.PREFETCH_ENABLED and settings.PREFETCH_MAX_PER_MINUTE > 0:
+            self._refresh = refresh
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def _live_traffic_busy(self) -> bool:
+        return admission_controller.saturated or admission_controller.waiting > 0
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(settings.PREFETCH_INTERVAL)
+            try:
+                await self.run_once()
+            except Exception as e:
+                logging.warning(f"Prefetch round failed: {e}")
+
+    async def run_once(self) -> None:
+        now = time.monotonic()
+        if now - self._last_decay >= settings.HOT_QUERY_HALF_LIFE:
+            self.tracker.decay(0.5)
+            self._last_decay = now
+
+        hot = self.tracker.top(settings.PREFETCH_TOP_K, settings.PREFETCH_MIN_HITS)
+        # 剩余有效期最短的优先刷新
+        due = sorted(
+            (key for key, _ in hot if self.cache.remaining_ttl(key) <= settings.PREFETCH_REFRESH_AHEAD),
+            key=self.cache.remaining_ttl,
+        )
+        for search_type, q in due:
+            if self._live_traffic_busy() or self.budget.try_acquire():
+                break
+            try:
+                items, depth = await self._refresh(search_type, q)
+            except Exception as e:
+                logging.warning(f"Prefetch of '{q}' [{search_type}] failed: {e}")
+                continue
+            if items:
+                self.cache.put((search_type, q), items, depth)
+                self.refreshed += 1
+
+
+hot_queries = SpaceSaving(settings.HOT_QUERY_CAPACITY)
+result_cache = ResultCache(settings.RESULT_CACHE_TTL_SECONDS, settings.RESULT_CACHE_MAX_ENTRIES)
+prefetch_scheduler = PrefetchScheduler(hot_queries, result_cache)
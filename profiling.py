@@ -0,0 +1,216 @@
+# profiling.py
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+
+from config import settings
+
+
+class LoopLagMonitor:
+    """
+    周期性测量事件循环延迟 (实际唤醒时间与预期时间之差)，保留最近一段时间的样本，
+    用于在慢查询日志中给出请求期间的最大循环延迟。
+    """
+
+    def __init__(self, interval: float = 0.1, history_seconds: float = 300.0):
+        self.interval = interval
+        self.samples: deque[tuple[float, float]] = deque(maxlen=int(history_seconds / interval))
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            now = loop.time()
+            self.samples.append((now, max(0.0, now - expected)))
+
+    def max_lag_since(self, since: float) -> float:
+        """返回自 `since` (loop.time() 时间) 以来观测到的最大循环延迟 (秒)。"""
+        return max((lag for ts, lag in self.samples if ts >= since), default=0.0)
+
+
+@dataclass
+class RequestTrace:
+    """一次 /search 请求内各搜索源各阶段 (fetch/parse/resolve) 的累计耗时。"""
+    query: str
+    search_type: str
+    limit: int
+    started_at: float = field(default_factory=time.perf_counter)
+    loop_started_at: float = 0.0
+    stages: dict[str, dict[str, float]] = field(default_factory=dict)
+    counts: dict[str, dict[str, int]] = field(default_factory=dict)
+
+    def add(self, provider: str, stage: str, seconds: float) -> None:
+        provider_stages = self.stages.setdefault(provider, {})
+        provider_stages[stage] = provider_stages.get(stage, 0.0) + seconds
+        provider_counts = self.counts.setdefault(provider, {})
+        provider_counts[stage] = provider_counts.get(stage, 0) + 1
+
+
+current_trace: ContextVar[RequestTrace | None] = ContextVar("current_trace", default=None)
+
+loop_lag_monitor = LoopLagMonitor()
+slow_queries: deque[dict] = deque(maxlen=settings.SLOW_QUERY_LOG_SIZE)
+
+# 已完成的 /search 请求数，供按请求数采样的剖析使用
+completed_requests = 0
+_request_completed: asyncio.Event | None = None
+
+
+def record_stage(provider: str, stage: str, seconds: float) -> None:
+    """向当前请求的追踪记录累加一次阶段耗时；不在请求上下文中时忽略。"""
+    trace = current_trace.get()
+    if trace is not None:
+        trace.add(provider, stage, seconds)
+
+
+@contextmanager
+def stage(provider: str, name: str):
+    """计时一个代码块并记为当前请求中 `provider` 的 `name` 阶段。"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(provider, name, time.perf_counter() - start)
+
+
+def start_trace(query: str, search_type: str, limit: int) -> RequestTrace:
+    trace = RequestTrace(query=query, search_type=search_type, limit=limit)
+    trace.loop_started_at = asyncio.get_running_loop().time()
+    current_trace.set(trace)
+    return trace
+
+
+def finish_trace(trace: RequestTrace, status_code: int) -> None:
+    """结束追踪；总耗时超过阈值时写入慢查询日志。"""
+    global completed_requests
+    current_trace.set(None)
+    completed_requests += 1
+    if _request_completed is not None:
+        _request_completed.set()
+
+    total_ms = (time.perf_counter() - trace.started_at) * 1000
+    if total_ms < settings.SLOW_QUERY_THRESHOLD_MS:
+        return
+
+    entry = {
+        "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "query": trace.query,
+        "type": trace.search_type,
+        "limit": trace.limit,
+        "status": status_code,
+        "total_ms": round(total_ms, 1),
+        "loop_lag_max_ms": round(loop_lag_monitor.max_lag_since(trace.loop_started_at) * 1000, 1),
+        "stages_ms": {
+            provider: {name: round(seconds * 1000, 1) for name, seconds in stages.items()}
+            for provider, stages in trace.stages.items()
+        },
+        "stage_counts": trace.counts,
+    }
+    slow_queries.append(entry)
+    logging.warning(f"Slow search ({entry['total_ms']}ms) for '{trace.query}' [{trace.search_type}]: {entry['stages_ms']}")
+
+
+class SamplingProfiler:
+    """
+    在后台线程中周期性采样事件循环线程的调用栈，
+    输出折叠栈格式 (flamegraph.pl / speedscope 可直接读取)。
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.stacks: Counter[str] = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._target_thread_id = threading.get_ident()
+
+    @staticmethod
+    def _frame_label(frame) -> str:
+        code = frame.f_code
+        return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._target_thread_id)
+            if frame is None:
+                continue
+            labels = []
+            while frame is not None:
+                labels.append(self._frame_label(frame))
+                frame = frame.f_back
+            self.stacks[";".join(reversed(labels))] += 1
+            self.samples += 1
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def folded(self) -> str:
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common())
+
+
+_profile_lock = asyncio.Lock()
+
+
+async def run_profile(seconds: float | None, requests: int | None) -> SamplingProfiler:
+    """
+    对事件循环线程采样，直到经过 `seconds` 秒或完成 `requests` 个 /search 请求
+    (以先到者为准，且不超过 PROFILE_MAX_SECONDS)。同一时间只允许一个剖析任务。
+
+    Raises:
+        RuntimeError: 已有剖析任务在运行。
+    """
+    global _request_completed
+    if _profile_lock.locked():
+        raise RuntimeError("Another profiling session is already running.")
+    async with _profile_lock:
+        duration = min(seconds or settings.PROFILE_MAX_SECONDS, settings.PROFILE_MAX_SECONDS)
+        profiler = SamplingProfiler(settings.PROFILE_SAMPLE_INTERVAL_MS / 1000)
+        profiler.start()
+        try:
+            if requests:
+                target = completed_requests + requests
+                deadline = time.monotonic() + duration
+                _request_completed = asyncio.Event()
+                while completed_requests < target:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    _request_completed.clear()
+                    try:
+                        await asyncio.wait_for(_request_completed.wait(), timeout=remaining)
+                    except asyncio.TimeoutError:
+                        break
+            else:
+                await asyncio.sleep(duration)
+        finally:
+            _request_completed = None
+            profiler.stop()
+        return profiler
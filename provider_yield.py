@@ -0,0 +1,122 @@
+# provider_yield.py
+import math
+import random
+import re
+from dataclasses import dataclass, field
+
+from config import settings
+
+# 中日韩文字 (汉字、假名、谚文)
+CJK_PATTERN = re.compile(r"[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff]")
+
+
+def query_class(search_type: str, q: str) -> str:
+    """查询分类：搜索类型 + 查询词是否含中日韩文字，如 'image:cjk'、'web:latin'。"""
+    script = "cjk" if CJK_PATTERN.search(q) else "latin"
+    return f"{search_type}:{script}"
+
+
+@dataclass(slots=True)
+class YieldStats:
+    """
+    某搜索源在某类查询上的产出：返回给用户的前 limit 条中来自该源的占比 (指数滑动平均)；
+    按来源交错合并时为去重后全部结果中来自该源的占比。
+    """
+    share: float = 0.0
+    samples: int = 0
+
+
+@dataclass(slots=True)
+class FanoutPlan:
+    """
+    一次搜索的扇出计划。`budgets` 为各搜索源本次的抓取条数 (0 表示跳过)，
+    `measured` 为按完整预算请求、结果可用于更新产出统计的搜索源；
+    `truncated` 表示搜索在凑够结果后提前结束、部分搜索源被取消。
+    `hits` 为各搜索源去重后的结果数，由按来源交错合并的搜索在合并前填写：交错合并的第一页
+    由轮转位置决定，各来源大致均分，不能反映产出，此时改用 `hits` 计算占比。
+    """
+    query_class: str
+    budgets: dict[str, int]
+    measured: set[str] = field(default_factory=set)
+    truncated: bool = False
+    hits: dict[str, int] | None = None
+
+
+class ProviderYield:
+    """
+    按 (搜索源, 查询分类) 统计产出，并据此决定每个搜索源的抓取预算：
+    样本不足时按完整预算请求；产出占比低于 `skip_share` 的搜索源被跳过，
+    低于平均占比的按比例缩减预算 (不低于 `min_budget_fraction`)。
+    每次以 `explore_rate` 的概率对被跳过或缩减的搜索源按完整预算重新探测，使其有机会恢复。
+    只有按完整预算请求的结果会计入统计，避免缩减预算本身拉低占比。
+    """
+
+    def __init__(self, alpha: float, min_samples: int, skip_share: float, min_budget_fraction: float, explore_rate: float, enabled: bool = True):
+        self.alpha = alpha
+        self.min_samples = min_samples
+        self.skip_share = skip_share
+        self.min_budget_fraction = min_budget_fraction
+        self.explore_rate = explore_rate
+        self.enabled = enabled
+        self.stats: dict[tuple[str, str], YieldStats] = {}
+
+    def plan(self, search_type: str, q: str, providers: list[str], depth: int) -> FanoutPlan:
+        fanout = FanoutPlan(query_class(search_type, q), {})
+        fair_share = 1 / len(providers)
+        for provider in providers:
+            stats = self.stats.get((provider, fanout.query_class))
+            if not self.enabled or stats is None or stats.samples < self.min_samples or stats.share >= fair_share:
+                budget = depth
+            elif random.random() < self.explore_rate:
+                budget = depth
+            elif stats.share < self.skip_share:
+                budget = 0
+            else:
+                budget = math.ceil(depth * max(stats.share / fair_share, self.min_budget_fraction))
+            fanout.budgets[provider] = budget
+            if budget == depth:
+                fanout.measured.add(provider)
+        return fanout
+
+    def observe(self, fanout: FanoutPlan, page: list) -> None:
+        """
+        用实际返回给用户的一页结果 (记录带有 `provider` 字段) 更新各搜索源的产出统计。
+        扇出计划带有 `hits` 时改用合并前各搜索源去重后的结果数。
+        """
+        counts = dict.fromkeys(fanout.measured, 0)
+        if fanout.hits is not None:
+            total = sum(fanout.hits.values())
+            for provider, count in fanout.hits.items():
+                if provider in counts:
+                    counts[provider] = count
+        else:
+            total = len(page)
+            for item in page:
+                if item.provider in counts:
+                    counts[item.provider] += 1
+        if not total:
+            return
+        for provider, count in counts.items():
+            stats = self.stats.setdefault((provider, fanout.query_class), YieldStats())
+            share = count / total
+            # 样本较少时用算术平均，尽快接近真实占比
+            weight = max(self.alpha, 1 / (stats.samples + 1))
+            stats.share += (share - stats.share) * weight
+            stats.samples += 1
+
+    def snapshot(self) -> dict[str, dict[str, dict[str, float]]]:
+        """按查询分类列出各搜索源的产出占比与样本数。"""
+        result: dict[str, dict[str, dict[str, float]]] = {}
+        for (provider, klass), stats in sorted(self.stats.items()):
+            result.setdefault(klass, {})[provider] = {"share": round(stats.share, 4), "samples": stats.samples}
+        return result
+
+
+provider_yield = ProviderYield(
+    alpha=settings.ADAPTIVE_FANOUT_ALPHA,
+    min_samples=settings.ADAPTIVE_FANOUT_MIN_SAMPLES,
+    skip_share=settings.ADAPTIVE_FANOUT_SKIP_SHARE,
+    min_budget_fraction=settings.ADAPTIVE_FANOUT_MIN_BUDGET,
+    explore_rate=settings.ADAPTIVE_FANOUT_EXPLORE_RATE,
+    enabled=settings.ADAPTIVE_FANOUT_ENABLED,
+)
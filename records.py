@@ -0,0 +1,38 @@
+# records.py
+from dataclasses import dataclass
+
+
+@dataclass(slots=True)
+class TextResult:
+    """
+    一条网页搜索结果。`penalized` 由黑名单判定写入，为 True 时在融合排序中降权；
+    `provider` 为产生该条目的搜索源，由聚合层写入，用于统计各搜索源的产出。
+    """
+    title: str
+    link: str
+    snippet: str
+    penalized: bool = False
+    provider: str | None = None
+
+
+@dataclass(slots=True)
+class ImageResult:
+    """
+    一条图片搜索结果。`source` 为来源 (多数搜索源即结果页地址)；
+    结果页地址与 `source` 相同时 `link` 留空，缩略图与原图相同时 `thumbnail` 留空。
+    `provider` 为产生该条目的搜索源，由聚合层写入。
+    """
+    title: str | None
+    original: str
+    source: str | None = None
+    link: str | None = None
+    thumbnail: str | None = None
+    provider: str | None = None
+
+    @property
+    def page_url(self) -> str | None:
+        return self.link or self.source
+
+    @property
+    def thumbnail_url(self) -> str:
+        return self.thumbnail or self.original
@@ -0,0 +1,102 @@
+# response_format.py
+import gzip
+from dataclasses import dataclass
+
+from fastapi.responses import Response
+
+import fast_json
+from config import settings
+
+try:
+    import msgpack
+except ImportError:  # msgpack 为可选依赖，未安装时只输出 JSON
+    msgpack = None
+
+try:
+    import brotli
+except ImportError:  # brotli 为可选依赖，未安装时只使用 gzip 压缩
+    brotli = None
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+MSGPACK_ALIASES = (MSGPACK, "application/x-msgpack", "application/vnd.msgpack")
+
+# 压缩级别偏向速度：结果 JSON 冗余度高，低级别已能压缩到原来的几分之一
+GZIP_LEVEL = 5
+BROTLI_QUALITY = 4
+
+
+def parse_header_values(header: str | None) -> dict[str, float]:
+    """解析 Accept / Accept-Encoding 一类的头，返回 {小写取值: q 权重}。"""
+    values = {}
+    for entry in (header or "").split(","):
+        value, *params = entry.split(";")
+        value = value.strip().lower()
+        if not value:
+            continue
+        weight = 1.0
+        for param in params:
+            name, _, number = param.strip().partition("=")
+            if name == "q":
+                try:
+                    weight = float(number)
+                except ValueError:
+                    weight = 0.0
+        values[value] = weight
+    return values
+
+
+def negotiate_media_type(accept: str | None) -> str:
+    """客户端明确接受 MessagePack 且已安装 msgpack 时使用 MessagePack，否则使用 JSON。"""
+    if msgpack is None:
+        return JSON
+    accepted = parse_header_values(accept)
+    msgpack_weight = max((accepted.get(alias, 0.0) for alias in MSGPACK_ALIASES), default=0.0)
+    json_weight = max(accepted.get(JSON, 0.0), accepted.get("application/*", 0.0), accepted.get("*/*", 0.0))
+    return MSGPACK if msgpack_weight > 0 and msgpack_weight >= json_weight else JSON
+
+
+def negotiate_encoding(accept_encoding: str | None) -> str | None:
+    """按客户端的权重选择压缩方式 (同权重时优先 br)，不接受任何可用压缩方式时返回 None。"""
+    accepted = parse_header_values(accept_encoding)
+    wildcard = accepted.get("*", 0.0)
+    candidates = ["br", "gzip"] if brotli is not None else ["gzip"]
+    weights = {encoding: accepted.get(encoding, wildcard) for encoding in candidates}
+    best = max(candidates, key=weights.__getitem__)
+    return best if weights[best] > 0 else None
+
+
+@dataclass(frozen=True, slots=True)
+class ResponseFormat:
+    """
+    一次请求协商得到的输出格式：`fields` 为保留的结果字段 (None 表示全部)，
+    `media_type` 为 JSON 或 MessagePack，`content_encoding` 为压缩方式 (None 表示不压缩)。
+    """
+    fields: tuple[str, ...] | None = None
+    media_type: str = JSON
+    content_encoding: str | None = None
+
+    @classmethod
+    def negotiate(cls, accept: str | None, accept_encoding: str | None, fields: tuple[str, ...] | None = None) -> "ResponseFormat":
+        content_encoding = negotiate_encoding(accept_encoding) if settings.RESPONSE_COMPRESSION_ENABLED else None
+        return cls(fields, negotiate_media_type(accept), content_encoding)
+
+    def render(self, content: dict, status_code: int = 200, headers: dict[str, str] | None = None) -> Response:
+        """编码响应体，超过 RESPONSE_COMPRESSION_MIN_BYTES 时按协商结果压缩。"""
+        if self.media_type == MSGPACK:
+            body = msgpack.packb(content, use_bin_type=True)
+        else:
+            body = fast_json.dumps(content)
+        headers = dict(headers or {})
+        # 同一地址的响应随这两个请求头变化，缓存代理需要区分
+        headers["Vary"] = "Accept, Accept-Encoding"
+        if self.content_encoding and len(body) >= settings.RESPONSE_COMPRESSION_MIN_BYTES:
+            if self.content_encoding == "br":
+                body = brotli.compress(body, quality=BROTLI_QUALITY)
+            else:
+                body = gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+            headers["Content-Encoding"] = self.content_encoding
+        return Response(body, status_code=status_code, headers=headers, media_type=self.media_type)
+
+
+JSON_FORMAT = ResponseFormat()
@@ -1,43 +1,55 @@
 # search_providers/image_bing.py
-import json
 import logging
 from urllib.parse import quote_plus, urljoin
 
 from bs4 import BeautifulSoup
 
+import fast_json
 from config import settings
-from http_clients import get_cffi_session
+from http_clients import fetch
+from parse_pool import run_parser
+from mirrors import get_pool
+from records import ImageResult
 
+DEFAULT_BING_URL = "https://cn.bing.com"
+ENDPOINTS = get_pool("bing", settings.BING_REVERSE_PROXY, DEFAULT_BING_URL)
 
-async def parse_bing_image_results(soup: BeautifulSoup) -> list[dict]:
-    results = []
+
+def parse_bing_image_results(soup: BeautifulSoup) -> list[ImageResult]:
+    m_attrs = []
     for item in soup.select("div.iuscp"):
         link_tag = item.select_one("a.iusc")
         if not link_tag:
             continue
         m_attr = link_tag.get("m")
-        if not m_attr:
-            continue
-        try:
-            data = json.loads(m_attr)
-            original_url, page_url, title, thumbnail_url = data.get("murl"), data.get("purl"), data.get("t"), data.get("turl")
-            if original_url and title:
-                results.append({
-                    "title": title, "source": page_url, "link": page_url,
-                    "original": original_url, "thumbnail": thumbnail_url,
-                })
-        except (json.JSONDecodeError, AttributeError) as e:
-            logging.warning(f"Failed to parse image data from Bing: {e}")
+        if m_attr:
+            m_attrs.append(m_attr)
+
+    # 所有图块的元数据一次性解码
+    results = []
+    for data in fast_json.loads_many(m_attrs):
+        if not isinstance(data, dict):
+            logging.warning("Failed to parse image data from Bing: invalid tile metadata.")
             continue
+        original_url, page_url, title, thumbnail_url = data.get("murl"), data.get("purl"), data.get("t"), data.get("turl")
+        if original_url and title:
+            results.append(ImageResult(title=title, original=original_url, source=page_url, thumbnail=thumbnail_url))
     return results
 
 
-async def search_bing_images(query: str, limit: int | None = None) -> list[dict]:
+def parse_results_page(content: bytes, next_url_selector: str) -> tuple[list[ImageResult], str | None]:
+    """解析一页图片结果，返回 (结果, 下一页地址)。可在解析进程池中执行。"""
+    soup = BeautifulSoup(content, 'html.parser')
+    next_url_container = soup.select_one(next_url_selector)
+    next_url = next_url_container.get("data-nextUrl") if next_url_container else None
+    return parse_bing_image_results(soup), next_url
+
+
+async def search_bing_images(query: str, limit: int | None = None) -> list[ImageResult]:
     if limit is None:
         limit = settings.PER_PROVIDER_FETCH_IMAGE
     """异步地从 Bing.com 直接抓取图片搜索结果。"""
-    DEFAULT_BING_URL = "https://cn.bing.com"
-    BASE_URL = settings.BING_REVERSE_PROXY or DEFAULT_BING_URL
+    BASE_URL = ENDPOINTS.best()
     
     search_url = f"{BASE_URL}/images/search?q={quote_plus(query)}&mkt=zh-CN&first=1"
     logging.info(f"Searching bing Images with query: '{query}'")
@@ -58,40 +70,30 @@ async def search_bing_images(query: str, limit: int | None = None) -> list[dict]
         'upgrade-insecure-requests': '1',
     }
     
-    session = get_cffi_session()
     all_results = []
     
     try:
         logging.info("Warming up Bing session to get initial cookies for image search...")
-        await session.get(BASE_URL, headers=headers, impersonate="edge101")
+        await fetch("bing_images", BASE_URL, kind="search", pool=ENDPOINTS, headers=headers)
 
-        response = await session.get(search_url, headers=headers, impersonate="edge101")
+        response = await fetch("bing_images", search_url, kind="search", pool=ENDPOINTS, headers=headers)
         response.raise_for_status()
-        soup = BeautifulSoup(response.content, 'html.parser')
-        
-        all_results.extend(await parse_bing_image_results(soup))
-        
-        next_url_container = soup.select_one("#mmComponent_images_1[data-nextUrl]")
-        next_url = next_url_container.get("data-nextUrl") if next_url_container else None
+        page_results, next_url = await run_parser("bing_images", parse_results_page, response.content, "#mmComponent_images_1[data-nextUrl]")
+        all_results.extend(page_results)
 
         while next_url and len(all_results) < limit:
             async_url = urljoin(BASE_URL, next_url)
             logging.info(f"Fetching next page from Bing Images: {async_url}")
             
             # 请求带上完整的头信息
-            async_response = await session.get(async_url, headers=headers, impersonate="edge101")
+            async_response = await fetch("bing_images", async_url, kind="search", pool=ENDPOINTS, headers=headers)
             async_response.raise_for_status()
             
-            async_soup = BeautifulSoup(async_response.content, 'html.parser')
-            
-            page_results = await parse_bing_image_results(async_soup)
+            page_results, next_url = await run_parser("bing_images", parse_results_page, async_response.content, ".dgControl[data-nextUrl]")
             if not page_results:
                 break
                 
             all_results.extend(page_results)
-            
-            next_container = async_soup.select_one(".dgControl[data-nextUrl]")
-            next_url = next_container.get("data-nextUrl") if next_container else None
 
         if not all_results:
             logging.warning(f"Bing Images search for '{query}' returned 0 results.")
@@ -1,27 +1,63 @@
 # search_providers/image_pixiv.py
 import asyncio
 import logging
+import re
 from urllib.parse import quote_plus
+import fast_json
 from config import settings
-from http_clients import get_cffi_session
-from curl_cffi.requests import AsyncSession
+from http_clients import fetch
+from mirrors import get_pool, parse_endpoints
+from records import ImageResult
+
+PUBLIC_BASE_URL = "https://www.pixiv.net"
+DEFAULT_PIXIV_IMG_URL = "https://i.pximg.net"
+ENDPOINTS = get_pool("pixiv", settings.PIXIV_REVERSE_PROXY, PUBLIC_BASE_URL)
+# 图片地址只会被改写后交给客户端，本服务不经地址池请求它们，无法测速或切换，因此只使用配置中的第一个地址
+IMG_PROXY = (parse_endpoints(settings.PIXIV_IMG_REVERSE_PROXY) or [DEFAULT_PIXIV_IMG_URL])[0]
+
+# 搜索结果中的缩略图地址，例如
+# https://i.pximg.net/c/250x250_80_a2/img-master/img/2024/01/01/00/00/00/123_p0_square1200.jpg
+# https://i.pximg.net/c/250x250_80_a2/custom-thumb/img/2024/01/01/00/00/00/123_p0_custom1200.jpg
+THUMBNAIL_PATTERN = re.compile(
+    r"^(?P<host>.*?)/c/[^/]+/(?:img-master|custom-thumb)/img/"
+    r"(?P<path>(?:\d+/){6}(?P<id>\d+)_p0)_(?:square|custom)1200\.(?:jpg|png|gif)$"
+)
 
 def rewrite_image_url(url: str | None) -> str | None:
     if not url:
         return None
     
-    img_proxy = settings.PIXIV_IMG_REVERSE_PROXY
-    if img_proxy:
-        img_proxy = img_proxy.rstrip('/')
-        return url.replace("https://i.pximg.net", img_proxy)
+    if IMG_PROXY != DEFAULT_PIXIV_IMG_URL:
+        return url.replace(DEFAULT_PIXIV_IMG_URL, IMG_PROXY)
     return url
 
+def derive_master_url(thumbnail_url: str | None, artwork_id: str) -> str | None:
+    """
+    由搜索结果中的缩略图地址推导第一页的 master1200 大图地址 (与详情接口的 urls.regular 相同)。
+    原图的扩展名 (jpg/png/gif) 无法从缩略图得知，因此不推导原图地址。格式不符时返回 None。
+    """
+    match = THUMBNAIL_PATTERN.match(thumbnail_url or "")
+    if match is None or match.group("id") != str(artwork_id):
+        return None
+    return f"{match.group('host')}/img-master/img/{match.group('path')}_master1200.jpg"
+
+def result_from_search_item(art: dict, public_base_url: str) -> ImageResult | None:
+    """直接用搜索结果构造图片记录，无需请求详情接口；无法推导大图地址时返回 None。"""
+    master_url = derive_master_url(art.get("url"), art["id"])
+    if master_url is None:
+        return None
+    return ImageResult(
+        title=art.get("title"),
+        original=rewrite_image_url(master_url),
+        source=f'{public_base_url}/artworks/{art["id"]}',
+        thumbnail=rewrite_image_url(art.get("url")),
+    )
+
 async def get_artwork_details(
-    session: AsyncSession, 
     artwork_id: str, 
     api_endpoint: str, 
     public_base_url: str
-) -> list[dict] | None:
+) -> list[ImageResult] | None:
     detail_url = f"{api_endpoint}/ajax/illust/{artwork_id}"
     headers = {
         'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/125.0.0.0 Safari/537.36',
@@ -29,12 +65,12 @@ async def get_artwork_details(
         'Accept': 'application/json',
     }
     try:
-        response = await session.get(detail_url, headers=headers, timeout=4)
+        response = await fetch("pixiv", detail_url, kind="detail", pool=ENDPOINTS, headers=headers)
         if response.status_code == 404:
             logging.warning(f"Pixiv artwork {artwork_id} not found (404).")
             return None
         response.raise_for_status()
-        data = response.json()
+        data = fast_json.loads(response.content)
         
         if data.get("error"):
             logging.warning(f"Pixiv API error for {artwork_id}: {data.get('message')}")
@@ -56,25 +92,23 @@ async def get_artwork_details(
         final_original_url = rewrite_image_url(original_url_template)
         final_thumbnail_url = rewrite_image_url(thumbnail_url)
 
-        results.append({
-            "title": artwork_body.get("title"),
-            "source": page_url,
-            "link": page_url,
-            "original": final_original_url,
-            "thumbnail": final_thumbnail_url,
-        })
+        results.append(ImageResult(
+            title=artwork_body.get("title"),
+            original=final_original_url,
+            source=page_url,
+            thumbnail=final_thumbnail_url,
+        ))
             
         return results
     except Exception as e:
         logging.error(f"Failed to get details for Pixiv artwork {artwork_id}: {e}")
         return None
 
-async def search_pixiv_images(query: str, limit: int | None = None) -> list[dict]:
+async def search_pixiv_images(query: str, limit: int | None = None) -> list[ImageResult]:
     if limit is None:
         limit = settings.PER_PROVIDER_FETCH_IMAGE
     
-    PUBLIC_BASE_URL = "https://www.pixiv.net"
-    API_ENDPOINT = settings.PIXIV_REVERSE_PROXY or PUBLIC_BASE_URL
+    API_ENDPOINT = ENDPOINTS.best()
     
     encoded_query = quote_plus(query)
     
@@ -86,45 +120,65 @@ async def search_pixiv_images(query: str, limit: int | None = None) -> list[dict
         'user-agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/125.0.0.0 Safari/537.36',
     }
 
-    session = get_cffi_session()
-    artwork_ids = []
+    artworks_found = []
     current_page = 1
     
     try:
-        while len(artwork_ids) < limit and current_page <= 5:
+        while len(artworks_found) < limit and current_page <= 5:
             search_url = f"{API_ENDPOINT}/ajax/search/artworks/{encoded_query}?word={encoded_query}&order=date_d&mode=all&p={current_page}&s_mode=s_tag"
             
             logging.info(f"Fetching Pixiv artwork IDs from page {current_page}...")
-            response = await session.get(search_url, headers=search_headers, timeout=6)
+            response = await fetch("pixiv", search_url, kind="search", pool=ENDPOINTS, headers=search_headers)
             response.raise_for_status()
-            data = response.json()
+            data = fast_json.loads(response.content)
 
             artworks = data.get("body", {}).get("illustManga", {}).get("data", [])
             if not artworks:
                 break
                 
             for art in artworks:
+                # 广告位等条目没有 id
                 if art.get("id"):
-                    artwork_ids.append(art["id"])
+                    artworks_found.append(art)
 
             current_page += 1
-            await asyncio.sleep(0.2)
+            if len(artworks_found) < limit:
+                await asyncio.sleep(0.2)
 
-        if not artwork_ids:
+        if not artworks_found:
             logging.warning(f"Could not find any Pixiv artwork IDs for tag '{query}'.")
             return []
 
-        logging.info(f"Step 2: Concurrently fetching details for {len(artwork_ids)} artworks...")
-        
-        tasks = [
-            get_artwork_details(session, art_id, API_ENDPOINT, PUBLIC_BASE_URL) 
-            for art_id in artwork_ids
-        ]
-        results_nested = await asyncio.gather(*tasks)
+        artworks_found = artworks_found[:limit]
+
+        # 能从搜索结果推导出大图地址的直接构造结果，其余的 (或要求原图时的全部) 再请求详情接口
+        derived: dict[str, ImageResult] = {}
+        if not settings.PIXIV_FETCH_ORIGINALS:
+            for art in artworks_found:
+                result = result_from_search_item(art, PUBLIC_BASE_URL)
+                if result is not None:
+                    derived[art["id"]] = result
+        detail_ids = [art["id"] for art in artworks_found if art["id"] not in derived]
+
+        results_nested = []
+        if detail_ids:
+            logging.info(f"Step 2: Concurrently fetching details for {len(detail_ids)} artworks ({len(derived)} derived from search results)...")
+            tasks = [
+                get_artwork_details(art_id, API_ENDPOINT, PUBLIC_BASE_URL) 
+                for art_id in detail_ids
+            ]
+            results_nested = await asyncio.gather(*tasks)
+        details = dict(zip(detail_ids, results_nested))
 
-        final_results = [item for sublist in results_nested if sublist for item in sublist]
+        # 保持搜索结果的原有顺序
+        final_results = []
+        for art in artworks_found:
+            if art["id"] in derived:
+                final_results.append(derived[art["id"]])
+            elif details.get(art["id"]):
+                final_results.extend(details[art["id"]])
         
-        logging.info(f"Successfully fetched {len(final_results)} original images from Pixiv.")
+        logging.info(f"Successfully fetched {len(final_results)} images from Pixiv.")
         return final_results
 
     except Exception as e:
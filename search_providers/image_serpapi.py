@@ -1,8 +1,10 @@
 # search_providers/image_serpapi.py
 import logging
 import threading
+import fast_json
 from config import settings
-from http_clients import get_httpx_client
+from http_clients import fetch
+from records import ImageResult
 import httpx
 
 # SerpApi
@@ -24,7 +26,7 @@ def get_next_serpapi_key() -> str | None:
         key_index = (key_index + 1) % len(serpapi_keys)
         return key_to_use
 
-async def search_images_serpapi(query: str, limit: int | None = None) -> list[dict]:
+async def search_images_serpapi(query: str, limit: int | None = None) -> list[ImageResult]:
     if limit is None:
         limit = settings.PER_PROVIDER_FETCH_IMAGE
     api_key = get_next_serpapi_key()
@@ -32,9 +34,6 @@ async def search_images_serpapi(query: str, limit: int | None = None) -> list[di
         logging.error("SerpApi API keys not configured or list is empty. Image search is disabled.")
         return []
 
-    # 获取全局共享的 httpx 客户端
-    client = get_httpx_client()
-    
     # 构建请求参数
     params = {
         "q": query,
@@ -47,21 +46,24 @@ async def search_images_serpapi(query: str, limit: int | None = None) -> list[di
     try:
         logging.info(f"Searching images with SerpApi key ending in '...{api_key[-4:]}'.")
 
-        response = await client.get(SERPAPI_BASE_URL, params=params)
+        response = await fetch("serpapi", SERPAPI_BASE_URL, kind="search", params=params)
         response.raise_for_status()
         
-        results = response.json()
+        results = fast_json.loads(response.content)
         
         image_results = []
         if 'images_results' in results:
             for item in results.get('images_results', []):
-                image_results.append({
-                    "title": item.get("title"),
-                    "source": item.get("source"),
-                    "link": item.get("link"),
-                    "original": item.get("original"),
-                    "thumbnail": item.get("thumbnail"),
-                })
+                if not item.get("original"):
+                    continue
+                # SerpApi 的 source 是站点名称，结果页地址单独保存在 link 中
+                image_results.append(ImageResult(
+                    title=item.get("title"),
+                    original=item.get("original"),
+                    source=item.get("source"),
+                    link=item.get("link"),
+                    thumbnail=item.get("thumbnail"),
+                ))
         return image_results
         
     # 捕获 httpx 可能抛出的特定异常
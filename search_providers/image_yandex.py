@@ -1,78 +1,116 @@
 # search_providers/image_yandex.py
-import json
+import html
 import logging
 from urllib.parse import quote_plus
 from bs4 import BeautifulSoup
 
+import fast_json
 from config import settings
-from http_clients import get_cffi_session
+from http_clients import fetch
+from parse_pool import run_parser
+from mirrors import get_pool
+from records import ImageResult
+
+DEFAULT_YANDEX_URL = "https://yandex.com"
+ENDPOINTS = get_pool("yandex", settings.YANDEX_REVERSE_PROXY, DEFAULT_YANDEX_URL)
+
+ENTITIES_PATH = ("initialState", "serpList", "items", "entities")
+
+
+def find_data_state(content: bytes) -> str | None:
+    """
+    直接在原始字节中定位 `div[id^="ImagesApp-"]` 的 data-state 属性，只解码和反转义这一段，
+    避免为整个页面构建 DOM。找不到时退回 BeautifulSoup。
+    """
+    id_pos = content.find(b'id="ImagesApp-')
+    tag_start = content.rfind(b"<div", 0, id_pos) if id_pos >= 0 else -1
+    if tag_start >= 0:
+        attr_pos = content.find(b'data-state="', tag_start)
+        # 属性必须属于同一个标签 (属性值中的 "<" 已被转义)
+        if attr_pos >= 0 and content.find(b"<", tag_start + 1, attr_pos) < 0:
+            value_start = attr_pos + len(b'data-state="')
+            value_end = content.find(b'"', value_start)
+            if value_end >= 0:
+                return html.unescape(content[value_start:value_end].decode("utf-8", errors="replace"))
+
+    soup = BeautifulSoup(content, 'html.parser')
+    data_div = soup.select_one('div[id^="ImagesApp-"]')
+    if not data_div:
+        logging.warning("Yandex Images: Could not find the main data div. Page structure might have changed.")
+        return None
+    data_state = data_div.get('data-state')
+    if not data_state:
+        logging.warning("Yandex Images: data-state attribute is missing from the main data div.")
+        return None
+    return data_state
+
+
+def extract_entities(data_state: str) -> dict:
+    """只解码 initialState.serpList.items.entities；定位失败时退回完整解码。"""
+    try:
+        entities = fast_json.extract_path(data_state, ENTITIES_PATH)
+        if isinstance(entities, dict):
+            return entities
+    except (KeyError, fast_json.JSONDecodeError):
+        pass
+    value = fast_json.loads(data_state)
+    for key in ENTITIES_PATH:
+        value = value.get(key) if isinstance(value, dict) else None
+    return value if isinstance(value, dict) else {}
+
+
+def parse_search_page(content: bytes, limit: int) -> list[ImageResult]:
+    """从搜索结果页中抽取图片记录。可在解析进程池中执行。"""
+    data_state = find_data_state(content)
+    if not data_state:
+        return []
+
+    results = []
+    items_entities = extract_entities(data_state)
+
+    if not items_entities:
+        logging.warning("Yandex Images: Could not find 'entities' in the parsed JSON data.")
+        return []
+
+    for item_id, item_data in items_entities.items():
+        if len(results) >= limit:
+            break
+    
+        snippet = item_data.get('snippet', {})
+        title = snippet.get('title')
+        original_url = item_data.get('origUrl')
+        source_url = snippet.get('url')
+        thumbnail_url = item_data.get('image')
 
+        if not all([title, original_url, source_url]):
+            continue
 
-async def search_yandex_images(query: str, limit: int | None = None) -> list[dict]:
+        if thumbnail_url and thumbnail_url.startswith('//'):
+            thumbnail_url = 'https:' + thumbnail_url
+
+        results.append(ImageResult(title=title, original=original_url, source=source_url, thumbnail=thumbnail_url))
+    return results
+
+
+async def search_yandex_images(query: str, limit: int | None = None) -> list[ImageResult]:
     if limit is None:
         limit = settings.PER_PROVIDER_FETCH_IMAGE
 
-    DEFAULT_YANDEX_URL = "https://yandex.com"
-    BASE_URL = settings.YANDEX_REVERSE_PROXY or DEFAULT_YANDEX_URL
+    BASE_URL = ENDPOINTS.best()
     search_url = f"{BASE_URL}/images/search?text={quote_plus(query)}"
 
     logging.info(f"Searching Yandex Images with query: '{query}'")
 
-    session = get_cffi_session()
-
     try:
-        response = await session.get(search_url, impersonate="chrome120", timeout=15)
+        response = await fetch("yandex", search_url, kind="search", pool=ENDPOINTS)
         response.raise_for_status()
 
-        soup = BeautifulSoup(response.content, 'html.parser')
-
-        data_div = soup.select_one('div[id^="ImagesApp-"]')
-        if not data_div:
-            logging.warning("Yandex Images: Could not find the main data div. Page structure might have changed.")
-            return []
-
-        data_state = data_div.get('data-state')
-        if not data_state:
-            logging.warning("Yandex Images: data-state attribute is missing from the main data div.")
-            return []
-
-        data = json.loads(data_state)
-        
-        results = []
-        items_entities = data.get('initialState', {}).get('serpList', {}).get('items', {}).get('entities', {})
-        
-        if not items_entities:
-            logging.warning("Yandex Images: Could not find 'entities' in the parsed JSON data.")
-            return []
-
-        for item_id, item_data in items_entities.items():
-            if len(results) >= limit:
-                break
-            
-            snippet = item_data.get('snippet', {})
-            title = snippet.get('title')
-            original_url = item_data.get('origUrl')
-            source_url = snippet.get('url')
-            thumbnail_url = item_data.get('image')
-
-            if not all([title, original_url, source_url]):
-                continue
-
-            if thumbnail_url and thumbnail_url.startswith('//'):
-                thumbnail_url = 'https:' + thumbnail_url
-
-            results.append({
-                "title": title,
-                "source": source_url,
-                "link": source_url,
-                "original": original_url,
-                "thumbnail": thumbnail_url,
-            })
+        results = await run_parser("yandex", parse_search_page, response.content, limit)
             
         logging.info(f"Successfully fetched {len(results)} images from Yandex.")
         return results
 
-    except json.JSONDecodeError as e:
+    except fast_json.JSONDecodeError as e:
         logging.error(f"Failed to parse JSON from Yandex Images page: {e}")
         return []
     except (KeyError, TypeError) as e:
@@ -3,19 +3,47 @@ import asyncio
 import logging
 from urllib.parse import quote_plus
 import re
-from bs4 import BeautifulSoup
 from config import settings
-from http_clients import get_cffi_session
-from curl_cffi.requests import AsyncSession
+from http_clients import fetch, fetch_stream
+from html_stream import StreamingExtractor, element_text, has_class
+from mirrors import get_pool
+from records import TextResult
+from serp_paging import PageBlocked, fetch_pages, pages_needed
+
+DEFAULT_BAIDU_URL = "https://www.baidu.com"
+ENDPOINTS = get_pool("baidu", settings.BAIDU_REVERSE_PROXY, DEFAULT_BAIDU_URL)
 
 REAL_URL_PATTERN = re.compile(r'window\.location\.replace\(["\'](.*?)["\']\)')
 
-async def resolve_redirect(session: AsyncSession, redirect_url: str) -> str:
-    """解析百度的跳转链接以获取真实URL。复用传入的会话。"""
+RESULTS_PER_PAGE = 10
+
+# 出现在百度安全验证页面中的字节串
+BLOCK_MARKERS = ("百度安全验证".encode("utf-8"),)
+
+def is_result(item) -> bool:
+    """对应选择器 `#content_left > div.c-container`。"""
+    parent = item.getparent()
+    return has_class(item, 'c-container') and parent is not None and parent.get('id') == 'content_left'
+
+def parse_result(item) -> TextResult | None:
+    title_tag = next(iter(item.xpath('.//h3/a')), None)
+    if title_tag is None:
+        return None
+    title = element_text(title_tag)
+    redirect_link = title_tag.get('href')
+    # 对应选择器 `div > div > div:nth-of-type(2)`
+    snippet_tag = next(iter(item.xpath('.//div[count(preceding-sibling::div) = 1 and parent::div/parent::div]')), None)
+    snippet = element_text(snippet_tag) if snippet_tag is not None else ""
+    if title and redirect_link:
+        return TextResult(title=title, link=redirect_link, snippet=snippet)
+    return None
+
+async def resolve_redirect(redirect_url: str) -> str:
+    """解析百度的跳转链接以获取真实URL。"""
     if not redirect_url.startswith('http'):
         return redirect_url
     try:
-        response = await session.get(redirect_url, timeout=5)
+        response = await fetch("baidu", redirect_url, kind="redirect", pool=ENDPOINTS)
         final_url = str(response.url)
         if 'baidu.com' in final_url:
             match = REAL_URL_PATTERN.search(response.text)
@@ -26,51 +54,52 @@ async def resolve_redirect(session: AsyncSession, redirect_url: str) -> str:
         logging.warning(f"Could not resolve Baidu redirect '{redirect_url}': {e}")
         return redirect_url
 
-async def search_baidu(query: str, limit: int | None = None) -> list[dict]:
+async def fetch_page(base_url: str, query: str, page: int) -> list[TextResult]:
+    """抓取并解析第 `page` 页 (从 0 开始)，链接仍为百度跳转链接。"""
+    search_url = f"{base_url}/s?wd={quote_plus(query)}"
+    if page:
+        search_url += f"&pn={page * RESULTS_PER_PAGE}"
+
+    async with fetch_stream("baidu", search_url, kind="search", pool=ENDPOINTS) as response:
+        response.raise_for_status()
+        extractor = StreamingExtractor("div", is_result, parse_result, RESULTS_PER_PAGE, BLOCK_MARKERS, response.encoding)
+        results = await extractor.consume(response, "baidu")
+
+    if extractor.blocked:
+        raise PageBlocked("Baidu returned a security verification page.")
+    return results
+
+async def search_baidu(query: str, limit: int | None = None) -> list[TextResult]:
     if limit is None:
         limit = settings.PER_PROVIDER_FETCH_TEXT
-    DEFAULT_BAIDU_URL = "https://www.baidu.com"
-    base_url = settings.BAIDU_REVERSE_PROXY or DEFAULT_BAIDU_URL
+    base_url = ENDPOINTS.best()
     logging.info(f"Using Baidu endpoint: {base_url}")
-    
-    search_url = f"{base_url}/s?wd={quote_plus(query)}"
 
-    session = get_cffi_session()
     try:
-        await session.get(base_url)
-        
-        logging.info(f"Searching Baidu with query: '{query}' (limit={limit})")
-        response = await session.get(search_url)
-        response.raise_for_status()
-
-        soup = BeautifulSoup(response.content, 'html.parser')
-        results = []
+        await fetch("baidu", base_url, kind="search", pool=ENDPOINTS)
         
-        for item in soup.select('#content_left > div.c-container', limit=limit * 2):
-            if len(results) >= limit:
-                break
-            title_tag = item.select_one('h3 > a')
-            if not title_tag: continue
-            title = title_tag.get_text(strip=True)
-            redirect_link = title_tag.get('href')
-            snippet_tag = item.select_one('div > div > div:nth-of-type(2)')
-            snippet = snippet_tag.get_text(strip=True) if snippet_tag else ""
-            if title and redirect_link:
-                results.append({"title": title, "link": redirect_link, "snippet": snippet})
+        page_count = pages_needed(limit, RESULTS_PER_PAGE)
+        logging.info(f"Searching Baidu with query: '{query}' (limit={limit}, pages={page_count})")
+        results = (await fetch_pages(
+            "baidu", lambda page: fetch_page(base_url, query, page), page_count
+        ))[:limit]
         
-        redirect_links = [res['link'] for res in results]
+        redirect_links = [res.link for res in results]
 
-        resolve_tasks = [resolve_redirect(session, link) for link in redirect_links]
+        resolve_tasks = [resolve_redirect(link) for link in redirect_links]
         real_links = await asyncio.gather(*resolve_tasks, return_exceptions=True)
 
         final_results = []
         for i, res in enumerate(results):
-            if not isinstance(real_links[i], Exception):
-                res['link'] = real_links[i]
+            if not isinstance(real_links[i], BaseException):
+                res.link = real_links[i]
                 final_results.append(res)
         
-        return final_results[:limit]
+        return final_results
 
+    except PageBlocked as e:
+        logging.error(f"{e} The request was likely blocked.")
+        return []
     except Exception as e:
         logging.warning(f"Failed to fetch results from baidu via {base_url}. Reason: {e}")
-        return []
\ No newline at end of file
+        return []
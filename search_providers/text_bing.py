@@ -1,19 +1,73 @@
 # search_providers/text_bing.py
-from bs4 import BeautifulSoup
 import logging
 from config import settings
 from urllib.parse import quote_plus
-from http_clients import get_cffi_session
+from http_clients import fetch_stream
+from html_stream import StreamingExtractor, drop_element, element_text, has_class
+from mirrors import get_pool
+from records import TextResult
+from serp_paging import PageBlocked, fetch_pages, pages_needed
 
-async def search_bing(query: str, limit: int | None = None) -> list[dict]:
+DEFAULT_BING_URL = "https://cn.bing.com"
+ENDPOINTS = get_pool("bing", settings.BING_REVERSE_PROXY, DEFAULT_BING_URL)
+
+RESULTS_PER_PAGE = 10
+
+# 出现在人机验证页面中的字节串
+BLOCK_MARKERS = ("验证".encode("utf-8"),)
+
+def is_result(item) -> bool:
+    """对应选择器 `#b_results > li`。"""
+    parent = item.getparent()
+    return parent is not None and parent.get("id") == "b_results"
+
+def parse_result(item) -> TextResult | None:
+    title_tag = next(iter(item.xpath('.//h2/a')), None)
+    if title_tag is None:
+        return None
+
+    href = title_tag.get('href')
+    if not href:
+        return None
+
+    title = element_text(title_tag)
+
+    desc_container = next((div for div in item.iter('div') if has_class(div, 'b_caption')), None)
+    snippet_text = ""
+    if desc_container is not None:
+        unwanted_tags = [el for el in desc_container.iterdescendants() if el.tag == 'cite' or has_class(el, 'b_attribution')]
+        for unwanted in unwanted_tags:
+            drop_element(unwanted)
+        snippet_text = element_text(desc_container, " ")
+
+    if title and href:
+        return TextResult(title=title, link=href, snippet=snippet_text)
+    return None
+
+async def fetch_page(base_url: str, query: str, page: int, headers: dict) -> list[TextResult]:
+    """抓取并解析第 `page` 页 (从 0 开始)。"""
+    url = f"{base_url}/search?q={quote_plus(query)}&mkt=zh-CN"
+    if page:
+        url += f"&first={page * RESULTS_PER_PAGE + 1}"
+
+    async with fetch_stream("bing", url, kind="search", pool=ENDPOINTS, headers=headers) as response:
+        response.raise_for_status()
+
+        if "verify" in response.url.lower():
+            raise PageBlocked("Bing redirected to a verification page.")
+
+        extractor = StreamingExtractor("li", is_result, parse_result, RESULTS_PER_PAGE, BLOCK_MARKERS, response.encoding)
+        results = await extractor.consume(response, "bing")
+
+    if extractor.blocked:
+        raise PageBlocked("Bing returned a verification page.")
+    return results
+
+async def search_bing(query: str, limit: int | None = None) -> list[TextResult]:
     if limit is None:
         limit = settings.PER_PROVIDER_FETCH_TEXT
-    DEFAULT_BING_URL = "https://cn.bing.com"
-    BASE_URL = settings.BING_REVERSE_PROXY or DEFAULT_BING_URL
+    BASE_URL = ENDPOINTS.best()
     logging.info(f"Using Bing endpoint: {BASE_URL}")
-    
-    q_enc = quote_plus(query)
-    url = f"{BASE_URL}/search?q={q_enc}&mkt=zh-CN"
 
     headers = {
         'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7',
@@ -32,51 +86,20 @@ async def search_bing(query: str, limit: int | None = None) -> list[dict]:
         'Upgrade-Insecure-Requests': '1',
     }
     
-    session = get_cffi_session()
     try:
-        logging.info(f"Searching Bing with query: '{query}' (limit={limit})")
-        response = await session.get(url, headers=headers)
-        response.raise_for_status()
+        page_count = pages_needed(limit, RESULTS_PER_PAGE)
+        logging.info(f"Searching Bing with query: '{query}' (limit={limit}, pages={page_count})")
+        results = await fetch_pages(
+            "bing", lambda page: fetch_page(BASE_URL, query, page, headers), page_count
+        )
 
-        if "验证" in response.text or "verify" in str(response.url).lower():
-             logging.error("Bing redirected to a verification page. The request was likely blocked.")
-             return []
-
-        soup = BeautifulSoup(response.content, 'html.parser')
-        results = []
-
-        for item in soup.select('#b_results > li'):
-            if len(results) >= limit:
-                break
-                
-            title_tag = item.select_one('h2 > a')
-            if not title_tag:
-                continue
-
-            href = title_tag.get('href')
-            if not href:
-                continue
-
-            title = title_tag.get_text(strip=True)
-
-            desc_container = item.select_one('div.b_caption')
-            snippet_text = ""
-            if desc_container:
-                for unwanted in desc_container.select('cite, .b_attribution'):
-                    unwanted.decompose()
-                snippet_text = desc_container.get_text(" ", strip=True)
-
-            if title and href:
-                results.append({
-                    "title": title,
-                    "link": href,
-                    "snippet": snippet_text
-                })
-        
         if not results:
             logging.warning(f"Bing search for '{query}' returned 0 results. The page structure might have changed or the request was blocked.")
             
         return results[:limit]
+    except PageBlocked as e:
+        logging.error(f"{e} The request was likely blocked.")
+        return []
     except Exception as e:
         logging.warning(f"Failed to fetch results from Bing via {BASE_URL}. Reason: {e}")
-        return []
\ No newline at end of file
+        return []
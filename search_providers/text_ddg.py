@@ -1,17 +1,64 @@
 # search_providers/text_ddg.py
-from bs4 import BeautifulSoup
-from urllib.parse import quote_plus
+from functools import partial
+from urllib.parse import quote_plus, urlencode
 import logging
 from config import settings
-from http_clients import get_httpx_client
+from http_clients import fetch_stream
+from html_stream import StreamingExtractor, has_class
+from mirrors import get_pool
+from records import TextResult
+from serp_paging import merge_pages
 
 DEFAULT_DDG_URL = "https://html.duckduckgo.com"
-BASE_URL = settings.DDG_REVERSE_PROXY or DEFAULT_DDG_URL
-logging.info(f"Using DuckDuckGo endpoint: {BASE_URL}")
+ENDPOINTS = get_pool("ddg", settings.DDG_REVERSE_PROXY, DEFAULT_DDG_URL)
 
-async def search_ddg(query: str, limit: int | None = None) -> list[dict]:
+def is_result(item) -> bool:
+    """对应 `div.result`。"""
+    return has_class(item, 'result')
+
+def parse_result(item, base_url: str) -> TextResult | None:
+    title_tag = next((a for a in item.iter('a') if has_class(a, 'result__a')), None)
+    snippet_tag = next((a for a in item.iter('a') if has_class(a, 'result__snippet')), None)
+
+    if title_tag is not None and snippet_tag is not None:
+        href = title_tag.get('href')
+        if href and href.startswith('/'):
+            href = base_url.rstrip('/') + href
+        return TextResult(
+            title="".join(title_tag.itertext()).strip(),
+            link=href,
+            snippet="".join(snippet_tag.itertext()).strip()
+        )
+    return None
+
+def next_page_params(nav) -> dict[str, str] | None:
+    """从 `div.nav-link` 的翻页表单中取出隐藏字段，只接受 "Next" 按钮所在的表单。"""
+    inputs = list(nav.iter('input'))
+    if not any(i.get('type') == 'submit' and 'next' in (i.get('value') or '').lower() for i in inputs):
+        return None
+    return {i.get('name'): i.get('value', '') for i in inputs if i.get('type') == 'hidden' and i.get('name')}
+
+async def fetch_page(base_url: str, url: str, limit: int, headers: dict) -> tuple[list[TextResult], dict[str, str] | None]:
+    """抓取并解析一页结果，返回 (结果, 下一页表单字段)。"""
+    next_params = []
+
+    def watch(element) -> None:
+        if has_class(element, 'nav-link'):
+            params = next_page_params(element)
+            if params:
+                next_params.append(params)
+
+    async with fetch_stream("ddg", url, kind="search", pool=ENDPOINTS, headers=headers) as response:
+        response.raise_for_status()
+        extractor = StreamingExtractor("div", is_result, partial(parse_result, base_url=base_url), limit, encoding=response.encoding, watch=watch)
+        results = await extractor.consume(response, "ddg")
+    return results, (next_params[-1] if next_params else None)
+
+async def search_ddg(query: str, limit: int | None = None) -> list[TextResult]:
     if limit is None:
         limit = settings.PER_PROVIDER_FETCH_TEXT
+    BASE_URL = ENDPOINTS.best()
+    logging.info(f"Using DuckDuckGo endpoint: {BASE_URL}")
 
     headers = {
         "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
@@ -23,28 +70,26 @@ async def search_ddg(query: str, limit: int | None = None) -> list[dict]:
     url = f"{BASE_URL}/html/?q={q_enc}"
     
     try:
-        client = get_httpx_client()
         logging.info(f"Searching DDG with query: '{query}' (limit={limit})")
 
-        response = await client.get(url, headers=headers)
-        response.raise_for_status()
+        # 下一页表单依赖上一页的内容，只能逐页抓取
+        pages, collected = [], 0
+        for page in range(settings.TEXT_MAX_PAGES):
+            try:
+                page_results, next_params = await fetch_page(BASE_URL, url, limit - collected, headers)
+            except Exception as e:
+                if page == 0:
+                    raise
+                pages.append(e)
+                break
+            pages.append(page_results)
+            collected += len(page_results)
+            if collected >= limit or not next_params:
+                break
+            # 翻页表单以 POST 提交，html 端点同样接受以查询参数传入的相同字段
+            url = f"{BASE_URL}/html/?{urlencode(next_params)}"
 
-        soup = BeautifulSoup(response.text, 'html.parser')
-        results = []
-        for item in soup.find_all('div', class_='result', limit=limit):
-            title_tag = item.find('a', class_='result__a')
-            snippet_tag = item.find('a', class_='result__snippet')
-        
-            if title_tag and snippet_tag:
-                href = title_tag.get('href')
-                if href and href.startswith('/'):
-                    href = BASE_URL.rstrip('/') + href
-                results.append({
-                    "title": title_tag.text.strip(),
-                    "link": href,
-                    "snippet": snippet_tag.text.strip()
-                })
-        return results
+        return merge_pages("ddg", pages)[:limit]
     except Exception as e:
         logging.warning(f"Failed to fetch results from DuckDuckGo via {BASE_URL}. Reason: {e}")
-        return []
\ No newline at end of file
+        return []
@@ -0,0 +1,58 @@
+# serp_paging.py
+import asyncio
+import logging
+import math
+from typing import Awaitable, Callable
+
+from config import settings
+from records import TextResult
+
+
+class PageBlocked(Exception):
+    """搜索引擎返回了人机验证页面。"""
+
+
+def pages_needed(limit: int, page_size: int) -> int:
+    """凑够 `limit` 条结果需要的页数，不超过 TEXT_MAX_PAGES。"""
+    return max(1, min(math.ceil(limit / page_size), settings.TEXT_MAX_PAGES))
+
+
+def merge_pages(provider: str, pages: list[list[TextResult] | BaseException]) -> list[TextResult]:
+    """
+    按页序合并各页结果并按链接去重 (翻页时搜索引擎常会重复返回上一页的条目)。
+    某页失败或为空时丢弃其后各页，保证结果在列表中的位置就是它在搜索引擎中的真实排名，
+    以便倒数排名融合使用正确的名次。
+    """
+    merged, seen_links = [], set()
+    for page, page_results in enumerate(pages):
+        if isinstance(page_results, BaseException):
+            logging.warning(f"{provider}: page {page + 1} failed, keeping the first {page} page(s). Reason: {page_results}")
+            break
+        if not page_results:
+            break
+        for item in page_results:
+            if item.link not in seen_links:
+                seen_links.add(item.link)
+                merged.append(item)
+    return merged
+
+
+async def fetch_pages(
+    provider: str,
+    fetch_page: Callable[[int], Awaitable[list[TextResult]]],
+    page_count: int,
+) -> list[TextResult]:
+    """
+    并发抓取第 0 到 page_count-1 页，同一搜索源同时最多 TEXT_PAGE_CONCURRENCY 个请求，
+    然后用 `merge_pages` 合并。首页失败时直接抛出该异常。
+    """
+    semaphore = asyncio.Semaphore(settings.TEXT_PAGE_CONCURRENCY)
+
+    async def run(page: int) -> list[TextResult]:
+        async with semaphore:
+            return await fetch_page(page)
+
+    pages = await asyncio.gather(*(run(page) for page in range(page_count)), return_exceptions=True)
+    if isinstance(pages[0], BaseException):
+        raise pages[0]
+    return merge_pages(provider, pages)
@@ -0,0 +1,36 @@
+# test_fast_json.py
+import json
+
+import pytest
+
+import fast_json
+from search_providers.image_yandex import ENTITIES_PATH, extract_entities
+
+
+def test_nested_key_with_same_name_is_skipped():
+    document = json.dumps({"initialState": {"serpList": {
+        "meta": {"items": {"entities": {"wrong": 1}}},
+        "items": {"entities": {"right": 2}},
+    }}})
+    assert fast_json.extract_path(document, ENTITIES_PATH) == {"right": 2}
+
+
+def test_key_inside_string_is_skipped():
+    document = json.dumps({
+        "note": '{"initialState": {"serpList": 1}}',
+        "initialState": {"title": "serpList", "serpList": {"items": {"entities": [1, 2]}}},
+    })
+    assert fast_json.extract_path(document, ENTITIES_PATH) == [1, 2]
+
+
+def test_key_outside_current_object_is_not_found():
+    document = json.dumps({"initialState": {"other": {}}, "serpList": {"items": {"entities": {"wrong": 1}}}})
+    with pytest.raises(KeyError):
+        fast_json.extract_path(document, ENTITIES_PATH)
+
+
+def test_yandex_entities_fall_back_to_full_decode():
+    document = json.dumps({"initialState": {"serpList": []}})
+    assert extract_entities(document) == {}
+    document = json.dumps({"initialState": {"x": {"serpList": 0}, "serpList": {"items": {"entities": {"a": {}}}}}})
+    assert extract_entities(document) == {"a": {}}
@@ -0,0 +1,53 @@
+# test_harvest.py
+import argparse
+import asyncio
+import json
+from contextlib import asynccontextmanager
+
+import pytest
+
+import harvest
+import main
+from records import TextResult
+
+
+@pytest.fixture
+def offline_app(monkeypatch):
+    """不初始化客户端的应用；只有查询词 'found' 有结果，其余查询的所有搜索源都返回空。"""
+    @asynccontextmanager
+    async def lifespan(app):
+        yield
+
+    async def fetch_candidates(type: str, q: str, fanout, limit: int | None = None) -> list:
+        if q == "found":
+            return [TextResult(title="Found", link="https://example.com/found", snippet="", provider="ddg")]
+        return []
+
+    monkeypatch.setattr(main, "lifespan", lifespan)
+    monkeypatch.setattr(main, "fetch_candidates", fetch_candidates)
+
+
+def run_harvest(tmp_path, queries: list[str]) -> list[dict]:
+    source = tmp_path / "queries.txt"
+    source.write_text("\n".join(queries), encoding="utf-8")
+    output = tmp_path / "results.jsonl"
+    args = argparse.Namespace(
+        input=str(source), output=str(output), type="web", limit=10,
+        concurrency=2, progress_every=100, fresh=False,
+    )
+    asyncio.run(harvest.harvest(args))
+    return [json.loads(line) for line in output.read_text(encoding="utf-8").splitlines()]
+
+
+def test_query_without_results_is_retried_on_resume(offline_app, tmp_path):
+    records = {record["q"]: record for record in run_harvest(tmp_path, ["found", "empty"])}
+    assert "error" not in records["found"]
+    assert records["empty"]["error"] == "no results from any provider"
+
+    done = harvest.load_checkpoint(str(tmp_path / "results.jsonl"), fresh=False)
+    assert done == {("web", "found")}
+
+    # 续跑只重新抓取没有结果的查询
+    resumed = run_harvest(tmp_path, ["found", "empty"])
+    assert len(resumed) == 3
+    assert resumed[-1]["q"] == "empty"
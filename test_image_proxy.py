@@ -0,0 +1,80 @@
+# test_image_proxy.py
+import asyncio
+import socket
+
+import httpx
+import pytest
+
+import http_clients
+import image_proxy
+import main
+
+PUBLIC_IMAGE = "https://images.example/cat.jpg"
+
+
+def fake_dns(table: dict[str, str]):
+    """把主机名解析为给定地址的 getaddrinfo 替身。"""
+    async def getaddrinfo(host, port, *args, **kwargs):
+        return [(socket.AF_INET, socket.SOCK_STREAM, 6, "", (table[host], port))]
+    return getaddrinfo
+
+
+async def get_image(url: str, sig: str | None, dns: dict[str, str] | None = None) -> httpx.Response:
+    if dns is not None:
+        asyncio.get_running_loop().getaddrinfo = fake_dns(dns)
+    params = {"url": url}
+    if sig is not None:
+        params["sig"] = sig
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        return await client.get("/image", params=params)
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    """替换共享 httpx 客户端：images.example 重定向到云元数据地址，其余请求记录下来并返回 200。"""
+    requested = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requested.append(str(request.url))
+        if request.url.host == "images.example":
+            return httpx.Response(302, headers={"location": "http://169.254.169.254/latest/meta-data/"})
+        return httpx.Response(200, content=b"secret", headers={"content-type": "text/plain"})
+
+    monkeypatch.setattr(http_clients, "httpx_client", httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    monkeypatch.setattr(image_proxy.image_cache, "get", lambda key: None)
+    return requested
+
+
+def test_unsigned_url_is_rejected(upstream):
+    response = asyncio.run(get_image(PUBLIC_IMAGE, None))
+    assert response.status_code == 403
+    response = asyncio.run(get_image(PUBLIC_IMAGE, image_proxy.sign_url("https://other.example/x.jpg")))
+    assert response.status_code == 403
+    assert upstream == []
+
+
+def test_proxied_search_results_are_signed(monkeypatch):
+    monkeypatch.setattr(main.settings, "IMAGE_PROXY_PUBLIC_URL", "https://proxy.example")
+    proxied = httpx.URL(image_proxy.proxied_url(PUBLIC_IMAGE))
+    assert image_proxy.verify_signature(proxied.params["url"], proxied.params["sig"])
+
+
+def test_hostname_resolving_to_private_address_is_rejected(upstream):
+    url = "http://internal.example/admin"
+    response = asyncio.run(get_image(url, image_proxy.sign_url(url), dns={"internal.example": "10.0.0.5"}))
+    assert response.status_code == 400
+    assert upstream == []
+
+
+def test_redirect_to_internal_address_is_not_followed(upstream):
+    response = asyncio.run(get_image(PUBLIC_IMAGE, image_proxy.sign_url(PUBLIC_IMAGE), dns={"images.example": "93.184.216.34"}))
+    assert response.status_code == 400
+    assert upstream == [PUBLIC_IMAGE]
+
+
+def test_signed_public_url_is_proxied(upstream):
+    url = "https://cdn.example/cat.jpg"
+    response = asyncio.run(get_image(url, image_proxy.sign_url(url), dns={"cdn.example": "93.184.216.34"}))
+    assert response.status_code == 200
+    assert response.content == b"secret"
@@ -0,0 +1,32 @@
+# test_prefetch.py
+import random
+
+from prefetch import SpaceSaving
+
+
+def test_space_saving_keeps_hot_queries_with_overestimated_counts():
+    tracker = SpaceSaving(capacity=50)
+    rng = random.Random(0)
+    stream = [("web", "hot")] * 300 + [("web", "warm")] * 100 + [("web", f"cold {i}") for i in range(5000)]
+    rng.shuffle(stream)
+    for key in stream:
+        tracker.offer(key)
+
+    assert len(tracker.counts) == 50
+    assert sum(tracker.counts.values()) == len(stream)
+    (first, first_count), (second, second_count) = tracker.top(2)
+    assert (first, second) == (("web", "hot"), ("web", "warm"))
+    assert first_count >= 300 and second_count >= 100
+
+
+def test_space_saving_evicts_the_smallest_count():
+    tracker = SpaceSaving(capacity=3)
+    for key, hits in (("a", 5), ("b", 1), ("c", 3)):
+        for _ in range(hits):
+            tracker.offer(("web", key))
+    tracker.offer(("web", "d"))
+    assert tracker.counts == {("web", "a"): 5, ("web", "c"): 3, ("web", "d"): 2}
+
+    tracker.decay(0.5)
+    tracker.offer(("web", "e"))
+    assert tracker.counts == {("web", "a"): 2.5, ("web", "c"): 1.5, ("web", "e"): 2}
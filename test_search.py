@@ -0,0 +1,92 @@
+# test_search.py
+import asyncio
+import uuid
+
+import httpx
+import pytest
+
+import main
+from config import settings
+from provider_yield import ProviderYield
+from records import ImageResult
+
+
+def image_provider(name: str, count: int, delay: float = 0.0):
+    async def search(query: str, limit: int | None = None) -> list[ImageResult]:
+        await asyncio.sleep(delay)
+        return [ImageResult(title=f"{name} {i}", original=f"https://{name}.example/{query}/{i}.jpg") for i in range(count)]
+    return search
+
+
+async def get_search(**params) -> httpx.Response:
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        return await client.get("/search", params=params)
+
+
+@pytest.fixture
+def fast_and_slow_providers(monkeypatch):
+    """两个很快返回的图片源和一个很慢的图片源，小 limit 的查询会在慢源返回前提前结束。"""
+    monkeypatch.setattr(main, "IMAGE_PROVIDERS", {
+        "fast_a": image_provider("fast_a", 10),
+        "fast_b": image_provider("fast_b", 10),
+        "slow": image_provider("slow", 10, delay=5),
+    })
+    monkeypatch.setattr(settings, "IMAGE_MERGE_MODE", "interleave")
+    monkeypatch.setattr(settings, "IMAGE_MIN_SOURCES", 2)
+
+
+def test_truncated_image_search_returns_live_results(fast_and_slow_providers, monkeypatch):
+    fallback_calls = []
+
+    async def local_search(search_type: str, q: str, limit: int) -> list:
+        fallback_calls.append(q)
+        return []
+
+    monkeypatch.setattr(main.local_index, "search", local_search)
+    q = f"truncated-{uuid.uuid4().hex}"
+
+    response = asyncio.run(get_search(q=q, type="image", limit=5, source="auto"))
+
+    assert response.status_code == 200
+    assert response.headers["X-Search-Source"] == "live"
+    images = response.json()["data"]["images"]
+    assert len(images) == 5
+    assert {image["url"].split("/")[2] for image in images} == {"fast_a.example", "fast_b.example"}
+    # 提前结束时既不退回本地索引，也不写入结果缓存
+    assert fallback_calls == []
+    assert main.result_cache.get(("image", q)) is None
+
+
+def test_interleaved_search_measures_yield_before_merging(monkeypatch):
+    monkeypatch.setattr(main, "IMAGE_PROVIDERS", {
+        "rich": image_provider("rich", 9),
+        "poor": image_provider("poor", 1),
+    })
+    monkeypatch.setattr(settings, "IMAGE_MERGE_MODE", "interleave")
+    monkeypatch.setattr(main, "provider_yield", ProviderYield(alpha=0.1, min_samples=1, skip_share=0.05, min_budget_fraction=0.25, explore_rate=0))
+    q = f"yield-{uuid.uuid4().hex}"
+
+    response = asyncio.run(get_search(q=q, type="image", limit=2, source="live"))
+
+    assert response.status_code == 200
+    # 第一页两个来源各占一半，产出按合并前的 9 : 1 统计
+    assert {image["url"].split("/")[2] for image in response.json()["data"]["images"]} == {"rich.example", "poor.example"}
+    shares = main.provider_yield.snapshot()["image:latin"]
+    assert shares["rich"]["share"] == 0.9
+    assert shares["poor"]["share"] == 0.1
+
+
+@pytest.mark.parametrize("merge_mode", ["interleave", "shuffle"])
+def test_image_search_without_results_returns_empty_list(merge_mode, monkeypatch, caplog):
+    async def failing(query: str, limit: int | None = None) -> list[ImageResult]:
+        raise RuntimeError("upstream down")
+
+    monkeypatch.setattr(main, "IMAGE_PROVIDERS", {"empty": image_provider("empty", 0), "broken": failing})
+    monkeypatch.setattr(settings, "IMAGE_MERGE_MODE", merge_mode)
+
+    response = asyncio.run(get_search(q=f"nothing-{uuid.uuid4().hex}", type="image", limit=5, source="live"))
+
+    assert response.status_code == 200
+    assert response.json()["data"]["images"] == []
+    assert "RuntimeError('upstream down')" in caplog.text
@@ -1,6 +1,7 @@
 # test_single_provider.py
 import asyncio
 import json
+from dataclasses import asdict
 # 导入要测试的搜索源
 from search_providers.text_baidu import search_baidu
 
@@ -37,7 +38,7 @@ async def run_single_provider_test():
         if isinstance(results, list) and len(results) > 0:
             print(f"{Colors.GREEN}[ PASS ]{Colors.ENDC} Test passed! Received {len(results)} results.")
             print("\n--- Results from Baidu ---")
-            print(json.dumps(results, indent=2, ensure_ascii=False))
+            print(json.dumps([asdict(r) for r in results], indent=2, ensure_ascii=False))
             print("--------------------------\n")
         elif isinstance(results, list) and len(results) == 0:
             print(f"{Colors.RED}[ WARN ]{Colors.ENDC} Test completed, but received 0 results. The provider might be blocked or the page structure has changed.")
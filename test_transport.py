@@ -0,0 +1,229 @@
+# test_transport.py
+import asyncio
+import gzip
+
+import httpx
+import pytest
+
+import http_clients
+from config import settings
+
+
+class CountingStream(httpx.AsyncByteStream):
+    """逐块产出响应体并记录已产出的块数。"""
+
+    def __init__(self, chunk: bytes, count: int):
+        self.chunk = chunk
+        self.count = count
+        self.sent = 0
+
+    async def __aiter__(self):
+        for _ in range(self.count):
+            self.sent += 1
+            yield self.chunk
+
+
+@pytest.fixture
+def mock_upstream(monkeypatch):
+    """把共享 httpx 客户端 (ddg 使用的客户端) 换成由 `handler` 应答的模拟传输，返回记录请求的列表。"""
+    requests = []
+
+    def install(handler):
+        def record(request: httpx.Request) -> httpx.Response:
+            requests.append(str(request.url))
+            return handler(request)
+        monkeypatch.setattr(http_clients, "httpx_client", httpx.AsyncClient(transport=httpx.MockTransport(record)))
+        return requests
+    return install
+
+
+def test_recorded_archive_contains_no_api_key(tmp_path):
+    path = str(tmp_path / "traffic.jsonl.gz")
+    url = "https://serpapi.com/search"
+    params = {"q": "x", "api_key": "SECRET123"}
+    request = httpx.Request("GET", url, params=params)
+    response = httpx.Response(200, content=b"{}", request=request)
+
+    archive = http_clients.TrafficArchive(path, "record")
+    archive.open()
+    archive.record(url, params, response, 0.1)
+    archive.close()
+
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        recorded = f.read()
+    assert "SECRET123" not in recorded
+    assert "q=x" in recorded
+
+
+def test_rate_limited_response_is_not_retried_and_pauses_host(mock_upstream, monkeypatch):
+    monkeypatch.setattr(settings, "UPSTREAM_RETRIES", 2)
+    url = "https://limited.example/search"
+    requests = mock_upstream(lambda request: httpx.Response(429, headers={"retry-after": "30"}))
+
+    async def run():
+        response = await http_clients.fetch("ddg", url, kind="search", coalesce=False)
+        gate = http_clients.host_scheduler.gate(url)
+        # 暂停期间新请求只能排队，等不到名额
+        with pytest.raises(http_clients.HostBusy):
+            await gate.acquire(0, 0.05)
+        return response, gate.paused_until - asyncio.get_running_loop().time()
+
+    response, remaining = asyncio.run(run())
+    assert response.status_code == 429
+    assert requests == [url]
+    assert 25 < remaining <= 30
+
+
+def test_retry_after_parsing():
+    assert http_clients.retry_after("5") == 5
+    assert http_clients.retry_after(None) == http_clients.DEFAULT_RETRY_AFTER
+    assert http_clients.retry_after("soon") == http_clients.DEFAULT_RETRY_AFTER
+    assert http_clients.retry_after("86400") == http_clients.MAX_RETRY_AFTER
+    assert http_clients.retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0
+
+
+def test_oversized_content_length_is_rejected_before_reading(mock_upstream, monkeypatch):
+    monkeypatch.setattr(settings, "UPSTREAM_MAX_RESPONSE_BYTES", 1000)
+    body = CountingStream(b"x" * 100, 100)
+    mock_upstream(lambda request: httpx.Response(200, headers={"content-length": "10000"}, stream=body))
+
+    with pytest.raises(http_clients.ResponseTooLarge):
+        asyncio.run(http_clients.fetch("ddg", "https://big.example/declared", kind="search", coalesce=False))
+    assert body.sent == 0
+
+
+def test_oversized_body_is_abandoned_while_reading(mock_upstream, monkeypatch):
+    monkeypatch.setattr(settings, "UPSTREAM_MAX_RESPONSE_BYTES", 1000)
+    body = CountingStream(b"x" * 100, 100)
+    mock_upstream(lambda request: httpx.Response(200, stream=body))
+
+    with pytest.raises(http_clients.ResponseTooLarge):
+        asyncio.run(http_clients.fetch("ddg", "https://big.example/chunked", kind="search", coalesce=False))
+    assert body.sent == 11
+
+
+def test_body_within_limit_is_returned(mock_upstream, monkeypatch):
+    monkeypatch.setattr(settings, "UPSTREAM_MAX_RESPONSE_BYTES", 1000)
+    content = gzip.compress(b'{"ok": true}')
+    mock_upstream(lambda request: httpx.Response(
+        200, headers={"content-encoding": "gzip", "content-type": "application/json"}, content=content
+    ))
+
+    response = asyncio.run(http_clients.fetch("ddg", "https://small.example/search", kind="search", coalesce=False))
+    assert response.status_code == 200
+    assert response.json() == {"ok": True}
+
+
+def fake_response(status_code: int = 200, content: bytes = b"ok") -> httpx.Response:
+    return httpx.Response(status_code, content=content)
+
+
+class SlowUpstream:
+    """记录调用次数的 fetch 替身，每次调用等待 `release` 事件后返回响应。"""
+
+    def __init__(self, response: httpx.Response | None = None):
+        self.response = response or fake_response()
+        self.calls = 0
+        self.cancelled = 0
+        self.release = asyncio.Event()
+
+    async def fetch(self) -> httpx.Response:
+        self.calls += 1
+        try:
+            await self.release.wait()
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        return self.response
+
+
+def test_concurrent_identical_gets_share_one_upstream_request(mock_upstream, monkeypatch):
+    monkeypatch.setattr(http_clients, "single_flight", http_clients.SingleFlight("", 1024))
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(0.05)
+        return httpx.Response(200, content=b"shared")
+    requests = mock_upstream(handler)
+
+    async def run():
+        return await asyncio.gather(*(
+            http_clients.fetch("ddg", "https://coalesce.example/search", kind="search", params={"q": "x"}) for _ in range(10)
+        ))
+
+    responses = asyncio.run(run())
+    assert requests == ["https://coalesce.example/search?q=x"]
+    assert {response.content for response in responses} == {b"shared"}
+    assert http_clients.single_flight.coalesced == 9
+
+
+def test_cancelling_one_waiter_keeps_the_shared_request():
+    flights = http_clients.SingleFlight("", 1024)
+    upstream = SlowUpstream()
+
+    async def run():
+        waiters = [asyncio.create_task(flights.run(("k",), "https://a.example/", upstream.fetch)) for _ in range(3)]
+        await asyncio.sleep(0)
+        waiters[0].cancel()
+        await asyncio.sleep(0)
+        upstream.release.set()
+        return await asyncio.gather(*waiters, return_exceptions=True)
+
+    first, *others = asyncio.run(run())
+    assert isinstance(first, asyncio.CancelledError)
+    assert others == [upstream.response, upstream.response]
+    assert (upstream.calls, upstream.cancelled) == (1, 0)
+
+
+def test_cancelling_every_waiter_cancels_the_transfer():
+    flights = http_clients.SingleFlight("", 1024)
+    upstream = SlowUpstream()
+
+    async def run():
+        waiters = [asyncio.create_task(flights.run(("k",), "https://a.example/", upstream.fetch)) for _ in range(2)]
+        await asyncio.sleep(0)
+        for waiter in waiters:
+            waiter.cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+        assert upstream.cancelled == 1
+        # 放弃的传输不再被复用，下一次调用重新发出请求
+        upstream.release.set()
+        return await flights.run(("k",), "https://a.example/", upstream.fetch)
+
+    assert asyncio.run(run()) is upstream.response
+    assert upstream.calls == 2
+
+
+def test_error_responses_are_not_microcached():
+    flights = http_clients.SingleFlight("cache.example=60", 1024)
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        return fake_response(503 if len(calls) == 1 else 200)
+
+    async def run():
+        statuses = []
+        for _ in range(3):
+            response = await flights.run(("k",), "https://cache.example/search", fetch)
+            statuses.append(response.status_code)
+        return statuses
+
+    assert asyncio.run(run()) == [503, 200, 200]
+    assert len(calls) == 2
+    assert flights.cache_hits == 1
+
+
+def test_microcache_eviction_stays_within_byte_budget():
+    flights = http_clients.SingleFlight("cache.example=60", 250)
+
+    async def run():
+        for i in range(5):
+            async def fetch(i=i):
+                return fake_response(content=bytes([i]) * 100)
+            await flights.run((i,), f"https://cache.example/{i}", fetch)
+            assert flights.cached_bytes <= flights.max_bytes
+        # 超过预算时淘汰最久未用的，只留下最近的两个
+        return list(flights._cache)
+
+    assert asyncio.run(run()) == [(3,), (4,)]
+    assert flights.cached_bytes == 200